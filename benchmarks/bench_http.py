@@ -0,0 +1,173 @@
+"""Нагрузочный тест HTTP: сервер start_server в отдельном процессе."""
+
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import APP_DIR, currency_codes, percentile
+
+SCENARIOS = {
+    'currency': 'GET /currency/USD',
+    'exchange_rates': 'GET /exchangeRates',
+    'convert_direct': 'GET /convert?from=USD&to=EUR&amount=100',
+    'convert_via_usd': 'GET /convert?from=EUR&to=JPY&amount=100',
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _request(conn, method: str, path: str, body: dict = None) -> int:
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    payload = json.dumps(body).encode() if body is not None else None
+    conn.request(method, path, body=payload, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def start_server(mode: str, workers: int, processes: int, db_path: str):
+    """Запускает сервер и ждет, пока порт начнет принимать соединения"""
+    port = _free_port()
+    env = {
+        **os.environ,
+        'PYTHONPATH': str(APP_DIR),
+        'HOST': '127.0.0.1',
+        'PORT': str(port),
+        'LOG_LEVEL': 'WARNING',
+        'LOG_FILE': '',
+    }
+    code = (
+        'from log_config import setup_logging; setup_logging(); '
+        'from app_server import start_server; '
+        f'start_server({db_path!r}, mode={mode!r}, workers={workers}, processes={processes})'
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-c', code], env=env, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, port
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError('Сервер не запустился')
+
+
+def seed(port: int, pairs: int) -> None:
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    try:
+        codes = currency_codes(max(4, int(pairs**0.5) + 2))
+        for code in codes:
+            _request(conn, 'POST', '/currencies', {'code': code, 'name': code})
+        rates = [('USD', 'EUR'), ('USD', 'JPY')]
+        rates += [
+            (b, t) for b in codes for t in codes if b != t and (b, t) not in rates
+        ]
+        for base, target in rates[:pairs]:
+            _request(
+                conn,
+                'POST',
+                '/exchangeRates',
+                {'from': base, 'to': target, 'rate': 1.5},
+            )
+    finally:
+        conn.close()
+
+
+def load(port: int, path: str, concurrency: int, duration: float) -> dict:
+    """concurrency клиентов с keep-alive шлют GET path в течение duration секунд"""
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    stop_at = time.perf_counter() + duration
+
+    def client(i: int) -> None:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        samples = latencies[i]
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                status = _request(conn, 'GET', path)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                status = 0
+            samples.append(time.perf_counter() - start)
+            if status != 200:
+                errors[i] += 1
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    samples = sorted(value for client_samples in latencies for value in client_samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(errors),
+        'throughput': len(samples) / elapsed,
+        'mean': sum(samples) / len(samples) if samples else 0.0,
+        'p50': percentile(samples, 0.50),
+        'p95': percentile(samples, 0.95),
+        'p99': percentile(samples, 0.99),
+        'max': samples[-1] if samples else 0.0,
+    }
+
+
+def run(
+    mode: str = 'threaded',
+    workers: int = 8,
+    processes: int = 1,
+    concurrency: int = 16,
+    duration: float = 5.0,
+    pairs: int = 100,
+    quick: bool = False,
+    **_,
+) -> list[dict]:
+    if quick:
+        duration, pairs = min(duration, 1.0), min(pairs, 20)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / 'bench.db')
+        process, port = start_server(mode, workers, processes, db_path)
+        try:
+            seed(port, pairs)
+            results = []
+            for scenario, request in SCENARIOS.items():
+                path = request.split(' ', 1)[1]
+                stats = load(port, path, concurrency, duration)
+                results.append(
+                    {
+                        'name': 'http.load',
+                        'params': {
+                            'scenario': scenario,
+                            'mode': mode,
+                            'processes': processes,
+                            'concurrency': concurrency,
+                            'pairs': pairs,
+                        },
+                        'duration': duration,
+                        **stats,
+                    }
+                )
+            return results
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
@@ -0,0 +1,104 @@
+"""Модели: конвертация (direct/reverse/via_usd) и выборка всех курсов."""
+
+import sqlite3
+
+from common import bench, seed_pairs
+
+RATE_SIZES = (10, 1_000, 25_000)
+
+
+def _models(conn: sqlite3.Connection):
+    from events import EventBus
+    from model import ConversionModel, ExchangeRateModel
+
+    events = EventBus()
+    return ExchangeRateModel(conn, events), ConversionModel(conn, events)
+
+
+def run_conversion(repeat: int = 5) -> list[dict]:
+    from db_initializer import init_db
+
+    conn = sqlite3.connect(':memory:')
+    init_db(conn)
+    try:
+        with conn:
+            conn.executemany(
+                'INSERT INTO currencies (code, name, sign) VALUES (?, ?, ?)',
+                [(code, code, '') for code in ('USD', 'EUR', 'JPY', 'GBP')],
+            )
+            conn.executemany(
+                'INSERT INTO exchange_rates (base_currency_id, target_currency_id, rate) '
+                'SELECT base.id, target.id, ? FROM currencies base, currencies target '
+                'WHERE base.code = ? AND target.code = ?',
+                [(0.92, 'USD', 'EUR'), (150.0, 'USD', 'JPY'), (1.27, 'GBP', 'USD')],
+            )
+        rates, conversion = _models(conn)
+        cases = {
+            'direct': ('USD', 'EUR'),
+            'reverse': ('EUR', 'USD'),
+            'via_usd': ('EUR', 'JPY'),
+        }
+        results = []
+        for method, (base, target) in cases.items():
+            assert (
+                conversion.get_converted_currency(base, target, 100)['method'] == method
+            )
+            results.append(
+                bench(
+                    'conversion.get_converted_currency',
+                    lambda b=base, t=target: conversion.get_converted_currency(
+                        b, t, 100
+                    ),
+                    repeat,
+                    method=method,
+                )
+            )
+        return results
+    finally:
+        conn.close()
+
+
+def _encoded_body(response) -> bytes:
+    """Тело ответа целиком, в том числе потокового (chunked)"""
+    return response.body if response.chunks is None else b''.join(response.chunks)
+
+
+def run_exchange_rates(repeat: int = 5, sizes=RATE_SIZES) -> list[dict]:
+    from db_initializer import init_db
+    from response import render_response
+
+    results = []
+    for size in sizes:
+        conn = sqlite3.connect(':memory:')
+        init_db(conn)
+        try:
+            seed_pairs(conn, size)
+            rates, _ = _models(conn)
+            assert len(rates.get_exchange_rates()) == size
+            results.append(
+                bench(
+                    'exchange_rates.get_exchange_rates',
+                    rates.get_exchange_rates,
+                    repeat,
+                    pairs=size,
+                )
+            )
+            # Вместе с кодированием тела ответа, как в GET /exchangeRates
+            results.append(
+                bench(
+                    'exchange_rates.render',
+                    lambda r=rates: _encoded_body(
+                        render_response(200, r.get_exchange_rates())
+                    ),
+                    repeat,
+                    pairs=size,
+                )
+            )
+        finally:
+            conn.close()
+    return results
+
+
+def run(repeat: int = 5, quick: bool = False, **_) -> list[dict]:
+    sizes = RATE_SIZES[:2] if quick else RATE_SIZES
+    return run_conversion(repeat) + run_exchange_rates(repeat, sizes)
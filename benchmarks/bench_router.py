@@ -0,0 +1,48 @@
+"""Диспетчеризация Router._resolve: статические и динамические маршруты."""
+
+from common import bench
+
+
+def _noop(*args):
+    return None, 200
+
+
+def run(repeat: int = 5, **_) -> list[dict]:
+    from controller import Controller
+    from router import Router
+
+    controller = Controller('file:bench_router?mode=memory&cache=shared')
+    try:
+        router = Router(controller=controller)
+        # Обработчики-заглушки: замеряется только поиск маршрута и разбор параметров
+        router.add_route('GET', '/bench/static', _noop)
+        router.add_route('GET', '/bench/item/:id', _noop, ['id'])
+        controller.add_currency('USD', 'US Dollar')
+        return [
+            bench(
+                'router.resolve',
+                lambda: router._resolve('GET', '/bench/static', {}),
+                repeat,
+                route='static',
+            ),
+            bench(
+                'router.resolve',
+                lambda: router._resolve('GET', '/bench/item/42', {}),
+                repeat,
+                route='dynamic',
+            ),
+            bench(
+                'router.resolve',
+                lambda: router._resolve('GET', '/currency/USD', {}),
+                repeat,
+                route='dynamic+handler',
+            ),
+            bench(
+                'router.dispatch',
+                lambda: router.dispatch('GET', '/currency?code=USD', {}, b''),
+                repeat,
+                route='static+handler',
+            ),
+        ]
+    finally:
+        controller.close()
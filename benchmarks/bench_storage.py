@@ -0,0 +1,188 @@
+"""Хранилища: профили SQLite и данные в памяти — запись, чтение и чтение во время записи.
+
+Каждый профиль замеряется на своем файле БД (WAL и mmap не работают в памяти);
+хранилище в памяти пишет журнал во временный каталог.
+"""
+
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import bench, percentile, seed_pairs, seed_rows
+
+PAIRS = 1_000
+
+
+def _open(path: Path, profile):
+    from db_initializer import init_db
+    from storage import connect
+
+    conn = connect(str(path), profile, check_same_thread=False)
+    init_db(conn)
+    return conn
+
+
+def _models(conn: sqlite3.Connection):
+    from events import EventBus
+    from model import ExchangeRateModel
+
+    return ExchangeRateModel(conn, EventBus())
+
+
+def _reads_during_writes(path: Path, profile, codes: list, duration: float) -> dict:
+    writer_conn, reader_conn = _open(path, profile), _open(path, profile)
+    try:
+        return _measure_reads_during_writes(
+            _models(writer_conn),
+            lambda: _models(reader_conn)._fetch_exchange_rate('USD', codes[1]),
+            codes,
+            duration,
+            profile.name,
+        )
+    finally:
+        writer_conn.close()
+        reader_conn.close()
+
+
+def _measure_reads_during_writes(
+    writer, read: callable, codes: list, duration: float, label: str
+) -> dict:
+    """Задержка чтения курса, пока другой поток непрерывно пишет пакеты курсов"""
+    from errors import APIError
+
+    stop = threading.Event()
+    writes = [0]
+
+    def write_loop():
+        step = 0
+        while not stop.is_set():
+            step += 1
+            rates = [('USD', code, 1 + step % 100 / 100) for code in codes[1:51]]
+            try:
+                writer.upsert_exchange_rates(rates)
+                writes[0] += 1
+            except sqlite3.OperationalError:
+                pass
+
+    thread = threading.Thread(target=write_loop, daemon=True)
+    thread.start()
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                read()
+            except (sqlite3.OperationalError, APIError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+    finally:
+        stop.set()
+        thread.join()
+    latencies.sort()
+    return {
+        'name': 'storage.read_during_writes',
+        'params': {'profile': label},
+        'requests': len(latencies),
+        'writes': writes[0],
+        'throughput': len(latencies) / duration,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'errors': errors,
+    }
+
+
+def run_profile(profile, repeat: int = 5, duration: float = 2.0) -> list[dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'bench.db'
+        conn = _open(path, profile)
+        try:
+            codes = seed_pairs(conn, PAIRS)
+            rates = _models(conn)
+            results = _bench_rates(
+                rates,
+                # Чтение мимо кэша модели: замеряется само хранилище
+                lambda: rates._fetch_exchange_rate('USD', codes[2]),
+                codes,
+                repeat,
+                profile.name,
+            )
+        finally:
+            conn.close()
+        results.append(_reads_during_writes(path, profile, codes, duration))
+    return results
+
+
+def _bench_rates(
+    rates, read: callable, codes: list, repeat: int, label: str
+) -> list[dict]:
+    step = [0]
+
+    def write_single():
+        step[0] += 1
+        rates.patch_exchange_rate('USD', codes[1], 1 + step[0] % 100 / 100)
+
+    def write_batch():
+        step[0] += 1
+        rates.upsert_exchange_rates(
+            [('USD', code, 1 + step[0] % 100 / 100) for code in codes[1:101]]
+        )
+
+    return [
+        bench('storage.write_single', write_single, repeat, profile=label),
+        bench('storage.write_batch', write_batch, repeat, profile=label),
+        bench('storage.read_rate', read, repeat, profile=label),
+        bench('storage.read_all', rates.get_exchange_rates, repeat, profile=label),
+    ]
+
+
+def run_memory(repeat: int = 5, duration: float = 2.0) -> list[dict]:
+    """Хранилище в памяти с журналом на диске (без fsync, снимок — при закрытии)"""
+    from events import EventBus
+    from memory_store import MemoryStore
+    from model import MemoryCurrencyModel, MemoryExchangeRateModel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(tmp, snapshot_interval=0).open()
+        try:
+            events = EventBus()
+            currencies = MemoryCurrencyModel(store, events)
+            rates = MemoryExchangeRateModel(store, events)
+            codes, rows = seed_rows(PAIRS)
+            currencies.bulk_add_currencies(
+                [(i, code, f'Currency {code}', '¤') for i, code in enumerate(codes)]
+            )
+            rates.upsert_exchange_rates(rows)
+            results = _bench_rates(
+                rates,
+                lambda: rates.get_exchange_rate('USD', codes[2]),
+                codes,
+                repeat,
+                'memory',
+            )
+            results.append(
+                _measure_reads_during_writes(
+                    rates,
+                    lambda: rates.get_exchange_rate('USD', codes[1]),
+                    codes,
+                    duration,
+                    'memory',
+                )
+            )
+        finally:
+            store.close()
+    return results
+
+
+def run(repeat: int = 5, quick: bool = False, duration: float = 5.0, **_) -> list[dict]:
+    from storage import PROFILES
+
+    duration = 0.5 if quick else min(duration, 2.0)
+    results = []
+    for profile in PROFILES.values():
+        results += run_profile(profile, repeat, duration)
+    return results + run_memory(repeat, duration)
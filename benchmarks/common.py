@@ -0,0 +1,179 @@
+"""Общие средства бенчмарков: замер, статистика, сохранение и сравнение JSON."""
+
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from itertools import product
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / 'src' / 'app'
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))  # Модули приложения импортируются плоско
+
+
+def bench(name: str, func, repeat: int = 5, number: int = None, **params) -> dict:
+    """Замер func: repeat серий по number вызовов, время на вызов в секундах.
+
+    Если number не задан, он подбирается так, чтобы серия длилась ~0.2 с.
+    """
+    func()  # Прогрев: кэши, ленивые загрузки, первый доступ к БД
+    if number is None:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - start >= 0.2 or number >= 1_000_000:
+                break
+            number *= 2
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        runs.append((time.perf_counter() - start) / number)
+    return {
+        'name': name,
+        'params': params,
+        'number': number,
+        'repeat': repeat,
+        'min': min(runs),
+        'median': statistics.median(runs),
+        'mean': statistics.fmean(runs),
+        'stdev': statistics.stdev(runs) if len(runs) > 1 else 0.0,
+        'ops_per_sec': 1 / statistics.median(runs),
+    }
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Перцентиль по отсортированной выборке (линейная интерполяция)"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (
+        position - low
+    )
+
+
+def currency_codes(count: int) -> list[str]:
+    """count трехбуквенных кодов: USD, EUR, ... и дальше AAA, AAB, ..."""
+    codes = ['USD', 'EUR', 'GBP', 'JPY', 'INR']
+    for letters in product('ABCDEFGHIJKLMNOPQRSTUVWXYZ', repeat=3):
+        if len(codes) >= count:
+            break
+        code = ''.join(letters)
+        if code not in codes:
+            codes.append(code)
+    return codes[:count]
+
+
+def seed_rows(pairs: int) -> tuple[list[str], list[tuple]]:
+    """Коды валют и pairs курсов (from, to, rate) для заполнения хранилища"""
+    count = 2
+    while count * (count - 1) < pairs:
+        count += 1
+    codes = currency_codes(count)
+    rows = []
+    for i, base in enumerate(codes):
+        for j, target in enumerate(codes):
+            if base != target and len(rows) < pairs:
+                rows.append((base, target, round(1 + (i * 31 + j) % 997 / 100, 4)))
+    return codes, rows
+
+
+def seed_pairs(conn: sqlite3.Connection, pairs: int) -> list[str]:
+    """Заполняет БД валютами и pairs курсами напрямую через SQL"""
+    codes, rows = seed_rows(pairs)
+    with conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO currencies (code, name, sign) VALUES (?, ?, ?)',
+            [(code, f'Currency {code}', '¤') for code in codes],
+        )
+        ids = dict(conn.execute('SELECT code, id FROM currencies'))
+        conn.executemany(
+            'INSERT OR IGNORE INTO exchange_rates (base_currency_id, target_currency_id, rate) '
+            'VALUES (?, ?, ?)',
+            [(ids[base], ids[target], rate) for base, target, rate in rows],
+        )
+    return codes
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=False,
+        ).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+
+def save_results(results: list[dict], path: str) -> None:
+    data = {'meta': metadata(), 'results': results}
+    Path(path).write_text(
+        json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8'
+    )
+
+
+def _key(result: dict) -> tuple:
+    return result['name'], json.dumps(result.get('params', {}), sort_keys=True)
+
+
+def compare(results: list[dict], baseline_path: str) -> list[str]:
+    """Строки отчета: отношение медиан (или p50 для HTTP) к базовому прогону"""
+    baseline = json.loads(Path(baseline_path).read_text(encoding='utf-8'))
+    previous = {_key(result): result for result in baseline['results']}
+    lines = []
+    for result in results:
+        old = previous.get(_key(result))
+        if old is None:
+            continue
+        metric = 'median' if 'median' in result else 'p50'
+        ratio = result[metric] / old[metric] if old[metric] else float('nan')
+        verdict = (
+            'медленнее'
+            if ratio > 1.05
+            else 'быстрее'
+            if ratio < 0.95
+            else 'без изменений'
+        )
+        lines.append(f'{format_name(result):60} {metric} x{ratio:.2f} ({verdict})')
+    return lines
+
+
+def format_name(result: dict) -> str:
+    params = ', '.join(f'{k}={v}' for k, v in result.get('params', {}).items())
+    return f'{result["name"]}[{params}]' if params else result['name']
+
+
+def format_result(result: dict) -> str:
+    if 'median' in result:
+        return (
+            f'{format_name(result):60} {result["median"] * 1e6:12.2f} мкс/оп'
+            f'  ±{result["stdev"] * 1e6:.2f}'
+        )
+    return (
+        f'{format_name(result):60} {result["throughput"]:10.1f} зап/с'
+        f'  p50={result["p50"] * 1e3:.2f} p95={result["p95"] * 1e3:.2f}'
+        f' p99={result["p99"] * 1e3:.2f} мс  ошибок: {result["errors"]}'
+    )
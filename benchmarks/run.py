@@ -0,0 +1,80 @@
+"""Запуск бенчмарков с сохранением результатов в JSON.
+
+Примеры:
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --suite models --compare before.json
+    python benchmarks/run.py --suite http --mode async --concurrency 32
+"""
+
+import argparse
+import logging
+import sys
+
+import bench_http
+import bench_models
+import bench_router
+import bench_storage
+from common import compare, format_result, save_results
+
+SUITES = {
+    'router': bench_router.run,
+    'models': bench_models.run,
+    'http': bench_http.run,
+    'storage': bench_storage.run,
+}
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарки Currency Exchange')
+    parser.add_argument(
+        '--suite', choices=[*SUITES, 'all'], action='append', help='По умолчанию — все'
+    )
+    parser.add_argument('--repeat', type=int, default=5, help='Серий на замер')
+    parser.add_argument('--quick', action='store_true', help='Короткий прогон')
+    parser.add_argument('--output', help='Файл для результатов в JSON')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    parser.add_argument(
+        '--mode', default='threaded', choices=['single', 'threaded', 'async']
+    )
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument(
+        '--duration', type=float, default=5.0, help='Секунд на сценарий'
+    )
+    parser.add_argument('--pairs', type=int, default=100, help='Курсов в БД для HTTP')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)  # Логи приложения не мешают замерам
+    suites = args.suite or ['all']
+    names = list(SUITES) if 'all' in suites else suites
+    options = {
+        'repeat': args.repeat,
+        'quick': args.quick,
+        'mode': args.mode,
+        'workers': args.workers,
+        'processes': args.processes,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'pairs': args.pairs,
+    }
+
+    results = []
+    for name in names:
+        print(f'== {name}', flush=True)
+        for result in SUITES[name](**options):
+            print(format_result(result), flush=True)
+            results.append(result)
+
+    if args.output:
+        save_results(results, args.output)
+        print(f'Результаты сохранены в {args.output}')
+    if args.compare:
+        print(f'== сравнение с {args.compare}')
+        for line in compare(results, args.compare):
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
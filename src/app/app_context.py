@@ -0,0 +1,260 @@
+import logging
+import os
+import time
+
+import log_config
+import metrics
+import serializer
+from controller import Controller
+from errors import APIError, InvalidPairError
+from ingestion import create_scheduler
+from rate_stream import create_hub
+from response import Response, negotiate_encoding, not_modified, render_response
+from response_cache import ResponseCache
+from router import Router
+
+logger = logging.getLogger(__name__)
+
+
+class AppContext:
+    """Контекст приложения.
+
+    Создается один раз на процесс: держит Controller (и его подключение к БД
+    или пул подключений) и Router, которые разделяются всеми обработчиками запросов.
+    """
+
+    def __init__(
+        self,
+        db_path: str = None,
+        pool_size: int = None,
+        ingest: bool = True,
+        max_streams: int = None,
+    ):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        # Предел одновременных потоков событий, который выдерживает движок сервера
+        self.max_streams = max_streams
+        self.streams = None
+        # Фоновая загрузка курсов: при pre-fork только в одном рабочем процессе
+        self.ingest = ingest
+        self.ingestion = None
+        self.controller = None
+        self.router = None
+        self.server = None  # Заполняется в start_server, нужен для статистики
+        self.responses = None
+        self.metrics = metrics.recorder
+
+    def startup(self) -> None:
+        """Создает контроллер, модели и таблицу маршрутов."""
+        logger.info('Запуск контекста приложения')
+        self.controller = Controller(self.db_path, pool_size=self.pool_size)
+        serializer.configure(
+            pretty=os.getenv('JSON_PRETTY', '0') == '1',
+            stream_rows=int(os.getenv('JSON_STREAM_ROWS', 10000)),
+        )
+        self.router = Router(controller=self.controller)
+        self.router.add_route('GET', '/stats', self.get_stats)
+        self.router.add_route('GET', '/metrics', self.get_metrics)
+        self.router.add_route(
+            'GET',
+            '/stream/exchangeRates',
+            self.stream_exchange_rates,
+            ['pairs', 'last_event_id'],
+        )
+        self.gzip_min_size = int(os.getenv('GZIP_MIN_SIZE', 1024))
+        probe = self.controller.data_version
+        self.responses = ResponseCache(
+            self.controller.events,
+            {'/currencies', '/exchangeRates'},
+            ttl=float(os.getenv('RESPONSE_CACHE_TTL', 5)) or None,
+            changed=probe.changed if probe is not None else None,
+        )
+        self.streams = create_hub(self.controller.events, self.max_streams)
+        if self.ingest:
+            controller = self.controller
+            self.ingestion = create_scheduler(
+                controller.db_path,
+                controller.events,
+                # Хранилище в памяти не открыть вторым подключением: пишем через его модели
+                None
+                if controller.store is None
+                else (controller.exchange_rate_model, controller.history_model),
+            )
+            if self.ingestion is not None:
+                self.ingestion.start()
+
+    def shutdown(self) -> None:
+        """Освобождает ресурсы, созданные в startup()."""
+        logger.info('Остановка контекста приложения')
+        self.close_streams()
+        if self.ingestion is not None:
+            self.ingestion.stop()
+            self.ingestion = None
+        if self.controller is not None:
+            self.controller.close()
+        self.controller = None
+        self.router = None
+
+    def close_streams(self) -> None:
+        """Завершает потоки событий: они держат соединения до отписки клиента"""
+        if self.streams is not None:
+            self.streams.close()
+
+    def request_scope(self):
+        """Контекст обработки одного запроса (подключение из пула и т.п.)."""
+        return self.controller.connection_scope()
+
+    def handle(
+        self, method: str, target: str, headers, body: bytes, inline: bool = False
+    ) -> Response:
+        """Обрабатывает запрос и возвращает готовый к отправке ответ.
+
+        Общая точка входа для всех движков сервера; inline=True — запрос
+        выполняется без привязки подключения к БД. HEAD обрабатывается как GET,
+        тело отбрасывает движок.
+        """
+        return self._observed(self._handle, method, target, headers, body, inline)
+
+    def _observed(self, call, method: str, target: str, *args) -> Response | None:
+        """Выборка логов и метрики (маршрут, статус, время, размер) вокруг запроса"""
+        sampling = log_config.sample_request(target.partition('?')[0])
+        route = metrics.current_route.set(None)
+        self.metrics.request_started()
+        start = time.perf_counter()
+        response = None
+        try:
+            response = call(method, target, *args)
+            return response
+        finally:
+            self.metrics.request_finished(
+                method,
+                metrics.current_route.get(),
+                response,
+                time.perf_counter() - start,
+            )
+            metrics.current_route.reset(route)
+            log_config.reset_sampling(sampling)
+
+    def _handle(
+        self, method: str, target: str, headers, body: bytes, inline: bool
+    ) -> Response:
+        if method == 'HEAD':
+            method = 'GET'
+        cacheable = method == 'GET' and self.responses.is_cacheable(target, headers)
+        if cacheable:
+            cached = self.responses.get(target)
+            if cached is not None:
+                metrics.current_route.set(target.partition('?')[0])
+                return self._finalize(cached, headers)
+            version = self.responses.version
+
+        response = self._dispatch(method, target, headers, body, inline)
+        # Потоковые ответы (очень большие коллекции) не кэшируются
+        if cacheable and response.status == 200 and response.chunks is None:
+            response = self.responses.store(target, response, version)
+        return self._finalize(response, headers)
+
+    def cached_response(self, method: str, target: str, headers) -> Response | None:
+        """Ответ из кэша без обращения к БД или None, если его там нет"""
+        if method not in ('GET', 'HEAD') or not self.responses.is_cacheable(
+            target, headers
+        ):
+            return None
+        return self._observed(self._cached_response, method, target, headers)
+
+    def _cached_response(self, method: str, target: str, headers) -> Response | None:
+        cached = self.responses.get(target)
+        if cached is None:
+            return None
+        metrics.current_route.set(target.partition('?')[0])
+        return self._finalize(cached, headers)
+
+    def _finalize(self, response: Response, headers) -> Response:
+        """Выбор варианта кодирования и ответ 304 для условных запросов"""
+        response = negotiate_encoding(
+            response, headers.get('Accept-Encoding'), self.gzip_min_size
+        )
+        return not_modified(response, headers) or response
+
+    def _dispatch(
+        self, method: str, target: str, headers, body: bytes, inline: bool
+    ) -> Response:
+        try:
+            if inline:
+                result, status_code = self.router.dispatch(
+                    method, target, headers, body
+                )
+            else:
+                with self.request_scope():
+                    result, status_code = self.router.dispatch(
+                        method, target, headers, body
+                    )
+            return render_response(status_code, result)
+        except APIError as e:
+            logger.warning('APIError: %s', e.message)
+            response = render_response(e.status_code, e.to_dict())
+            response.headers.update(e.headers)
+            return response
+        except Exception:
+            logger.exception('Неизвестная ошибка')
+            return render_response(500, {'error': 'Internal Server Error'})
+
+    def stream_exchange_rates(
+        self, pairs: str = None, last_event_id: str = None
+    ) -> tuple:
+        """Server-Sent Events: изменения курсов пар из pairs (USDEUR,USDJPY; пусто — всех).
+
+        Новый клиент сначала получает текущие курсы, переподключившийся —
+        только пропущенное после Last-Event-ID.
+        """
+        selected = None
+        if pairs:
+            selected = set()
+            for pair in pairs.split(','):
+                pair = pair.strip().upper()
+                if len(pair) != 6 or not pair.isalpha():
+                    raise InvalidPairError()
+                selected.add((pair[:3], pair[3:]))
+        return self.streams.open(selected, last_event_id, self._current_rates), 200
+
+    def _current_rates(self) -> list[tuple]:
+        rates = self.controller.exchange_rate_model.get_exchange_rates(
+            'base,target,rate'
+        )
+        return [(rate['base'], rate['target'], rate['rate']) for rate in rates]
+
+    def get_metrics(self) -> tuple:
+        """Метрики процесса в формате Prometheus"""
+        return metrics.Exposition(self.metrics.render()), 200
+
+    def get_stats(self) -> tuple:
+        """Статистика пула подключений и рабочих потоков сервера."""
+        stats = {
+            'pid': os.getpid(),
+            'storage': (
+                self.controller.storage_profile.name
+                if self.controller.store is None
+                else self.controller.backend
+            ),
+            'cache': {
+                **self.controller.cache_stats(),
+                'responses': self.responses.stats(),
+            },
+        }
+        if self.controller.pool is not None:
+            stats['pool'] = self.controller.pool.stats()
+        if self.controller.store is not None:
+            stats['memory'] = self.controller.store.stats()
+        stats['streams'] = self.streams.stats()
+        if hasattr(self.server, 'stats'):
+            stats['server'] = self.server.stats()
+        if self.ingestion is not None:
+            stats['ingestion'] = self.ingestion.stats()
+        return stats, 200
+
+    def __enter__(self) -> 'AppContext':
+        self.startup()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
@@ -1,49 +1,81 @@
-import json
+import asyncio
 import logging
 import os
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
 
+from app_context import AppContext
+from async_server import AsyncHTTPServer
 from dotenv import load_dotenv
-from errors import APIError
-from router import Router
+from prefork import PreforkMaster
+from response import CORS_HEADERS, Response, render_response
 
 logger = logging.getLogger(__name__)
 
+
 class RequestHandler(BaseHTTPRequestHandler):
     """Обработчик HTTP-запросов."""
 
-    def __init__(self, *args, db_path=None, **kwargs):
-        logger.info('Инициализация RequestHandler')
-        self.router = Router(db_path)
+    def __init__(self, *args, context: AppContext, **kwargs):
+        # Router и Controller берутся из общего контекста, а не создаются на каждый запрос
+        self.context = context
+        self.router = context.router
         super().__init__(*args, **kwargs)
 
     def send_response_content(
         self, status_code: int, data: any, content_type: str = None
     ) -> None:
-        if isinstance(data, dict) or isinstance(data, list):
-            response_body = json.dumps(data, indent=4, ensure_ascii=False)
-            content_type = content_type or 'application/json; charset=utf-8'
-        elif isinstance(data, str):
-            response_body = data
-            content_type = content_type or 'text/html; charset=utf-8'
-        else:
-            response_body = str(data)
-            content_type = content_type or 'text/plain; charset=utf-8'
-
-        logger.debug(
-            f'Отправка ответа c кодом состояния: {status_code}: с типом: {content_type}, тип содержимого: {type(data).__name__}'
-        )
-        self.send_response(status_code)
-        self.send_header('Content-Type', content_type)
+        self.send_response_object(render_response(status_code, data, content_type))
+
+    def send_response_object(self, response: Response) -> None:
+        self.send_response(response.status)
+        # Chunked доступен только в HTTP/1.1; клиенту HTTP/1.0 тело до закрытия
+        chunked = response.chunks is not None and self.request_version == 'HTTP/1.1'
+        if response.status not in (204, 304):
+            self.send_header('Content-Type', response.content_type)
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            elif response.chunks is not None:
+                self.close_connection = True
+            else:
+                self.send_header('Content-Length', str(len(response.body)))
+        for name, value in response.headers.items():
+            self.send_header(name, value)
         self.send_cors_headers()  # Добавляем CORS-заголовки
         self.end_headers()
-        self.wfile.write(response_body.encode('utf-8'))
+        if self.command == 'HEAD':
+            if hasattr(response.chunks, 'close'):
+                response.chunks.close()  # Поток событий снимает подписку
+            return
+        if response.chunks is None:
+            self.wfile.write(response.body)
+            return
+        try:
+            for chunk in response.chunks:
+                if chunked:
+                    self.wfile.write(b'%x\r\n%b\r\n' % (len(chunk), chunk))
+                else:
+                    self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except ConnectionError:
+            # Для потока событий это обычное завершение: клиент отписался
+            logger.info('Клиент закрыл соединение во время потоковой отправки')
+            self.close_connection = True
+        finally:
+            if hasattr(response.chunks, 'close'):
+                response.chunks.close()  # Потоковая выборка возвращает подключение
+
+    def log_message(self, format: str, *args) -> None:
+        """Журнал доступа идет через logging (очередь и выборку), а не в stderr"""
+        logger.info('%s - %s', self.address_string(), format % args)
 
     def send_cors_headers(self):
         """Добавление заголовков CORS."""
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, PATCH, DELETE, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        for name, value in CORS_HEADERS.items():
+            self.send_header(name, value)
 
     def do_OPTIONS(self):
         """Обработка OPTIONS-запросов для CORS."""
@@ -52,20 +84,18 @@ class RequestHandler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def handle_method(self) -> None:
-        logger.info(f'Обработка {self.command}-запроса')
-        try:
-            result, status_code = self.router.handle_request(self)
-            self.send_response_content(status_code, result)
-        except APIError as e:
-            logger.warning(f'APIError: {e.message}')
-            self.send_response_content(e.status_code, e.to_dict())
-        except Exception:
-            logger.exception('Неизвестная ошибка')
-            self.send_response_content(500, {'error': 'Internal Server Error'})
+        logger.debug('Обработка %s-запроса', self.command)
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length) if content_length > 0 else b''
+        response = self.context.handle(self.command, self.path, self.headers, body)
+        self.send_response_object(response)
 
     def do_GET(self):  # noqa: N802
         self.handle_method()
 
+    def do_HEAD(self):  # noqa: N802
+        self.handle_method()
+
     def do_POST(self):  # noqa: N802
         self.handle_method()
 
@@ -73,21 +103,208 @@ class RequestHandler(BaseHTTPRequestHandler):
         self.handle_method()
 
 
-def start_server(db_path: str = None) -> None:
-    """Запуск HTTP-сервера"""
+class ServerHooksMixin:
+    """Общие настройки серверов на socketserver.
+
+    reuse_port включает SO_REUSEPORT (несколько процессов на одном порту),
+    heartbeat вызывается на каждой итерации serve_forever.
+    """
+
+    heartbeat = None
+
+    def __init__(self, *args, reuse_port: bool = False, **kwargs):
+        self.allow_reuse_port = reuse_port
+        super().__init__(*args, **kwargs)
+
+    def service_actions(self):
+        super().service_actions()
+        if self.heartbeat is not None:
+            self.heartbeat()
+
+
+class AppHTTPServer(ServerHooksMixin, HTTPServer):
+    """Однопоточный HTTP-сервер"""
+
+
+class PooledHTTPServer(ServerHooksMixin, ThreadingHTTPServer):
+    """Многопоточный HTTP-сервер с ограниченным пулом рабочих потоков.
+
+    В отличие от ThreadingHTTPServer не создает поток на каждое соединение:
+    соединения ставятся в очередь длиной queue_size, при переполнении
+    клиент сразу получает 503.
+    """
+
+    _REJECT_RESPONSE = (
+        b'HTTP/1.1 503 Service Unavailable\r\n'
+        b'Content-Length: 0\r\n'
+        b'Connection: close\r\n\r\n'
+    )
+
+    def __init__(
+        self,
+        server_address,
+        handler_class,
+        workers: int = 8,
+        queue_size: int = 64,
+        reuse_port: bool = False,
+    ):
+        super().__init__(server_address, handler_class, reuse_port=reuse_port)
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='http-worker'
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._handled = 0
+        self._rejected = 0
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            logger.warning('Очередь запросов переполнена, отказ %s', client_address)
+            try:
+                request.sendall(self._REJECT_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        with self._lock:
+            self._queued += 1
+        self._executor.submit(self._process_in_worker, request, client_address)
+
+    def _process_in_worker(self, request, client_address):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._lock:
+                self._active -= 1
+                self._handled += 1
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        """Загрузка рабочих потоков и глубина очереди соединений."""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'active': self._active,
+                'queue_depth': self._queued,
+                'queue_size': self.queue_size,
+                'handled': self._handled,
+                'rejected': self._rejected,
+            }
+
+
+def start_server(
+    db_path: str = None, mode: str = None, workers: int = None, processes: int = None
+) -> None:
+    """Запуск HTTP-сервера
+
+    mode: 'single' (один поток, по умолчанию), 'threaded' (пул рабочих потоков
+    с пулом подключений к БД) или 'async' (asyncio, запросы к БД выполняются
+    в пуле потоков). Если не задан, берется из SERVER_MODE.
+    processes > 1 запускает мастер pre-fork с указанным числом рабочих
+    процессов на общем порту (SERVER_PROCESSES).
+    """
     logger.info('Запуск сервера')
 
     # Загрузка переменных окружения
     load_dotenv()
     host = os.getenv('HOST', 'localhost')  # Хост из переменной окружения
     port = int(os.getenv('PORT', 8000))  # Порт из переменной окружения
-    logger.info('Запуск HTTP-сервера на %s:%d', host, port)
-
-    # Создание и запуск HTTP-сервера с передачей db_path в RequestHandler через lambda
-    server = HTTPServer(
-        (host, port),
-        lambda *args, **kwargs: RequestHandler(
-            *args, db_path=db_path, **kwargs
-        ),  # Передаем db_path в RequestHandler
+    mode = mode or os.getenv('SERVER_MODE', 'single')
+    workers = workers or int(os.getenv('SERVER_WORKERS', 8))
+    processes = processes or int(os.getenv('SERVER_PROCESSES', 1))
+    if mode not in ('single', 'threaded', 'async'):
+        raise ValueError(f'Неизвестный режим сервера: {mode}')
+    if processes > 1 and os.getenv('STORAGE_BACKEND') == 'memory':
+        # У каждого процесса были бы свои данные и общий журнал
+        raise ValueError('Хранилище в памяти работает только в одном процессе')
+
+    if processes > 1:
+        logger.info(
+            'Запуск %d рабочих процессов на %s:%d в режиме %s',
+            processes,
+            host,
+            port,
+            mode,
+        )
+        master = PreforkMaster(
+            partial(serve, db_path, mode, host, port, workers, reuse_port=True),
+            processes,
+        )
+        master.run()
+        return
+
+    serve(db_path, mode, host, port, workers)
+
+
+def serve(
+    db_path: str,
+    mode: str,
+    host: str,
+    port: int,
+    workers: int,
+    heartbeat: callable = None,
+    reuse_port: bool = False,
+) -> None:
+    """Запускает один экземпляр сервера в текущем процессе"""
+    logger.info('Запуск HTTP-сервера на %s:%d в режиме %s', host, port, mode)
+
+    # Контекст приложения создается один раз и разделяется всеми обработчиками
+    # Курсы загружает только процесс слота 0, чтобы не дублировать запросы к провайдеру
+    ingest = heartbeat is None or getattr(heartbeat, 'slot', 0) == 0
+    # Поток событий занимает рабочий поток на все время подписки: в single
+    # он остановил бы сервер, в threaded ему отдается не больше половины пула
+    max_streams = {'single': 0, 'threaded': workers // 2}.get(mode)
+    context = AppContext(
+        db_path,
+        pool_size=None if mode == 'single' else workers,
+        ingest=ingest,
+        max_streams=max_streams,
     )
-    server.serve_forever()
+    context.startup()
+    if mode == 'async':
+        server = AsyncHTTPServer(
+            context, host, port, workers=workers, reuse_port=reuse_port
+        )
+        server.heartbeat = heartbeat
+        context.server = server
+        try:
+            asyncio.run(server.serve_forever())
+        finally:
+            context.shutdown()
+        return
+
+    handler = partial(RequestHandler, context=context)
+    if mode == 'threaded':
+        server = PooledHTTPServer(
+            (host, port),
+            handler,
+            workers=workers,
+            queue_size=int(os.getenv('SERVER_QUEUE_SIZE', 64)),
+            reuse_port=reuse_port,
+        )
+    else:
+        server = AppHTTPServer((host, port), handler, reuse_port=reuse_port)
+    server.heartbeat = heartbeat
+    context.server = server
+    try:
+        server.serve_forever()
+    finally:
+        context.close_streams()  # Иначе server_close ждет рабочие потоки подписчиков
+        server.server_close()
+        context.shutdown()
@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from http.client import HTTPMessage
+
+from response import CORS_HEADERS, Response, render_response
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_METHODS = {'GET', 'HEAD', 'POST', 'PATCH'}
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+
+class BadRequest(Exception):
+    """Некорректный HTTP-запрос: соединение закрывается после ответа"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class AsyncHTTPServer:
+    """HTTP/1.1-сервер на asyncio.
+
+    Разбирает запросы сам, поддерживает keep-alive и конвейерную отправку.
+    Обращения к БД уходят в пул потоков, маршруты без БД (Router.inline_routes)
+    и ответы из кэша отдаются прямо в цикле событий. Простаивающее keep-alive соединение
+    стоит только корутины, а не потока.
+    """
+
+    def __init__(
+        self,
+        context,
+        host: str,
+        port: int,
+        workers: int = 8,
+        keepalive_timeout: float = 75.0,
+        reuse_port: bool = False,
+    ):
+        self.context = context
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.keepalive_timeout = keepalive_timeout
+        self.reuse_port = reuse_port
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='async-db'
+        )
+        self._server = None
+        self._loop = None
+        self._stopped = None
+        self._stopping = False
+        self._idle_writers = set()  # Соединения, ожидающие следующего запроса
+        self._started = threading.Event()
+        self._date_cache = (0, '')
+        self.heartbeat = None  # Вызывается из цикла событий (pre-fork)
+
+        # Метрики
+        self._connections = 0
+        self._idle = 0
+        self._in_executor = 0
+        self._handled = 0
+
+    async def serve_forever(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(
+            self._handle_client,
+            self.host,
+            self.port,
+            limit=MAX_HEADER_SIZE,
+            reuse_port=self.reuse_port or None,
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info('Асинхронный сервер слушает %s:%d', self.host, self.port)
+        self._started.set()
+        heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        try:
+            await self._stopped.wait()
+        finally:
+            heartbeat_task.cancel()
+            self._stopping = True
+            self.context.close_streams()
+            self._server.close()
+            # Простаивающие keep-alive соединения закрываем сразу,
+            # активные завершатся после отправки текущего ответа
+            for writer in list(self._idle_writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._executor.shutdown(wait=True)
+            logger.info('Асинхронный сервер остановлен')
+
+    async def _heartbeat_loop(self) -> None:
+        while self.heartbeat is not None:
+            self.heartbeat()
+            await asyncio.sleep(0.5)
+
+    def wait_started(self, timeout: float = None) -> bool:
+        return self._started.wait(timeout)
+
+    def shutdown(self) -> None:
+        """Останавливает сервер; можно вызывать из другого потока."""
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'connections': self._connections,
+            'idle_connections': self._idle,
+            'in_executor': self._in_executor,
+            'handled': self._handled,
+        }
+
+    async def _handle_client(self, reader, writer) -> None:
+        self._connections += 1
+        try:
+            keep_alive = True
+            while keep_alive and not self._stopping:
+                self._idle += 1
+                self._idle_writers.add(writer)
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout
+                    )
+                except (
+                    asyncio.IncompleteReadError,
+                    asyncio.TimeoutError,
+                    ConnectionError,
+                ):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._write(
+                        writer,
+                        self._error(431, 'Request header fields too large'),
+                        False,
+                    )
+                    break
+                finally:
+                    self._idle -= 1
+                    self._idle_writers.discard(writer)
+
+                try:
+                    method, target, version, headers = self._parse_head(head)
+                    keep_alive = self._wants_keep_alive(version, headers)
+                    body = await self._read_body(reader, headers)
+                except BadRequest as e:
+                    await self._write(writer, self._error(e.status, e.message), False)
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                response = await self._respond(method, target, headers, body)
+                self._handled += 1
+                keep_alive = keep_alive and not self._stopping
+                await self._write(writer, response, keep_alive, method == 'HEAD')
+        except ConnectionError:
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    def _parse_head(self, head: bytes) -> tuple:
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise BadRequest(400, 'Bad request line')
+        if not version.startswith('HTTP/1.'):
+            raise BadRequest(505, 'HTTP version not supported')
+        headers = HTTPMessage()
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise BadRequest(400, 'Bad header line')
+            headers[name.strip()] = value.strip()
+        return method, target, version, headers
+
+    @staticmethod
+    def _wants_keep_alive(version: str, headers) -> bool:
+        connection = headers.get('Connection', '').lower()
+        if version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    async def _read_body(self, reader, headers) -> bytes:
+        if headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            size = 0
+            while True:
+                line = await reader.readuntil(b'\r\n')
+                try:
+                    chunk_size = int(line.split(b';')[0], 16)
+                except ValueError:
+                    raise BadRequest(400, 'Bad chunk size')
+                if chunk_size == 0:
+                    # Пропускаем трейлеры до пустой строки
+                    while (await reader.readuntil(b'\r\n')) != b'\r\n':
+                        pass
+                    break
+                size += chunk_size
+                if size > MAX_BODY_SIZE:
+                    raise BadRequest(413, 'Payload too large')
+                chunks.append(await reader.readexactly(chunk_size))
+                await reader.readexactly(2)
+            return b''.join(chunks)
+
+        try:
+            content_length = int(headers.get('Content-Length', 0))
+        except ValueError:
+            raise BadRequest(400, 'Bad Content-Length')
+        if content_length > MAX_BODY_SIZE:
+            raise BadRequest(413, 'Payload too large')
+        return await reader.readexactly(content_length) if content_length > 0 else b''
+
+    async def _respond(
+        self, method: str, target: str, headers, body: bytes
+    ) -> Response:
+        if method == 'OPTIONS':
+            return Response(204)
+        if method not in SUPPORTED_METHODS:
+            return self._error(501, f'Unsupported method ({method})')
+
+        cached = self.context.cached_response(method, target, headers)
+        if cached is not None:
+            return cached
+        if self.context.router.is_inline(method, target):
+            return self.context.handle(method, target, headers, body, inline=True)
+
+        self._in_executor += 1
+        try:
+            return await self._loop.run_in_executor(
+                self._executor, self.context.handle, method, target, headers, body
+            )
+        finally:
+            self._in_executor -= 1
+
+    @staticmethod
+    def _error(status: int, message: str) -> Response:
+        return render_response(status, {'error': message})
+
+    def _http_date(self) -> str:
+        now = int(time.time())
+        if self._date_cache[0] != now:
+            self._date_cache = (now, formatdate(now, usegmt=True))
+        return self._date_cache[1]
+
+    async def _write(
+        self, writer, response: Response, keep_alive: bool, head_only: bool = False
+    ) -> None:
+        try:
+            reason = HTTPStatus(response.status).phrase
+        except ValueError:
+            reason = ''
+        lines = [
+            f'HTTP/1.1 {response.status} {reason}',
+            f'Date: {self._http_date()}',
+            f'Connection: {"keep-alive" if keep_alive else "close"}',
+        ]
+        if response.status not in (204, 304):
+            lines.append(f'Content-Type: {response.content_type}')
+            if response.chunks is None:
+                lines.append(f'Content-Length: {len(response.body)}')
+            elif keep_alive:
+                lines.append('Transfer-Encoding: chunked')
+        for name, value in response.headers.items():
+            lines.append(f'{name}: {value}')
+        for name, value in CORS_HEADERS.items():
+            lines.append(f'{name}: {value}')
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        writer.write(head)
+        if head_only:
+            if hasattr(response.chunks, 'close'):
+                response.chunks.close()
+            await writer.drain()
+        elif hasattr(response.chunks, '__aiter__'):
+            await self._write_events(writer, response.chunks, keep_alive)
+        elif response.chunks is not None:
+            await self._write_chunks(writer, response.chunks, keep_alive)
+        else:
+            if response.body:
+                writer.write(response.body)
+            await writer.drain()
+
+    async def _write_events(self, writer, chunks, chunked: bool) -> None:
+        """Поток событий (SSE): ожидание новых частей идет в цикле событий.
+
+        Соединение не занимает поток из пула, пока подписчику нечего отправить.
+        """
+        events = chunks.__aiter__()
+        try:
+            async for chunk in events:
+                writer.write(
+                    b'%x\r\n%b\r\n' % (len(chunk), chunk) if chunked else chunk
+                )
+                await writer.drain()
+        finally:
+            await events.aclose()
+        if chunked:
+            writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _write_chunks(self, writer, chunks, chunked: bool) -> None:
+        """Потоковое тело; без keep-alive конец обозначается закрытием соединения.
+
+        Части готовятся в пуле потоков: потоковые ответы читают строки из БД.
+        """
+        iterator = iter(chunks)
+        try:
+            while True:
+                chunk = await self._loop.run_in_executor(
+                    self._executor, next, iterator, None
+                )
+                if chunk is None:
+                    break
+                writer.write(
+                    b'%x\r\n%b\r\n' % (len(chunk), chunk) if chunked else chunk
+                )
+                await writer.drain()
+        finally:
+            if hasattr(chunks, 'close'):
+                await self._loop.run_in_executor(self._executor, chunks.close)
+        if chunked:
+            writer.write(b'0\r\n\r\n')
+        await writer.drain()
@@ -0,0 +1,49 @@
+"""Сверка таблицы кросс-курсов: построение по одной записи против полного.
+
+Курсы из БД применяются к пустой таблице по одному в порядке id — как при
+записи через API, — и результат сравнивается с таблицей, построенной заново.
+Таблицу работающего сервера сверяет с хранилищем GET /crossRates/check.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+from model import ConversionModel
+from model.cross_rates import CrossRateTable, diff_paths
+from storage import connect
+
+
+def check(currencies: list[dict], rates: list[tuple]) -> dict:
+    rebuilt = CrossRateTable()
+    rebuilt.load(currencies, rates)
+    incremental = CrossRateTable()
+    incremental.load(currencies, [])
+    by_code = {currency['code']: currency for currency in currencies}
+    for rate_id, from_code, to_code, rate in sorted(rates):
+        incremental.set_rate(rate_id, by_code[from_code], by_code[to_code], rate)
+    return diff_paths(rebuilt._paths, incremental._paths)
+
+
+def main(argv: list[str] = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Сверка таблицы кросс-курсов')
+    parser.add_argument(
+        '--db', default=os.getenv('DB_PATH', 'currency.db'), help='Файл БД'
+    )
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    try:
+        currencies, rates = ConversionModel(conn)._fetch_rates()
+    finally:
+        conn.close()
+    report = check(currencies, rates)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if report['consistent'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,41 @@
 import logging
+import math
 import os
-import sqlite3
+from contextlib import nullcontext
 from pathlib import Path
 
+from cache import LRUCache
 from db_initializer import init_db
+from db_pool import ConnectionPool, DataVersionProbe
 from dotenv import load_dotenv
 from errors import (
+    APIError,
     InvalidAmountFormatError,
+    InvalidBatchFormatError,
+    InvalidBulkFormatError,
+    InvalidPairError,
     MissingFormFieldError,
     UnknownCurrencyCodeError,
 )
-from model import ConversionModel, CurrencyModel, ExchangeRateModel
+from events import EventBus
+from memory_store import MemoryStore
+from model import (
+    ConversionModel,
+    CurrencyModel,
+    ExchangeRateModel,
+    HistoryModel,
+    MemoryConversionModel,
+    MemoryCurrencyModel,
+    MemoryExchangeRateModel,
+    MemoryHistoryModel,
+)
+from model.exchange_rates import parse_rate
+from model.history import parse_step, to_timestamp
+from model.projection import page_after, page_limit
+from serializer import stream_format
 from sign_code import currency_sign
+from static_files import StaticAsset, StaticFiles
+from storage import connect, get_profile
 
 logger = logging.getLogger(__name__)
 
@@ -19,34 +43,129 @@ logger = logging.getLogger(__name__)
 class Controller:
     """Контроллер для обработки запросов и взаимодействия с моделями."""
 
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, pool_size: int = None, backend: str = None):
         logger.info('Инициализация контроллера')
         # Загрузка переменных окружения
         load_dotenv()
         if db_path is None:
             # Если путь к БД не передан, берем его из переменной окружения
             db_path = os.getenv('DB_PATH', 'currency.db')
+        self.db_path = db_path
+        # Хранилище: sqlite (по умолчанию) или memory — данные в памяти процесса
+        self.backend = backend or os.getenv('STORAGE_BACKEND', 'sqlite')
+        # Профиль хранилища (PRAGMA и кэш запросов) задается DB_PROFILE
+        self.storage_profile = get_profile()
+        self.pool = None
+        self.store = None
+        self.data_version = None  # Проверка записей других процессов для кэша ответов
+        # Общая шина событий связывает записи с кэшами в памяти
+        self.events = EventBus()
 
-        # Если переменная окружения не задана, используем значение по умолчанию
+        if self.backend == 'memory':
+            self._init_memory_models()
+        elif self.backend == 'sqlite':
+            self._init_sqlite_models(db_path, pool_size)
+        else:
+            raise ValueError(f'Неизвестное хранилище: {self.backend}')
+        self.page_max_limit = int(os.getenv('PAGE_MAX_LIMIT', 1000))
+        with self.connection_scope():
+            self.history_model.prune()
+        # Статические файлы читаются с диска один раз
+        self.static = StaticFiles(
+            Path(__file__).parent.parent / 'templates', ('index.html', 'favicon.ico')
+        )
+        logger.info(
+            'Инициализация моделей с коннектором %s, путь к БД: %s',
+            self.connector,
+            db_path,
+        )
 
-        self.connector = sqlite3.connect(db_path, uri=True)  # Подключение к базе данных
-        init_db(self.connector)
+    def _init_sqlite_models(self, db_path: str, pool_size: int = None) -> None:
+        if pool_size:
+            # Многопоточный режим: у каждого рабочего потока свое подключение из пула
+            self.pool = ConnectionPool(
+                db_path, size=pool_size, profile=self.storage_profile
+            )
+            self.connector = self.pool
+            # Для :memory: пул открывает общую базу; планировщик подключается к ней же
+            self.db_path = self.pool.db_path
+            with self.pool.connection() as conn:
+                init_db(conn)
+        else:
+            self.connector = connect(
+                db_path, self.storage_profile
+            )  # Подключение к базе данных
+            init_db(self.connector)
+        if self.db_path != ':memory:' and 'mode=memory' not in self.db_path:
+            # Базу в памяти другие процессы не видят
+            self.data_version = DataVersionProbe(self.db_path, self.storage_profile)
 
-        # Инициализация моделей
-        self.currency_model = CurrencyModel(connector=self.connector)
-        self.exchange_rate_model = ExchangeRateModel(connector=self.connector)
-        self.conversion_model = ConversionModel(connector=self.connector)
-        logger.info(
-            f'Инициализация моделей с коннектором {self.connector}, путь к БД: {db_path}'
+        cache_size = int(os.getenv('CACHE_SIZE', 1024))
+        cache_ttl = float(os.getenv('CACHE_TTL', 300)) or None
+        self.currency_model = CurrencyModel(
+            connector=self.connector,
+            events=self.events,
+            cache=LRUCache(cache_size, cache_ttl),
+        )
+        self.exchange_rate_model = ExchangeRateModel(
+            connector=self.connector,
+            events=self.events,
+            cache=LRUCache(cache_size, cache_ttl),
+        )
+        self.conversion_model = ConversionModel(
+            connector=self.connector, events=self.events, materialized=_cross_rates()
         )
+        self.history_model = HistoryModel(connector=self.connector, events=self.events)
 
-    def __del__(self):  # Закрытие соединения с БД
+    def _init_memory_models(self) -> None:
+        """Данные в памяти; журнал и снимки — в MEMORY_DIR (пусто — без них).
+
+        Хранилище одно на процесс, поэтому с pre-fork не совместимо.
+        """
+        self.store = MemoryStore(
+            os.getenv('MEMORY_DIR') or None,
+            snapshot_interval=float(os.getenv('MEMORY_SNAPSHOT_INTERVAL', 300)),
+            fsync=os.getenv('MEMORY_FSYNC', '0') == '1',
+        ).open()
+        self.connector = self.store
+        self.currency_model = MemoryCurrencyModel(self.store, self.events)
+        self.exchange_rate_model = MemoryExchangeRateModel(self.store, self.events)
+        self.conversion_model = MemoryConversionModel(
+            self.store, self.events, materialized=_cross_rates()
+        )
+        self.history_model = MemoryHistoryModel(self.store, self.events)
+
+    def close(self) -> None:
+        """Закрывает соединение с БД (хранилище в памяти записывает снимок)"""
         logger.info('Закрытие соединения с БД')
         try:
-            self.currency_model.connector.close()
+            self.connector.close()
+            if self.data_version is not None:
+                self.data_version.close()
         except Exception:
             pass
 
+    def __del__(self):  # Закрытие соединения с БД
+        self.close()
+
+    def cache_stats(self) -> dict:
+        """Счетчики кэшей чтения моделей (у моделей в памяти кэша нет)"""
+        models = {
+            'currencies': self.currency_model,
+            'exchange_rates': self.exchange_rate_model,
+        }
+        return {
+            name: model.cache.stats()
+            for name, model in models.items()
+            if model.cache is not None
+        }
+
+    def connection_scope(self):
+        """Контекст запроса: привязывает подключение из пула к текущему потоку"""
+        if self.pool is None:
+            return nullcontext()
+        return self.pool.connection()
+
     def get_currency_by_code(self, code: str) -> dict:
         if not code:
             raise MissingFormFieldError()
@@ -55,8 +174,20 @@ class Controller:
     def delete_all_currencies(self) -> bool:
         return self.currency_model.delete_all_currencies(), 200
 
-    def get_currencies(self) -> list[dict]:
-        return self.currency_model.get_currencies(), 200
+    def get_currencies(
+        self,
+        stream: str = None,
+        accept: str = None,
+        fields: str = None,
+        after: str = None,
+        limit: str = None,
+    ) -> list[dict]:
+        fmt = stream_format(accept, stream)
+        if fmt:
+            return self.currency_model.stream_currencies(fmt, fields), 200
+        return self.currency_model.get_currencies(
+            fields, page_after(after), page_limit(limit, self.page_max_limit)
+        ), 200
 
     def add_currency(self, code: str, name: str) -> dict:
         if not code:
@@ -84,27 +215,67 @@ class Controller:
     def add_exchange_rate(
         self, from_currency: str, to_currency: str, rate: float
     ) -> dict:
-        try:
-            rate = float(rate)
-        except ValueError as e:
-            raise InvalidAmountFormatError() from e
-        if not from_currency or not to_currency or not rate:
+        if not from_currency or not to_currency or rate in (None, ''):
             raise MissingFormFieldError()
         return self.exchange_rate_model.add_exchange_rate(
-            from_currency.upper(), to_currency.upper(), rate
+            from_currency.upper(), to_currency.upper(), parse_rate(rate)
         ), 201
 
     def update_exchange_rate(
         self, from_currency: str, to_currency: str, rate: float
     ) -> dict:
-        if not from_currency or not to_currency or not rate:
+        if not from_currency or not to_currency or rate in (None, ''):
             raise MissingFormFieldError()
         return self.exchange_rate_model.patch_exchange_rate(
-            from_currency, to_currency, rate
+            from_currency, to_currency, parse_rate(rate)
+        ), 200
+
+    def get_exchange_rate_history(
+        self,
+        pair: str,
+        start: str = None,
+        end: str = None,
+        step: str = None,
+        agg: str = None,
+    ) -> dict:
+        """История курса пары за период с необязательной агрегацией по шагу"""
+        if len(pair) != 6 or not pair.isalpha():
+            raise InvalidPairError()
+        return self.history_model.get_history(
+            pair[:3].upper(),
+            pair[3:].upper(),
+            to_timestamp(start) if start else None,
+            to_timestamp(end) if end else None,
+            parse_step(step) if step else None,
+            agg or 'last',
         ), 200
 
-    def get_exchange_rates(self) -> list[dict]:
-        return self.exchange_rate_model.get_exchange_rates(), 200
+    def get_exchange_rates(
+        self,
+        stream: str = None,
+        accept: str = None,
+        fields: str = None,
+        base: str = None,
+        target: str = None,
+        after: str = None,
+        limit: str = None,
+    ) -> list[dict]:
+        """Курсы; ?stream=1 или Accept: application/x-ndjson — потоком.
+
+        fields — проекция, base/target — фильтр, limit/after — страница
+        """
+        fmt = stream_format(accept, stream)
+        if fmt:
+            return self.exchange_rate_model.stream_exchange_rates(
+                fmt, fields, base, target
+            ), 200
+        return self.exchange_rate_model.get_exchange_rates(
+            fields,
+            base,
+            target,
+            page_after(after),
+            page_limit(limit, self.page_max_limit),
+        ), 200
 
     def convert_currency(
         self, from_currency: str, to_currency: str, amount: float
@@ -115,24 +286,110 @@ class Controller:
             amount = float(amount)
         except ValueError as e:
             raise InvalidAmountFormatError() from e
+        if not math.isfinite(amount):
+            raise InvalidAmountFormatError()
 
         return self.conversion_model.get_converted_currency(
             from_currency, to_currency, amount
         ), 200
 
-    def handle_html_page(self) -> str:
-        """Возвращает HTML-страницу"""
-        # Проверяем, существует ли файл index.html
-        template_path = Path(__file__).parent.parent / 'templates' / 'index.html'
-        logger.info(f'Путь к шаблону: {template_path}')
-        if not Path(template_path).exists():
-            raise FileNotFoundError('HTML-шаблон не найден')
-        # Читаем содержимое файла index.html
-        return template_path.read_text(encoding='utf-8'), 200
-
-    def return_icon(self) -> bytes:
-        template_path = Path(__file__).parent.parent / 'templates' / 'favicon.ico'
-        if not Path(template_path).exists():
-            raise FileNotFoundError('favicon.ico не найден')
-        with open(template_path, 'rb') as f:
-            return f.read(), 200
+    def convert_batch(self, items: list) -> dict:
+        """Пакетная конвертация: ошибки отдельных строк не прерывают пакет"""
+        if not isinstance(items, list):
+            raise InvalidBatchFormatError()
+        return self.conversion_model.convert_batch(items), 200
+
+    def bulk_add_currencies(self, items: list, upsert: str = None) -> dict:
+        """Массовое добавление валют из JSON-массива, NDJSON или CSV.
+
+        Строки проверяются по справочнику sign_code; ошибочные строки
+        попадают в отчет и не мешают загрузке остальных.
+        """
+        if not isinstance(items, list):
+            raise InvalidBulkFormatError()
+        rows, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                rows.append((index, *self._bulk_currency(item)))
+            except APIError as e:
+                errors.append((index, e.message))
+        result = self.currency_model.bulk_add_currencies(rows, _flag(upsert))
+        return _bulk_report(len(items), result, errors), 200
+
+    def bulk_add_exchange_rates(self, items: list, upsert: str = None) -> dict:
+        """Массовое добавление курсов из JSON-массива, NDJSON или CSV"""
+        if not isinstance(items, list):
+            raise InvalidBulkFormatError()
+        rows, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                rows.append((index, *self._bulk_rate(item)))
+            except APIError as e:
+                errors.append((index, e.message))
+        result = self.exchange_rate_model.bulk_add_exchange_rates(rows, _flag(upsert))
+        return _bulk_report(len(items), result, errors), 200
+
+    @staticmethod
+    def _bulk_currency(item) -> tuple:
+        if not isinstance(item, dict):
+            raise InvalidBulkFormatError('Row must be an object')
+        code = str(item.get('code') or '').strip().upper()
+        if not code:
+            raise MissingFormFieldError()
+        currency = currency_sign.get(code)
+        if not currency:
+            raise UnknownCurrencyCodeError(code)
+        name = item.get('name') or currency[0]
+        return code, name, currency[1]
+
+    @staticmethod
+    def _bulk_rate(item) -> tuple:
+        if not isinstance(item, dict):
+            raise InvalidBulkFormatError('Row must be an object')
+        from_currency = str(item.get('from') or '').strip().upper()
+        to_currency = str(item.get('to') or '').strip().upper()
+        if not from_currency or not to_currency or item.get('rate') in (None, ''):
+            raise MissingFormFieldError()
+        for code in (from_currency, to_currency):
+            if code not in currency_sign:
+                raise UnknownCurrencyCodeError(code)
+        return from_currency, to_currency, parse_rate(item['rate'])
+
+    def get_rate_matrix(self, codes: str = None) -> dict:
+        """Матрица кросс-курсов; codes — необязательный список через запятую"""
+        if codes:
+            codes = [code.strip().upper() for code in codes.split(',') if code.strip()]
+        return self.conversion_model.get_rate_matrix(codes or None), 200
+
+    def check_cross_rates(self) -> dict:
+        """Сверка таблицы кросс-курсов с построенной заново по хранилищу"""
+        return self.conversion_model.check_cross_rates(), 200
+
+    def handle_html_page(self) -> tuple[StaticAsset, int]:
+        """Возвращает HTML-страницу из памяти"""
+        return self.static.get('index.html'), 200
+
+    def return_icon(self) -> tuple[StaticAsset, int]:
+        return self.static.get('favicon.ico'), 200
+
+
+def _cross_rates() -> bool:
+    """CROSS_RATES=1 (по умолчанию) — кросс-курсы всех пар хранятся готовыми"""
+    return os.getenv('CROSS_RATES', '1') == '1'
+
+
+def _flag(value) -> bool:
+    """Флаг из строки запроса: 1, true, yes"""
+    return str(value).lower() in ('1', 'true', 'yes') if value is not None else False
+
+
+def _bulk_report(received: int, result: dict, errors: list) -> dict:
+    """Итог массовой загрузки с ошибками по номерам строк"""
+    errors = sorted(errors + result['errors'])
+    return {
+        'received': received,
+        'inserted': result['inserted'],
+        'updated': result['updated'],
+        'failed': len(errors),
+        'errors': [{'row': row, 'error': error} for row, error in errors],
+    }
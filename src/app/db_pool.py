@@ -0,0 +1,171 @@
+import itertools
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from errors import ServiceUnavailableError
+from storage import StorageProfile, connect, get_profile
+
+logger = logging.getLogger(__name__)
+
+_memory_names = itertools.count(1)
+
+
+class DataVersionProbe:
+    """Замечает коммиты других процессов в файл БД по PRAGMA data_version.
+
+    Держит собственное подключение, поэтому проверять можно вне запроса и без
+    подключения из пула (кэш ответов асинхронного сервера). Коммиты своего
+    процесса тоже видны как изменение: кэши о них и так узнают из событий.
+    """
+
+    def __init__(self, db_path: str, profile: StorageProfile = None):
+        self._conn = connect(db_path, profile, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._version = None
+
+    def changed(self) -> bool:
+        """Были ли коммиты с прошлой проверки (первая проверка — да)"""
+        with self._lock:
+            version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            changed = version != self._version
+            self._version = version
+            return changed
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ConnectionPool:
+    """Потокобезопасный пул подключений SQLite.
+
+    Рабочий поток берет подключение на время запроса через connection();
+    модели получают его через current().
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 4,
+        timeout: float = 30.0,
+        profile: StorageProfile = None,
+    ):
+        if size < 1:
+            raise ValueError('Размер пула должен быть больше нуля')
+        if db_path == ':memory:':
+            # У каждого подключения к :memory: своя пустая база; общая
+            # именованная база в памяти живет, пока открыто хоть одно подключение
+            db_path = f'file:pool-memory-{next(_memory_names)}?mode=memory&cache=shared'
+        self.db_path = db_path
+        self.profile = profile or get_profile()
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Метрики пула
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+        for _ in range(size):
+            self._idle.put(self._connect())
+        logger.info('Создан пул из %d подключений к %s', size, db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Подключение переходит между потоками, но используется строго одним за раз
+        return connect(self.db_path, self.profile, check_same_thread=False)
+
+    def acquire(self) -> sqlite3.Connection:
+        """Берет подключение из пула, ожидая не дольше timeout секунд."""
+        with self._lock:
+            self._waiting += 1
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            logger.warning('Нет свободных подключений в пуле за %.1f с', self.timeout)
+            raise ServiceUnavailableError()
+        finally:
+            waited = time.perf_counter() - started
+            with self._lock:
+                self._waiting -= 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+        with self._lock:
+            self._checkouts += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Возвращает подключение в пул."""
+        if self._closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()  # Незавершенная транзакция не должна достаться следующему
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Привязывает подключение к текущему потоку на время блока.
+
+        Вложенные вызовы в том же потоке используют уже привязанное подключение.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self.acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    def current(self) -> sqlite3.Connection:
+        """Подключение, привязанное к текущему потоку."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            raise RuntimeError(
+                'Подключение не привязано к потоку: используйте pool.connection()'
+            )
+        return conn
+
+    def stats(self) -> dict:
+        """Размер пула, глубина очереди ожидания и время ожидания подключения."""
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                'size': self.size,
+                'profile': self.profile.name,
+                'idle': idle,
+                'in_use': self.size - idle,
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'wait_total_ms': round(self._total_wait * 1000, 3),
+                'wait_max_ms': round(self._max_wait * 1000, 3),
+                'wait_avg_ms': round(self._total_wait * 1000 / self._checkouts, 3)
+                if self._checkouts
+                else 0.0,
+            }
+
+    def close(self) -> None:
+        """Закрывает свободные подключения; занятые закроются при возврате."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
@@ -10,10 +10,18 @@ class CurrencyDTO:
     name: str
     sign: str
 
+    # JSON template for a row (id, code, name, sign), see serializer.JSONRows
+    JSON_ROW = '{"id":%s,"code":%s,"name":%s,"sign":%s}'
+
     def to_dict(self) -> dict:
         """Convert to dictionary representation"""
         return {'id': self.id, 'code': self.code, 'name': self.name, 'sign': self.sign}
 
+    @staticmethod
+    def row_to_dict(row: tuple) -> dict:
+        """Dictionary for a row (id, code, name, sign) without building a DTO"""
+        return {'id': row[0], 'code': row[1], 'name': row[2], 'sign': row[3]}
+
 
 @dataclass
 class CurrencyExchangeDTO:
@@ -26,6 +34,26 @@ class CurrencyExchangeDTO:
     amount: float = None
     convertedAmount: float = None
     method: str = None
+    path: list = None
+
+    # JSON template for a row (id, base currency, target currency, rate)
+    JSON_ROW = (
+        '{"id":%s,"baseCurrency":'
+        + CurrencyDTO.JSON_ROW
+        + ',"targetCurrency":'
+        + CurrencyDTO.JSON_ROW
+        + ',"rate":%s}'
+    )
+
+    @staticmethod
+    def row_to_dict(row: tuple) -> dict:
+        """Dictionary for a joined exchange rate row without building DTOs"""
+        return {
+            'id': row[0],
+            'baseCurrency': CurrencyDTO.row_to_dict(row[1:5]),
+            'targetCurrency': CurrencyDTO.row_to_dict(row[5:9]),
+            'rate': row[9],
+        }
 
     def to_dict(self) -> dict:
         """Convert to dictionary representation"""
@@ -45,4 +73,5 @@ class CurrencyExchangeDTO:
             'amount': self.amount,
             'convertedAmount': self.convertedAmount,
             'method': self.method,
+            'path': self.path,
         }
@@ -3,6 +3,7 @@ class APIError(Exception):
         super().__init__(message)
         self.message = message
         self.status_code = status_code
+        self.headers = {}  # Дополнительные заголовки ответа (например, Allow)
 
     def to_dict(self):
         return {'error': self.message}
@@ -13,6 +14,15 @@ class RouteNotFoundError(APIError):
         super().__init__('Route not found', status_code=404)
 
 
+class MethodNotAllowedError(APIError):
+    def __init__(self, allowed: set):
+        super().__init__('Method not allowed', status_code=405)
+        methods = set(allowed) | {'OPTIONS'}
+        if 'GET' in methods:
+            methods.add('HEAD')
+        self.headers = {'Allow': ', '.join(sorted(methods))}
+
+
 class CurrencyNotFoundError(APIError):
     def __init__(self, *missing_codes: str):
         if not missing_codes:
@@ -55,6 +65,45 @@ class InvalidAmountFormatError(APIError):
         super().__init__('Invalid amount format', status_code=400)
 
 
+class InvalidRateFormatError(APIError):
+    def __init__(self):
+        super().__init__('Invalid rate format', status_code=400)
+
+
+class InvalidBatchFormatError(APIError):
+    def __init__(
+        self,
+        message: str = 'Batch must be a JSON array or NDJSON stream of {from, to, amount}',
+    ):
+        super().__init__(message, status_code=400)
+
+
+class InvalidQueryError(APIError):
+    def __init__(self, message: str = 'Invalid query parameters'):
+        super().__init__(message, status_code=400)
+
+
+class InvalidHistoryQueryError(APIError):
+    def __init__(self, message: str = 'Invalid history query'):
+        super().__init__(message, status_code=400)
+
+
+class InvalidBulkFormatError(APIError):
+    def __init__(
+        self,
+        message: str = 'Bulk body must be a JSON array, NDJSON or CSV with a header row',
+    ):
+        super().__init__(message, status_code=400)
+
+
+class BulkConflictError(APIError):
+    def __init__(self):
+        super().__init__(
+            'Bulk import conflicted with a concurrent write, retry the request',
+            status_code=409,
+        )
+
+
 class MissingFormFieldError(APIError):
     def __init__(self):
         super().__init__('Missing required form field', status_code=400)
@@ -63,3 +112,8 @@ class MissingFormFieldError(APIError):
 class UnknownCurrencyCodeError(APIError):
     def __init__(self, code: str):
         super().__init__(f'Unknown currency code: {code}', status_code=400)
+
+
+class ServiceUnavailableError(APIError):
+    def __init__(self, message: str = 'Service temporarily unavailable'):
+        super().__init__(message, status_code=503)
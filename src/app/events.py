@@ -0,0 +1,53 @@
+import logging
+import threading
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+CURRENCY_ADDED = 'currency_added'
+RATE_ADDED = 'rate_added'
+RATE_UPDATED = 'rate_updated'
+CLEARED = 'cleared'
+# Массовая запись валют; payload['codes'] — коды добавленных и обновленных
+CURRENCIES_UPSERTED = 'currencies_upserted'
+# Массовая запись курсов; payload['changes'] — список {'from', 'to', 'rate'}
+RATES_UPSERTED = 'rates_upserted'
+
+
+@dataclass(frozen=True)
+class DataEvent:
+    """Событие изменения данных, публикуется моделями после commit"""
+
+    kind: str
+    from_currency: str = None
+    to_currency: str = None
+    rate: float = None
+    payload: dict = None  # DTO-представление измененной записи
+
+
+class EventBus:
+    """Синхронная шина событий: подписчики вызываются в потоке, сделавшем запись.
+
+    Через нее in-memory структуры (граф курсов, кэши) узнают об изменениях,
+    сделанных через модели этого процесса.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: callable) -> None:
+        with self._lock:
+            self._subscribers = [*self._subscribers, callback]
+
+    def unsubscribe(self, callback: callable) -> None:
+        with self._lock:
+            # Сравнение, а не is: связанный метод при каждом обращении — новый объект
+            self._subscribers = [s for s in self._subscribers if s != callback]
+
+    def publish(self, event: DataEvent) -> None:
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception('Ошибка в подписчике на событие %s', event.kind)
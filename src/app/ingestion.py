@@ -0,0 +1,172 @@
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+from events import EventBus
+from model import ExchangeRateModel, HistoryModel
+from providers import HTTPRateProvider, RateProvider, StubProvider
+from storage import connect
+
+logger = logging.getLogger(__name__)
+
+
+class RateIngestionScheduler:
+    """Фоновая загрузка курсов от провайдера с интервалом и разбросом.
+
+    Работает в отдельном потоке со своим подключением к БД; записывает курсы
+    пакетом через ExchangeRateModel.upsert_exchange_rates, а кэши и граф
+    курсов узнают об изменениях через общую шину событий. Хранилище в памяти
+    одно на процесс: его модели передаются в models (курсы, история).
+    """
+
+    def __init__(
+        self,
+        provider: RateProvider,
+        db_path: str,
+        events: EventBus,
+        interval: float = 300.0,
+        jitter: float = 0.1,
+        models: tuple = None,
+    ):
+        self.provider = provider
+        self.db_path = db_path
+        self.events = events
+        self.interval = interval
+        self.jitter = jitter
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._model = None
+        self._history = None
+        self._shared = models is not None
+        if models is not None:
+            self._model, self._history = models
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None  # time.time() последней успешной загрузки
+        self.last_result = None
+        self.last_error = None
+
+    def next_delay(self) -> float:
+        """Интервал со случайным разбросом ±jitter, чтобы процессы не совпадали"""
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _get_model(self) -> ExchangeRateModel:
+        if self._model is None:
+            # Подключение используется только потоком планировщика
+            self._conn = connect(self.db_path, check_same_thread=False)
+            self._model = ExchangeRateModel(self._conn, self.events)
+            # Подключение принадлежит потоку планировщика: подрезка только в run_once,
+            # а не в обработчике событий чужих записей
+            self._history = HistoryModel(self._conn, self.events, prune_interval=0)
+        return self._model
+
+    def run_once(self) -> dict | None:
+        """Одна загрузка; ошибки провайдера и БД записываются в статистику"""
+        self.runs += 1
+        started = time.perf_counter()
+        try:
+            rates = self.provider.fetch()
+            result = self._get_model().upsert_exchange_rates(rates)
+            # Планировщик — основной источник записей истории, он же ее и подрезает
+            result['pruned'] = self._history.prune()
+        except (
+            requests.RequestException,
+            ValueError,
+            KeyError,
+            sqlite3.Error,
+            OSError,
+        ) as e:
+            self.failures += 1
+            self.last_error = f'{type(e).__name__}: {e}'
+            logger.warning('Загрузка курсов (%s) не удалась: %s', self.provider.name, e)
+            return None
+        result['seconds'] = round(time.perf_counter() - started, 4)
+        self.last_run = time.time()
+        self.last_result = result
+        self.last_error = None
+        return result
+
+    def _run(self) -> None:
+        logger.info(
+            'Планировщик курсов запущен: провайдер %s, интервал %.0f с',
+            self.provider.name,
+            self.interval,
+        )
+        # Первая загрузка — сразу при старте, даже если stop() уже вызван
+        self.run_once()
+        while not self._stop.wait(self.next_delay()):
+            self.run_once()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name='rate-ingestion', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._model is not None and not self._shared:
+            self.events.unsubscribe(self._model._on_data_event)
+            self.events.unsubscribe(self._history._on_data_event)
+            self._conn.close()
+            self._model = self._history = self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            'provider': self.provider.name,
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_run': self.last_run,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+        }
+
+
+def create_provider() -> RateProvider | None:
+    """Провайдер по RATES_PROVIDER: stub, http или пусто (загрузка выключена)"""
+    kind = os.getenv('RATES_PROVIDER', '').lower()
+    base = os.getenv('RATES_BASE', 'USD')
+    if kind == 'stub':
+        return StubProvider(
+            base=base,
+            path=os.getenv('RATES_STUB_FILE') or None,
+            drift=float(os.getenv('RATES_STUB_DRIFT', 0)),
+        )
+    if kind == 'http':
+        symbols = [
+            s.strip() for s in os.getenv('RATES_SYMBOLS', '').split(',') if s.strip()
+        ]
+        return HTTPRateProvider(
+            os.environ['RATES_PROVIDER_URL'],
+            base=base,
+            symbols=symbols or None,
+            timeout=float(os.getenv('RATES_TIMEOUT', 10)),
+        )
+    if kind:
+        raise ValueError(f'Неизвестный провайдер курсов: {kind}')
+    return None
+
+
+def create_scheduler(
+    db_path: str, events: EventBus, models: tuple = None
+) -> RateIngestionScheduler | None:
+    provider = create_provider()
+    if provider is None:
+        return None
+    return RateIngestionScheduler(
+        provider,
+        db_path,
+        events,
+        interval=float(os.getenv('RATES_INTERVAL', 300)),
+        jitter=float(os.getenv('RATES_JITTER', 0.1)),
+        models=models,
+    )
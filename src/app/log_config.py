@@ -0,0 +1,175 @@
+import copy
+import json
+import logging
+import os
+import queue
+import random
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = (
+    '%(asctime)s - %(name)-11s -%(funcName)-22s- %(levelname)-8s - %(message)-s'
+)
+
+_EXC_FORMATTER = logging.Formatter()
+
+# Попадает ли текущий запрос в выборку подробных логов
+_request_sampled = ContextVar('log_request_sampled', default=True)
+
+# Доля запросов с подробными логами: по умолчанию и по путям маршрутов
+sampling = {'rate': 1.0, 'routes': {}}
+
+# Обработчик последнего setup_logging: его перезапускает хук fork,
+# который регистрируется один раз на процесс
+_active_handler = None
+_fork_hook_registered = False
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON (JSON Lines)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S')
+            + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'func': record.funcName,
+            'pid': record.process,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestSamplingFilter(logging.Filter):
+    """Отбрасывает записи до max_level включительно у запросов вне выборки.
+
+    Предупреждения и ошибки проходят всегда; записи вне запросов — тоже.
+    """
+
+    def __init__(self, max_level: int = logging.INFO):
+        super().__init__()
+        self.max_level = max_level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > self.max_level or _request_sampled.get()
+
+
+def sample_request(path: str):
+    """Решает, логировать ли запрос подробно; возвращает токен для reset_sampling"""
+    rate = sampling['routes'].get(path, sampling['rate'])
+    return _request_sampled.set(rate >= 1.0 or random.random() < rate)
+
+
+def reset_sampling(token) -> None:
+    _request_sampled.reset(token)
+
+
+class QueueLogHandler(QueueHandler):
+    """QueueHandler, владеющий своим QueueListener.
+
+    Запись в файл и консоль идет в отдельном потоке слушателя; close()
+    (в том числе из logging.shutdown) дожидается записи очереди.
+    """
+
+    def __init__(self, handlers: list):
+        super().__init__(queue.SimpleQueue())
+        self.handlers = handlers
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Сообщение собирается в потоке запроса, форматирование — в слушателе"""
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def start(self) -> None:
+        self.listener.start()
+
+    def restart_after_fork(self) -> None:
+        """Поток слушателя не переживает fork: в дочернем процессе создаем новый"""
+        if not self.handlers:  # Обработчик уже закрыт
+            return
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def close(self) -> None:
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+        self.handlers = []
+        super().close()
+
+
+def _parse_levels(value: str) -> dict:
+    """'router=DEBUG,model.conversion=WARNING' -> {'router': 'DEBUG', ...}"""
+    levels = {}
+    for item in value.split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _parse_rates(value: str) -> dict:
+    """'/stats=0,/exchangeRates=0.1' -> {'/stats': 0.0, '/exchangeRates': 0.1}"""
+    return {path: float(rate) for path, rate in _parse_levels(value).items() if rate}
+
+
+def setup_logging() -> QueueLogHandler:
+    """Настраивает логирование по переменным окружения.
+
+    LOG_LEVEL — уровень корневого логгера, LOG_LEVELS — уровни отдельных
+    логгеров, LOG_FORMAT — json или text, LOG_FILE — файл (пусто — без файла),
+    LOG_SAMPLE_RATE/LOG_SAMPLE_ROUTES — доля запросов с логами уровня INFO и ниже.
+    """
+    if os.getenv('LOG_FORMAT', 'json') == 'text':
+        formatter = logging.Formatter(TEXT_FORMAT)
+    else:
+        formatter = JsonFormatter()
+
+    handlers = [logging.StreamHandler()]
+    log_file = os.getenv('LOG_FILE', 'app.log')
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    sampling['rate'] = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+    sampling['routes'] = _parse_rates(os.getenv('LOG_SAMPLE_ROUTES', ''))
+
+    queue_handler = QueueLogHandler(handlers)
+    queue_handler.addFilter(RequestSamplingFilter())
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for name, level in _parse_levels(os.getenv('LOG_LEVELS', '')).items():
+        logging.getLogger(name).setLevel(level)
+
+    queue_handler.start()
+    global _active_handler, _fork_hook_registered
+    _active_handler = queue_handler
+    if not _fork_hook_registered:
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        _fork_hook_registered = True
+    return queue_handler
+
+
+def _restart_after_fork() -> None:
+    if _active_handler is not None:
+        _active_handler.restart_after_fork()
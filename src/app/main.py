@@ -1,17 +1,12 @@
 import logging
-import threading
 
 from app_server import start_server
+from dotenv import load_dotenv
+from log_config import setup_logging
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG,  # Устанавливаем уровень DEBUG
-    format='%(asctime)s - %(name)-11s -%(funcName)-22s- %(levelname)-8s - %(message)-s',
-    handlers=[
-        logging.FileHandler('app.log', encoding='utf-8'),  # Логи в файл
-        logging.StreamHandler(),  # Логи в консоль
-    ],
-)
+# Настройка логирования: запись в файл и консоль идет в отдельном потоке
+load_dotenv()
+setup_logging()
 
 
 def run_server():
@@ -20,16 +15,10 @@ def run_server():
 
 if __name__ == '__main__':
     logger = logging.getLogger(__name__)
-    logger.info('Запуск сервера в отдельном потоке')
-    server_thread = threading.Thread(target=run_server)
-    server_thread.daemon = True  # Устанавливаем поток как фоновый
-    server_thread.start()
-
-    logger.info('Сервер запущен. Ожидание запросов.')
-
-    # Основной поток может выполнять другие задачи
+    # Сервер работает в основном потоке: мастеру pre-fork (SERVER_PROCESSES > 1)
+    # нужны обработчики сигналов, а fork из многопоточного процесса небезопасен
+    logger.info('Запуск сервера')
     try:
-        while True:
-            pass  # Замените на вашу логику, если требуется
+        run_server()
     except KeyboardInterrupt:
         logger.info('Завершение работы сервера')
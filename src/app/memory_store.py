@@ -0,0 +1,353 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from operator import itemgetter
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'snapshot.json'
+LOG_FILE = 'journal.log'
+SNAPSHOT_FORMAT = 1
+
+
+class MemoryStore:
+    """Валюты, курсы и история курсов в памяти процесса.
+
+    Строки хранятся кортежами в порядке id — как их возвращает SELECT, так что
+    JSONRows и шаблоны DTO работают без изменений, — а словари дают поиск по
+    коду и паре. Запись идет через commit(): транзакция (список операций)
+    проверяется, дописывается строкой JSON в журнал и применяется в памяти.
+    Фоновый поток раз в snapshot_interval секунд записывает снимок состояния
+    целиком, если журнал не пуст, после чего журнал обнуляется. При старте open() читает снимок и повторяет журнал; оборванная
+    при сбое последняя строка отбрасывается вместе со всей своей транзакцией.
+
+    Без directory данные живут только до конца процесса.
+    """
+
+    def __init__(
+        self,
+        directory: str = None,
+        snapshot_interval: float = 300.0,
+        fsync: bool = False,
+    ):
+        self.directory = Path(directory) if directory else None
+        self.snapshot_interval = (
+            snapshot_interval  # Секунд; 0 — снимок только при close()
+        )
+        self.fsync = fsync  # fsync журнала на каждую транзакцию (как synchronous=FULL)
+        # Записи сериализуются; чтение идет без блокировки: строки — неизменяемые
+        # кортежи, а clear() подменяет контейнеры, не очищая старые
+        self.lock = threading.RLock()
+        self.seq = 0  # Номер последней примененной транзакции
+        self.log_records = 0  # Транзакций в журнале после последнего снимка
+        self.last_snapshot = None  # time.time() последнего снимка
+        self._log = None
+        self._stopped = threading.Event()
+        self._snapshots = None  # Поток периодических снимков
+        self._reset()
+
+    def _reset(self) -> None:
+        # Каждый поиск — одно обращение к словарю, без блокировки
+        self.currency_rows = []  # (id, code, name, sign) по возрастанию id
+        self.currency_index = {}  # code -> строка
+        self.currency_by_id = {}  # id -> строка
+        self.rate_rows = []  # (id, base_id, target_id, rate) по возрастанию id
+        self.rate_index = {}  # (base_id, target_id) -> строка
+        self.history = {}  # (from, to) -> [(ts, rate), ...] по возрастанию ts
+        self.next_currency_id = 1
+        self.next_rate_id = 1
+
+    # Чтение
+
+    def currency(self, code: str) -> tuple | None:
+        return self.currency_index.get(code)
+
+    def rate(self, from_currency: str, to_currency: str) -> tuple | None:
+        base = self.currency_index.get(from_currency)
+        target = self.currency_index.get(to_currency)
+        if base is None or target is None:
+            return None
+        return self.rate_index.get((base[0], target[0]))
+
+    def rates_by_codes(self) -> dict:
+        """{(from, to): rate} всех курсов — для пакетных записей"""
+        codes = self.currency_by_id
+        return {
+            (codes[base][1], codes[target][1]): rate
+            for _, base, target, rate in self.rate_rows
+        }
+
+    def points(
+        self, from_currency: str, to_currency: str, start: float, end: float
+    ) -> list:
+        series = self.history.get((from_currency, to_currency), ())
+        low = bisect_left(series, (start,))
+        high = bisect_left(series, (end, float('inf')))
+        return series[low:high]
+
+    # Запись
+
+    def commit(self, operations: list) -> list:
+        """Записывает транзакцию в журнал и применяет ее; возвращает результаты операций.
+
+        Операции: ('currency', code, name, sign) — добавление или обновление
+        валюты по коду; ('rate', base_id, target_id, rate, ts) — курса по паре;
+        ('clear',) — удаление всех данных со сбросом id. Их применение
+        детерминировано, поэтому повтор журнала восстанавливает те же id.
+        """
+        with self.lock:
+            self._check(operations)
+            self._write_log(self.seq + 1, operations)
+            self.seq += 1
+            return [self._apply(operation) for operation in operations]
+
+    def _check(self, operations: list) -> None:
+        """Проверяет транзакцию до записи в журнал: операция, которая не
+        применится, иначе повторялась бы с той же ошибкой при каждом старте"""
+        codes = set(self.currency_index)
+        currency_ids = set(self.currency_by_id)
+        next_id = self.next_currency_id
+        for operation in operations:
+            kind = operation[0]
+            if kind == 'currency':
+                _, code, _, _ = operation
+                if code not in codes:
+                    codes.add(code)
+                    currency_ids.add(next_id)
+                    next_id += 1
+            elif kind == 'rate':
+                _, base_id, target_id, rate, ts = operation
+                if base_id not in currency_ids or target_id not in currency_ids:
+                    raise ValueError(
+                        f'Курс ссылается на неизвестную валюту: {operation}'
+                    )
+                if not all(isinstance(value, int | float) for value in (rate, ts)):
+                    raise ValueError(f'Курс и время должны быть числами: {operation}')
+            elif kind == 'clear':
+                codes, currency_ids, next_id = set(), set(), 1
+            else:
+                raise ValueError(f'Неизвестная операция журнала: {kind}')
+
+    def _apply(self, operation):
+        kind = operation[0]
+        if kind == 'currency':
+            return self._put_currency(*operation[1:])
+        if kind == 'rate':
+            return self._put_rate(*operation[1:])
+        if kind == 'clear':
+            self._reset()
+            return None
+        raise ValueError(f'Неизвестная операция журнала: {kind}')
+
+    @staticmethod
+    def _replace(rows: list, row: tuple) -> None:
+        """Заменяет строку с тем же id: список упорядочен по id"""
+        rows[bisect_left(rows, row[0], key=itemgetter(0))] = row
+
+    def _put_currency(self, code: str, name: str, sign: str) -> tuple:
+        previous = self.currency_index.get(code)
+        if previous is None:
+            row = (self.next_currency_id, code, name, sign)
+            self.next_currency_id += 1
+            self.currency_rows.append(row)
+        else:
+            row = (previous[0], code, name, sign)
+            self._replace(self.currency_rows, row)
+        self.currency_index[code] = self.currency_by_id[row[0]] = row
+        return row
+
+    def _put_rate(self, base_id: int, target_id: int, rate: float, ts: float) -> tuple:
+        previous = self.rate_index.get((base_id, target_id))
+        if previous is None:
+            row = (self.next_rate_id, base_id, target_id, rate)
+            self.next_rate_id += 1
+            self.rate_rows.append(row)
+        else:
+            row = (previous[0], base_id, target_id, rate)
+            self._replace(self.rate_rows, row)
+        self.rate_index[(base_id, target_id)] = row
+        if previous is not None and previous[3] == rate:
+            return row
+        # Как триггеры SQLite: время точки строго растет внутри пары
+        pair = (self.currency_by_id[base_id][1], self.currency_by_id[target_id][1])
+        series = self.history.setdefault(pair, [])
+        if series:
+            ts = max(ts, series[-1][0] + 0.001)
+        series.append((ts, rate))
+        return row
+
+    def prune_history(self, cutoff: float) -> int:
+        """Удаляет точки истории старше cutoff; в журнал не пишется —
+        после восстановления история подрезается заново (HistoryModel.prune)"""
+        removed = 0
+        with self.lock:
+            for series in self.history.values():
+                count = bisect_left(series, (cutoff,))
+                if count:
+                    del series[:count]
+                    removed += count
+        return removed
+
+    # Журнал и снимки
+
+    def open(self) -> 'MemoryStore':
+        """Восстанавливает данные из снимка и журнала и открывает журнал на запись"""
+        if self.directory is None:
+            return self
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            snapshot_seq = self._load_snapshot()
+            replayed = self._replay_log(snapshot_seq)
+            self._log = open(self.directory / LOG_FILE, 'a', encoding='utf-8')
+        if self.snapshot_interval:
+            self._stopped.clear()
+            self._snapshots = threading.Thread(
+                target=self._snapshot_loop, name='memory-snapshots', daemon=True
+            )
+            self._snapshots.start()
+        logger.info(
+            'Хранилище в памяти восстановлено: %d валют, %d курсов, транзакций из журнала: %d',
+            len(self.currency_rows),
+            len(self.rate_rows),
+            replayed,
+        )
+        return self
+
+    def _load_snapshot(self) -> int:
+        path = self.directory / SNAPSHOT_FILE
+        if not path.exists():
+            return 0
+        with open(path, encoding='utf-8') as file:
+            state = json.load(file)
+        if state.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f'Неподдерживаемый формат снимка: {state.get("format")}')
+        self._reset()
+        for row in map(tuple, state['currencies']):
+            self.currency_rows.append(row)
+            self.currency_index[row[1]] = self.currency_by_id[row[0]] = row
+        for row in map(tuple, state['rates']):
+            self.rate_rows.append(row)
+            self.rate_index[(row[1], row[2])] = row
+        for from_currency, to_currency, points in state['history']:
+            self.history[(from_currency, to_currency)] = [
+                tuple(point) for point in points
+            ]
+        self.next_currency_id = state['next_currency_id']
+        self.next_rate_id = state['next_rate_id']
+        self.seq = state['seq']
+        self.last_snapshot = state['created']
+        return self.seq
+
+    def _replay_log(self, snapshot_seq: int) -> int:
+        """Повторяет транзакции журнала новее снимка; оборванный хвост отрезается"""
+        path = self.directory / LOG_FILE
+        if not path.exists():
+            return 0
+        replayed, valid_size = 0, 0
+        with open(path, 'rb') as file:
+            for line in file:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('строка не дописана')
+                    seq, operations = json.loads(line)
+                except ValueError:
+                    logger.warning(
+                        'Журнал %s оборван на смещении %d, хвост отброшен',
+                        path,
+                        valid_size,
+                    )
+                    break
+                valid_size += len(line)
+                if seq <= snapshot_seq:
+                    continue  # Уже в снимке: сбой между снимком и обнулением журнала
+                for operation in operations:
+                    self._apply(operation)
+                self.seq = seq
+                replayed += 1
+        if valid_size < path.stat().st_size:
+            os.truncate(path, valid_size)
+        self.log_records = replayed
+        return replayed
+
+    def _snapshot_loop(self) -> None:
+        """Снимок раз в snapshot_interval секунд, если с прошлого были записи"""
+        while not self._stopped.wait(self.snapshot_interval):
+            try:
+                with self.lock:
+                    if self._log is None:
+                        return
+                    if self.log_records:
+                        self.snapshot()
+            except Exception:
+                logger.exception('Ошибка записи снимка хранилища в памяти')
+
+    def _write_log(self, seq: int, operations: list) -> None:
+        if self._log is None:
+            return
+        self._log.write(json.dumps([seq, operations], ensure_ascii=False) + '\n')
+        self._log.flush()  # В ОС до применения: переживает падение процесса
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self.log_records += 1
+
+    def snapshot(self) -> None:
+        """Записывает снимок через временный файл и обнуляет журнал.
+
+        Сбой между заменой снимка и обнулением журнала безопасен: транзакции
+        журнала с номером не новее снимка при восстановлении пропускаются.
+        """
+        if self.directory is None:
+            return
+        with self.lock:
+            state = {
+                'format': SNAPSHOT_FORMAT,
+                'seq': self.seq,
+                'created': time.time(),
+                'next_currency_id': self.next_currency_id,
+                'next_rate_id': self.next_rate_id,
+                'currencies': self.currency_rows,
+                'rates': self.rate_rows,
+                'history': [[*pair, points] for pair, points in self.history.items()],
+            }
+            path = self.directory / SNAPSHOT_FILE
+            temporary = path.with_suffix('.tmp')
+            with open(temporary, 'w', encoding='utf-8') as file:
+                json.dump(state, file, ensure_ascii=False, separators=(',', ':'))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, path)
+            if self._log is not None:
+                self._log.close()
+                self._log = open(self.directory / LOG_FILE, 'w', encoding='utf-8')
+            self.log_records = 0
+            self.last_snapshot = state['created']
+        logger.info('Снимок хранилища в памяти записан: транзакция %d', state['seq'])
+
+    def close(self) -> None:
+        """Останавливает периодические снимки, записывает снимок и закрывает журнал"""
+        self._stopped.set()
+        if (
+            self._snapshots is not None
+            and self._snapshots is not threading.current_thread()
+        ):
+            self._snapshots.join()
+        with self.lock:
+            if self._log is None:
+                return
+            self.snapshot()
+            self._log.close()
+            self._log = None
+
+    def stats(self) -> dict:
+        return {
+            'directory': str(self.directory) if self.directory else None,
+            'currencies': len(self.currency_rows),
+            'rates': len(self.rate_rows),
+            'seq': self.seq,
+            'log_records': self.log_records,
+            'last_snapshot': self.last_snapshot,
+        }
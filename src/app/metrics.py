@@ -0,0 +1,252 @@
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from response import Response
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5)
+
+# Шаблон маршрута текущего запроса (/currency/:code), его выставляет Router
+current_route = ContextVar('metrics_route', default=None)
+
+
+class _Shard:
+    """Счетчики одного потока: пишет только владелец, без блокировок"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = {}  # (method, route, status) -> count
+        self.latency = {}  # (method, route) -> [count по корзинам..., sum, count]
+        self.sizes = {}
+        self.queries = {}  # (statement, phase) -> гистограмма
+
+
+def _observe(histograms: dict, key, buckets: tuple, value: float) -> None:
+    state = histograms.get(key)
+    if state is None:
+        state = histograms[key] = [0] * (len(buckets) + 3)
+    state[bisect_left(buckets, value)] += 1
+    state[-2] += value
+    state[-1] += 1
+
+
+class MetricsRecorder:
+    """Метрики запросов и запросов к SQLite в формате Prometheus.
+
+    Каждый поток пишет в свой шард (threading.local), поэтому горячий путь
+    не берет блокировок; шарды суммируются только при выдаче /metrics.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()  # Только для регистрации шардов
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def request_started(self) -> None:
+        self._shard().in_flight += 1
+
+    def request_finished(
+        self, method: str, route: str, response: Response | None, seconds: float
+    ) -> None:
+        shard = self._shard()
+        shard.in_flight -= 1
+        if response is None:
+            return
+        key = (method, route or 'unmatched')
+        status_key = (*key, response.status)
+        shard.requests[status_key] = shard.requests.get(status_key, 0) + 1
+        _observe(shard.latency, key, LATENCY_BUCKETS, seconds)
+        if response.chunks is None:  # Размер потокового тела заранее неизвестен
+            _observe(shard.sizes, key, SIZE_BUCKETS, len(response.body))
+
+    def observe_query(self, statement: str, phase: str, seconds: float) -> None:
+        """phase: execute — выполнение, fetch — выборка строк"""
+        _observe(self._shard().queries, (statement, phase), QUERY_BUCKETS, seconds)
+
+    def _merged(self) -> tuple:
+        with self._lock:
+            shards = list(self._shards)
+        in_flight, requests, latency, sizes, queries = 0, {}, {}, {}, {}
+        for shard in shards:
+            in_flight += shard.in_flight
+            for key, count in list(shard.requests.items()):
+                requests[key] = requests.get(key, 0) + count
+            for source, target in (
+                (shard.latency, latency),
+                (shard.sizes, sizes),
+                (shard.queries, queries),
+            ):
+                for key, state in list(source.items()):
+                    merged = target.setdefault(key, [0] * len(state))
+                    for i, value in enumerate(state):
+                        merged[i] += value
+        return in_flight, requests, latency, sizes, queries
+
+    def render(self) -> str:
+        """Текст в формате Prometheus exposition 0.0.4"""
+        in_flight, requests, latency, sizes, queries = self._merged()
+        lines = [
+            '# HELP http_requests_total Обработанные HTTP-запросы',
+            '# TYPE http_requests_total counter',
+        ]
+        for (method, route, status), count in sorted(requests.items()):
+            labels = _labels(method=method, route=route, status=status)
+            lines.append(f'http_requests_total{{{labels}}} {count}')
+        lines += [
+            '# HELP http_requests_in_flight Запросы в обработке',
+            '# TYPE http_requests_in_flight gauge',
+            f'http_requests_in_flight {in_flight}',
+        ]
+        _render_histogram(
+            lines,
+            'http_request_duration_seconds',
+            'Время обработки запроса',
+            latency,
+            LATENCY_BUCKETS,
+            ('method', 'route'),
+        )
+        _render_histogram(
+            lines,
+            'http_response_size_bytes',
+            'Размер тела ответа',
+            sizes,
+            SIZE_BUCKETS,
+            ('method', 'route'),
+        )
+        _render_histogram(
+            lines,
+            'sqlite_query_duration_seconds',
+            'Время выполнения и выборки запросов SQLite',
+            queries,
+            QUERY_BUCKETS,
+            ('statement', 'phase'),
+        )
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _render_histogram(
+    lines: list, name: str, help_text: str, histograms: dict, buckets: tuple, names
+) -> None:
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, state in sorted(histograms.items()):
+        labels = _labels(**dict(zip(names, key, strict=True)))
+        cumulative = 0
+        for bound, count in zip((*buckets, '+Inf'), state[:-2], strict=True):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {state[-2]}')
+        lines.append(f'{name}_count{{{labels}}} {state[-1]}')
+
+
+class Exposition:
+    """Результат обработчика /metrics; render_response отдает его как есть"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def to_response(self, status_code: int = 200) -> Response:
+        return Response(
+            status_code,
+            self.text.encode('utf-8'),
+            PROMETHEUS_CONTENT_TYPE,
+            headers={'Cache-Control': 'no-store'},
+        )
+
+
+# Общий на процесс регистратор: пишут AppContext и курсоры моделей
+recorder = MetricsRecorder()
+
+_STATEMENTS = {}
+
+
+def _statement(sql: str) -> str:
+    """Тип запроса (select, insert, ...) по первому слову SQL"""
+    statement = _STATEMENTS.get(sql)
+    if statement is None:
+        words = sql.split(None, 1)
+        statement = words[0].lower() if words else 'unknown'
+        if len(_STATEMENTS) < 1024:  # SQL в моделях — константы, но не доверяем
+            _STATEMENTS[sql] = statement
+    return statement
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Курсор, который учитывает время execute и выборки строк"""
+
+    statement = 'unknown'
+
+    def execute(self, sql: str, parameters=()):
+        self.statement = _statement(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            recorder.observe_query(
+                self.statement, 'execute', time.perf_counter() - start
+            )
+
+    def executemany(self, sql: str, seq_of_parameters):
+        self.statement = _statement(sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            recorder.observe_query(
+                self.statement, 'execute', time.perf_counter() - start
+            )
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            recorder.observe_query(self.statement, 'fetch', time.perf_counter() - start)
+
+    def fetchmany(self, size: int = None):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            recorder.observe_query(self.statement, 'fetch', time.perf_counter() - start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            recorder.observe_query(self.statement, 'fetch', time.perf_counter() - start)
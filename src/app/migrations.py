@@ -0,0 +1,212 @@
+import logging
+import sqlite3
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: callable  # apply(cursor) внутри транзакции миграции
+
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    """Регистрирует функцию как миграцию схемы до версии version"""
+
+    def register(apply: callable) -> callable:
+        MIGRATIONS.append(Migration(version, description, apply))
+        MIGRATIONS.sort(key=lambda item: item.version)
+        return apply
+
+    return register
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def migrate(conn: sqlite3.Connection, target: int = None) -> int:
+    """Применяет недостающие миграции по PRAGMA user_version; возвращает версию.
+
+    Каждая миграция выполняется в своей транзакции BEGIN IMMEDIATE вместе
+    с записью новой версии, так что прерванная миграция не оставляет схему
+    наполовину измененной, а процессы, стартующие одновременно (pre-fork),
+    применяют ее ровно один раз.
+    """
+    target = latest_version() if target is None else target
+    version = schema_version(conn)
+    if version > latest_version():
+        raise RuntimeError(
+            f'Схема БД версии {version} новее приложения ({latest_version()})'
+        )
+    for item in MIGRATIONS:
+        if item.version <= version or item.version > target:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Другой процесс мог применить миграцию, пока мы ждали блокировку
+            if schema_version(conn) < item.version:
+                item.apply(cursor)
+                cursor.execute(f'PRAGMA user_version = {item.version:d}')
+                logger.info('Миграция схемы %d: %s', item.version, item.description)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return schema_version(conn)
+
+
+# Текущее время в секундах Unix с долями (julianday есть в любой версии SQLite)
+NOW_SQL = "(julianday('now') - 2440587.5) * 86400.0"
+
+
+def _next_ts_sql(from_sql: str, to_sql: str) -> str:
+    """Время точки истории строго растет внутри пары: 'now' в SQLite с
+    точностью до миллисекунды, и две записи подряд иначе совпали бы по ключу"""
+    return f"""MAX({NOW_SQL}, COALESCE((
+        SELECT MAX(ts) FROM exchange_rate_history
+        WHERE from_currency = {from_sql} AND to_currency = {to_sql}
+    ), 0) + 0.001)"""
+
+
+def _history_triggers(cursor: sqlite3.Cursor, from_sql: str, to_sql: str) -> None:
+    """Триггеры, которые пишут каждую запись курса в exchange_rate_history.
+
+    Колонка REAL не мешает сохранить текст, который не похож на число: такие
+    значения в историю не попадают, иначе агрегаты по ней падали бы на чтении.
+    """
+    values = f'{from_sql}, {to_sql}, {_next_ts_sql(from_sql, to_sql)}, CAST(NEW.rate AS REAL)'
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS exchange_rates_history_insert
+        AFTER INSERT ON exchange_rates
+        WHEN typeof(NEW.rate) IN ('integer', 'real')
+        BEGIN
+            INSERT INTO exchange_rate_history (from_currency, to_currency, ts, rate)
+            VALUES ({values});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS exchange_rates_history_update
+        AFTER UPDATE OF rate ON exchange_rates
+        WHEN NEW.rate IS NOT OLD.rate AND typeof(NEW.rate) IN ('integer', 'real')
+        BEGIN
+            INSERT INTO exchange_rate_history (from_currency, to_currency, ts, rate)
+            VALUES ({values});
+        END
+    """)
+
+
+@migration(1, 'валюты, курсы с кодами валют и история курсов')
+def _base_schema(cursor: sqlite3.Cursor) -> None:
+    """Схема до появления миграций; IF NOT EXISTS — базы, созданные init_db раньше"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS currencies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            sign TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS exchange_rates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_currency TEXT NOT NULL,
+            to_currency TEXT NOT NULL,
+            rate REAL NOT NULL,
+            UNIQUE(from_currency, to_currency),
+            FOREIGN KEY(from_currency) REFERENCES currencies(code) ON DELETE CASCADE,
+            FOREIGN KEY(to_currency) REFERENCES currencies(code) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'exchange_rate_history'"
+    )
+    history_created = cursor.fetchone() is None
+    # Первичный ключ (from, to, ts) в таблице WITHOUT ROWID — покрывающий индекс
+    # для запросов по периоду; индекс по ts — для удаления по сроку хранения
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS exchange_rate_history (
+            from_currency TEXT NOT NULL,
+            to_currency TEXT NOT NULL,
+            ts REAL NOT NULL,
+            rate REAL NOT NULL,
+            PRIMARY KEY(from_currency, to_currency, ts)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_exchange_rate_history_ts ON exchange_rate_history(ts)'
+    )
+    _history_triggers(cursor, 'NEW.from_currency', 'NEW.to_currency')
+    if history_created:
+        # Существующая база: текущие курсы становятся первой точкой истории
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO exchange_rate_history (from_currency, to_currency, ts, rate)
+            SELECT from_currency, to_currency, {NOW_SQL}, CAST(rate AS REAL) FROM exchange_rates
+            WHERE typeof(rate) IN ('integer', 'real')
+        """)
+
+
+@migration(2, 'курсы ссылаются на валюты по id, покрывающие индексы')
+def _integer_foreign_keys(cursor: sqlite3.Cursor) -> None:
+    """exchange_rates пересоздается с base_currency_id/target_currency_id.
+
+    id курсов сохраняются; курсы, чьих валют нет в currencies, отбрасываются.
+    Точный курс пары ищется по уникальному индексу (base, target); индексы
+    (base, target, rate) и (target, base, rate) покрывают фильтры по базовой
+    и целевой валюте и поиск обратных курсов без чтения таблицы.
+    """
+    cursor.execute("""
+        CREATE TABLE exchange_rates_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            base_currency_id INTEGER NOT NULL
+                REFERENCES currencies(id) ON DELETE CASCADE,
+            target_currency_id INTEGER NOT NULL
+                REFERENCES currencies(id) ON DELETE CASCADE,
+            rate REAL NOT NULL,
+            UNIQUE(base_currency_id, target_currency_id)
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO exchange_rates_new (id, base_currency_id, target_currency_id, rate)
+        SELECT er.id, base.id, target.id, er.rate
+        FROM exchange_rates er
+        JOIN currencies base ON base.code = er.from_currency
+        JOIN currencies target ON target.code = er.to_currency
+    """)
+    # Нумерация AUTOINCREMENT продолжается с прежнего значения, даже если
+    # последние строки были отброшены
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'exchange_rates'")
+    sequence = cursor.fetchone()
+    cursor.execute('DROP TABLE exchange_rates')  # Вместе со старыми триггерами
+    cursor.execute('ALTER TABLE exchange_rates_new RENAME TO exchange_rates')
+    if sequence is not None:
+        cursor.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'exchange_rates'",
+            sequence,
+        )
+    cursor.execute("""
+        CREATE INDEX idx_exchange_rates_pair_rate
+        ON exchange_rates(base_currency_id, target_currency_id, rate)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_exchange_rates_target_rate
+        ON exchange_rates(target_currency_id, base_currency_id, rate)
+    """)
+    # История по-прежнему хранит коды: она переживает удаление валют
+    _history_triggers(
+        cursor,
+        '(SELECT code FROM currencies WHERE id = NEW.base_currency_id)',
+        '(SELECT code FROM currencies WHERE id = NEW.target_currency_id)',
+    )
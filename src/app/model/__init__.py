@@ -1,6 +1,13 @@
 from .conversion import ConversionModel
 from .currencies import CurrencyModel
 from .exchange_rates import ExchangeRateModel
+from .history import HistoryModel
+from .memory import (
+    MemoryConversionModel,
+    MemoryCurrencyModel,
+    MemoryExchangeRateModel,
+    MemoryHistoryModel,
+)
 
 # This file can be used to initialize the `model` package.
 # You can import necessary modules or define package-level variables here.
@@ -8,4 +15,13 @@ from .exchange_rates import ExchangeRateModel
 # Example: Importing a module within the package
 
 # You can also define package-level variables or functions if needed
-__all__ = ['CurrencyModel', 'ExchangeRateModel', 'ConversionModel']
+__all__ = [
+    'CurrencyModel',
+    'ExchangeRateModel',
+    'ConversionModel',
+    'HistoryModel',
+    'MemoryCurrencyModel',
+    'MemoryExchangeRateModel',
+    'MemoryConversionModel',
+    'MemoryHistoryModel',
+]
@@ -1,14 +1,146 @@
 import logging
 import sqlite3
 
+from cache import MISSING, LRUCache
+from db_pool import ConnectionPool
+from events import DataEvent, EventBus
+from metrics import TimedCursor
+from serializer import STREAM_CHUNK_ROWS, JSONRows, Page
+
+from .projection import Projection
+
 logger = logging.getLogger(__name__)
 
 
 class BaseModel:
     """Базовая модель для работы с базой данных SQLite."""
 
-    def __init__(self, connector: sqlite3.Connection = None):
+    def __init__(
+        self,
+        connector: sqlite3.Connection | ConnectionPool = None,
+        events: EventBus = None,
+        cache: LRUCache = None,
+    ):
         self.connector = connector
+        # Шина событий общая для моделей одного контроллера
+        self.events = events if events is not None else EventBus()
+        self.cache = cache  # Кэш чтения по ключу; None — без кэширования
+        self._data_versions = {}  # Подключение -> последний PRAGMA data_version
+
+    def _connection(self) -> sqlite3.Connection:
+        # При работе через пул берем подключение, привязанное к текущему потоку
+        if isinstance(self.connector, ConnectionPool):
+            return self.connector.current()
+        return self.connector
 
     def _get_connection_and_cursor(self) -> tuple[sqlite3.Connection, sqlite3.Cursor]:
-        return self.connector, self.connector.cursor()
+        conn = self._connection()
+        return conn, conn.cursor(TimedCursor)  # Время запросов идет в /metrics
+
+    def _external_writes(self) -> bool:
+        """Были ли коммиты других подключений с прошлой проверки.
+
+        Свои записи модели узнают из EventBus, а записи других процессов
+        (pre-fork, планировщик, второй сервер на том же файле) — только так.
+        PRAGMA data_version меняется при чужих коммитах; счетчик у каждого
+        подключения свой, поэтому он запоминается по подключению, и первая
+        проверка через подключение считается изменением. Записи через другие
+        подключения пула этого процесса тоже видны как изменение — лишняя
+        перезагрузка, но не устаревшие данные.
+        """
+        conn = self._connection()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        changed = self._data_versions.get(conn) != version
+        self._data_versions[conn] = version
+        return changed
+
+    @staticmethod
+    def _collection_sql(
+        source: str,
+        id_column: str,
+        projection: Projection,
+        filters: list = (),
+        after: int = 0,
+        limit: int = None,
+    ) -> tuple[str, list]:
+        """SELECT коллекции: проекция, фильтры и keyset-пагинация по id.
+
+        При limit id последней строки добавляется отдельной колонкой (для
+        курсора), а строк выбирается на одну больше — признак следующей страницы.
+        """
+        columns = list(projection.columns)
+        where, parameters = [f'{id_column} > ?'], [after]
+        for condition, value in filters:  # Условие с одним параметром '?'
+            where.append(condition)
+            parameters.append(value)
+        if limit is not None:
+            columns.append(id_column)
+        sql = (
+            f'SELECT {", ".join(columns)} FROM {source} {" ".join(projection.joins)}'
+            f' WHERE {" AND ".join(where)} ORDER BY {id_column}'
+        )
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit + 1)
+        return sql, parameters
+
+    def _fetch_collection(
+        self, sql: str, parameters: list, template: str, to_dict, limit: int = None
+    ) -> JSONRows | Page:
+        conn, cursor = self._get_connection_and_cursor()
+        cursor.execute(sql, parameters)
+        rows = cursor.fetchall()
+        if limit is None:
+            return JSONRows(rows, template, to_dict)
+        next_cursor = str(rows[limit - 1][-1]) if len(rows) > limit else None
+        return Page(
+            JSONRows([row[:-1] for row in rows[:limit]], template, to_dict), next_cursor
+        )
+
+    def _stream(self, sql: str, parameters=(), size: int = STREAM_CHUNK_ROWS):
+        """Пачки строк SELECT через fetchmany для потоковых ответов.
+
+        Генератор выполняется уже после выхода из обработчика, поэтому в
+        режиме пула берет собственное подключение и держит его до конца
+        выборки или до close().
+        """
+        pool = self.connector if isinstance(self.connector, ConnectionPool) else None
+        conn = pool.acquire() if pool is not None else self.connector
+        cursor = conn.cursor(TimedCursor)
+        try:
+            cursor.execute(sql, parameters)
+            while rows := cursor.fetchmany(size):
+                yield rows
+        finally:
+            cursor.close()
+            if pool is not None:
+                pool.release(conn)
+
+    def _cached(self, key, loader: callable):
+        """Читает значение через кэш модели (read-through).
+
+        Записи своего процесса сбрасывают кэш через EventBus, чужие —
+        замечаются по PRAGMA data_version до чтения; TTL только страхует.
+        """
+        if self.cache is None:
+            return loader()
+        if self._external_writes():
+            self.cache.clear()
+        version = self.cache.version
+        value = self.cache.get(key)
+        if value is MISSING:
+            value = loader()
+            self.cache.set(key, value, version=version)
+        return value
+
+    def _invalidate(self, key=None) -> None:
+        """Сбрасывает запись кэша (или весь кэш, если key не указан)"""
+        if self.cache is None:
+            return
+        if key is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(key)
+
+    def _publish(self, kind: str, **fields) -> None:
+        self.events.publish(DataEvent(kind, **fields))
@@ -1,109 +1,272 @@
 import logging
+import math
 
+import numpy as np
 from dto import CurrencyDTO, CurrencyExchangeDTO
-from errors import ExchangeRateNotFoundError
+from errors import (
+    CurrencyNotFoundError,
+    ExchangeRateNotFoundError,
+    InvalidAmountFormatError,
+    InvalidBatchFormatError,
+    MissingFormFieldError,
+)
+from events import (
+    CLEARED,
+    CURRENCIES_UPSERTED,
+    CURRENCY_ADDED,
+    RATE_ADDED,
+    RATE_UPDATED,
+    RATES_UPSERTED,
+    DataEvent,
+    EventBus,
+)
 
 from .base import BaseModel
+from .cross_rates import CrossRateTable, diff_paths
+from .interfaces import ConversionStore
+from .rate_graph import RateGraph
+from .rate_matrix import RateMatrix
 
 logger = logging.getLogger(__name__)
 
 
-class ConversionModel(BaseModel):
-    def get_converted_currency(
-        self, from_currency: str, to_currency: str, amount: float
-    ) -> dict:
-        from_currency = from_currency.upper()
-        to_currency = to_currency.upper()
+class ConversionModel(BaseModel, ConversionStore):
+    """Конвертация валют через граф курсов в памяти.
+
+    Граф загружается из БД при первом обращении и дальше поддерживается
+    событиями моделей этого процесса; записи других процессов замечаются по
+    PRAGMA data_version перед каждым чтением, и граф с матрицей
+    перезагружаются. materialized=True — вместо ленивого кэша путей
+    таблица кросс-курсов всех пар (CrossRateTable), которую записи
+    обновляют на месте; check_cross_rates() сверяет ее с построенной заново.
+    """
+
+    def __init__(
+        self, connector=None, events: EventBus = None, materialized: bool = False
+    ):
+        super().__init__(connector, events)
+        self.graph = CrossRateTable() if materialized else RateGraph()
+        self.matrix = RateMatrix()
+        self.events.subscribe(self._on_data_event)
+
+    def _on_data_event(self, event: DataEvent) -> None:
+        if event.kind == CLEARED:
+            self.graph.clear()
+            self.matrix.clear()
+            return
+        if event.kind in (CURRENCY_ADDED, CURRENCIES_UPSERTED):
+            self.matrix.loaded = False  # Новые строки и столбцы: перестроим при запросе
+        elif self.matrix.loaded:
+            if event.kind == RATES_UPSERTED:
+                self.matrix.set_rates(
+                    [(c['from'], c['to'], c['rate']) for c in event.payload['changes']]
+                )
+            elif event.kind in (RATE_ADDED, RATE_UPDATED):
+                self.matrix.set_rate(event.from_currency, event.to_currency, event.rate)
+
+        if event.kind in (RATES_UPSERTED, CURRENCIES_UPSERTED):
+            # Новые курсы без id в событии: граф перечитается из БД;
+            # таблица кросс-курсов пересчитывает изменения существующих пар на месте
+            if not (
+                event.kind == RATES_UPSERTED
+                and self.graph.loaded
+                and isinstance(self.graph, CrossRateTable)
+                and self.graph.update_rates(event.payload['changes'])
+            ):
+                self.graph.loaded = False
+            return
+        if not self.graph.loaded:
+            return  # Изменение попадет в граф при загрузке из БД
+        if event.kind == CURRENCY_ADDED:
+            self.graph.add_currency(event.payload)
+        elif event.kind in (RATE_ADDED, RATE_UPDATED):
+            self.graph.set_rate(
+                event.payload['id'],
+                event.payload['baseCurrency'],
+                event.payload['targetCurrency'],
+                event.rate,
+            )
+
+    def _fetch_rates(self) -> tuple[list[dict], list[tuple]]:
         conn, cursor = self._get_connection_and_cursor()
+        cursor.execute('SELECT id, code, name, sign FROM currencies')
+        currencies = [CurrencyDTO(*row).to_dict() for row in cursor.fetchall()]
+        # Коды подставляются по id без JOIN: выборка идет по покрывающему индексу
+        codes = {currency['id']: currency['code'] for currency in currencies}
+        cursor.execute(
+            'SELECT id, base_currency_id, target_currency_id, rate FROM exchange_rates'
+        )
+        rates = [
+            (rate_id, codes[base], codes[target], rate)
+            for rate_id, base, target, rate in cursor.fetchall()
+        ]
+        return currencies, rates
+
+    def _sync(self) -> None:
+        """Перезагружает граф и матрицу при записях других процессов"""
+        if self._external_writes():
+            self.graph.loaded = False
+            self.matrix.loaded = False
 
-        query = """
-        SELECT 'direct' AS source,
-            er.id,
-            base.id, base.code, base.name, base.sign,
-            target.id, target.code, target.name, target.sign,
-            er.rate
-        FROM exchange_rates er
-        JOIN currencies base ON er.from_currency = base.code
-        JOIN currencies target ON er.to_currency = target.code
-        WHERE er.from_currency = ? AND er.to_currency = ?
-
-        UNION ALL
-
-        SELECT 'reverse' AS source,
-            er.id,
-            target.id, target.code, target.name, target.sign,
-            base.id, base.code, base.name, base.sign,
-            1.0 / er.rate
-        FROM exchange_rates er
-        JOIN currencies base ON er.from_currency = base.code
-        JOIN currencies target ON er.to_currency = target.code
-        WHERE er.from_currency = ? AND er.to_currency = ?
-
-        UNION ALL
-
-        SELECT 'via_usd' AS source,
-            -1,
-            cur1.id, cur1.code, cur1.name, cur1.sign,
-            cur2.id, cur2.code, cur2.name, cur2.sign,
-            r2.rate / r1.rate
-        FROM exchange_rates r1
-        JOIN exchange_rates r2 ON r1.from_currency = ? AND r2.from_currency = ?
-        JOIN currencies cur1 ON cur1.code = ?
-        JOIN currencies cur2 ON cur2.code = ?
-        WHERE r1.to_currency = ? AND r2.to_currency = ?
+    def _ensure_graph(self) -> None:
+        self._sync()
+        if not self.graph.loaded:
+            self._load_graph()
 
+    def _load_graph(self) -> None:
+        currencies, rates = self._fetch_rates()
+        self.graph.load(currencies, rates)
+        logger.info('Граф курсов загружен: %d валют', len(currencies))
+
+    def check_cross_rates(self) -> dict:
+        """Строит кросс-курсы заново по данным хранилища и сравнивает с текущими.
+
+        Сверяется таблица в том виде, в каком она отвечала до проверки: записи
+        других процессов (externalWrites) видны как расхождения, после чего
+        таблица перезагружается.
         """
-        base = 'USD'
-        cursor.execute(
-            query,
-            (
-                from_currency,
-                to_currency,
-                to_currency,
-                from_currency,
-                base,
-                base,
-                from_currency,
-                to_currency,
-                from_currency,
-                to_currency,
-            ),
+        # Только что загруженная таблица заведомо свежая
+        external = self._external_writes() and self.graph.loaded
+        if not self.graph.loaded:
+            self._load_graph()
+        rebuilt = CrossRateTable()
+        rebuilt.load(*self._fetch_rates())
+        report = diff_paths(
+            rebuilt._paths,
+            dict(self.graph._paths),
+            complete=isinstance(self.graph, CrossRateTable),
         )
+        report['externalWrites'] = external
+        if not report['consistent']:
+            logger.warning('Кросс-курсы расходятся с хранилищем: %s', report['counts'])
+        if external:
+            self.graph.loaded = False
+            self.matrix.loaded = False
+        return report
 
-        row = cursor.fetchone()
-        if not row:
-            raise ExchangeRateNotFoundError(from_currency, to_currency)
+    def convert_batch(self, items: list[dict]) -> dict:
+        """Конвертирует пакет {from, to, amount}.
+
+        Курс ищется один раз на уникальную пару, суммы пересчитываются
+        одной векторной операцией. Строки с ошибкой (в том числе не объекты:
+        нечитаемые строки NDJSON приходят как None) получают поле error.
+        """
+        self._ensure_graph()
+
+        count = len(items)
+        pair_index = {}  # (from, to) -> номер в массиве уникальных пар
+        item_pairs = np.full(count, -1, dtype=np.int64)
+        amounts = np.zeros(count)
+        results = [None] * count
+
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[i] = {
+                    'error': InvalidBatchFormatError('Row must be an object').message
+                }
+                continue
+            from_currency = str(item.get('from') or '').upper()
+            to_currency = str(item.get('to') or '').upper()
+            amount = item.get('amount')
+            if not from_currency or not to_currency or amount in (None, ''):
+                results[i] = {'error': MissingFormFieldError().message}
+                continue
+            try:
+                amount = float(amount)
+            except (TypeError, ValueError):
+                amount = math.nan
+            if not math.isfinite(amount):  # nan и inf испортили бы векторный пересчет
+                results[i] = {'error': InvalidAmountFormatError().message}
+                continue
+            amounts[i] = amount
+            item_pairs[i] = pair_index.setdefault(
+                (from_currency, to_currency), len(pair_index)
+            )
+
+        paths = [self.graph.find(*pair) for pair in pair_index]
+        rates = np.array([path.rate if path is not None else np.nan for path in paths])
+
+        valid = item_pairs >= 0
+        item_rates = np.full(count, np.nan)
+        item_rates[valid] = rates[item_pairs[valid]]
+        converted = np.round(item_rates * amounts, 2).tolist()
+        rounded_rates = np.round(item_rates, 2).tolist()
+        rounded_amounts = np.round(amounts, 2).tolist()
+
+        pairs = list(pair_index)
+        failed = 0
+        for i in range(count):
+            if results[i] is not None:
+                failed += 1
+                continue
+            pair_no = item_pairs[i]
+            path = paths[pair_no]
+            from_currency, to_currency = pairs[pair_no]
+            if path is None:
+                failed += 1
+                results[i] = {
+                    'error': ExchangeRateNotFoundError(
+                        from_currency, to_currency
+                    ).message
+                }
+                continue
+            results[i] = {
+                'from': from_currency,
+                'to': to_currency,
+                'rate': rounded_rates[i],
+                'amount': rounded_amounts[i],
+                'convertedAmount': converted[i],
+                'method': path.method,
+            }
 
-        source = row[0]  # 'direct', 'reverse' или 'via_usd'
+        logger.info(
+            'Пакетная конвертация: %d строк, %d уникальных пар, ошибок: %d',
+            count,
+            len(pairs),
+            failed,
+        )
+        return {
+            'count': count,
+            'failed': failed,
+            'pairs': len(pairs),
+            'results': results,
+        }
 
-        logger.info(f'Метод определения источника курса: {source}')
+    def get_rate_matrix(self, codes: list[str] = None) -> dict:
+        """Матрица кросс-курсов всех валют (или только перечисленных)"""
+        self._sync()
+        if not self.matrix.loaded:
+            self.matrix.load(*self._fetch_rates())
+        if codes is not None:
+            missing = [code for code in codes if code not in self.matrix]
+            if missing:
+                raise CurrencyNotFoundError(*missing)
+        codes, ids, matrix = self.matrix.snapshot(codes)
+        rates = np.where(np.isnan(matrix), None, matrix).tolist()
+        return {'codes': codes, 'ids': ids, 'rates': rates}
 
-        (
-            ex_id,
-            base_id,
-            base_code,
-            base_name,
-            base_sign,
-            target_id,
-            target_code,
-            target_name,
-            target_sign,
-            rate,
-        ) = row[1:]  # Получение значений из кортежа row, начиная с индекса 1
+    def get_converted_currency(
+        self, from_currency: str, to_currency: str, amount: float
+    ) -> dict:
+        from_currency = from_currency.upper()
+        to_currency = to_currency.upper()
+        self._ensure_graph()
+
+        path = self.graph.find(from_currency, to_currency)
+        if path is None:
+            raise ExchangeRateNotFoundError(from_currency, to_currency)
 
-        base_currency = CurrencyDTO(base_id, base_code, base_name, base_sign).to_dict()
-        target_currency = CurrencyDTO(
-            target_id, target_code, target_name, target_sign
-        ).to_dict()
+        logger.info('Метод определения источника курса: %s', path.method)
 
         return CurrencyExchangeDTO(
-            ex_id,
-            base_currency,
-            target_currency,
-            round(rate, 2),
+            path.rate_id,
+            self.graph.currency(from_currency),
+            self.graph.currency(to_currency),
+            round(path.rate, 2),
             round(amount, 2),
-            round(rate * amount, 2),
-            source,
+            round(path.rate * amount, 2),
+            path.method,
+            list(path.codes),
         ).to_converted_dict()
 
     def get_conversion_info(
@@ -117,12 +280,14 @@ class ConversionModel(BaseModel):
                         er.rate,
                         base.id, base.code, base.name, base.sign,
                         target.id, target.code, target.name, target.sign
-                    FROM exchange_rates er
-                    JOIN currencies base ON er.from_currency = base.code
-                    JOIN currencies target ON er.to_currency = target.code
-                    WHERE er.from_currency = ? AND er.to_currency = ?
+                    FROM currencies base
+                    JOIN currencies target ON target.code = ?
+                    JOIN exchange_rates er
+                        ON er.base_currency_id = base.id
+                        AND er.target_currency_id = target.id
+                    WHERE base.code = ?
                 """,
-                (from_currency.upper(), to_currency.upper()),
+                (to_currency.upper(), from_currency.upper()),
             )
             row = cursor.fetchone()
 
@@ -0,0 +1,159 @@
+import math
+
+from .rate_graph import ConversionPath, RateGraph, _edge_key
+
+DIFF_SAMPLE = 100  # Сколько расхождений каждого вида показывать в отчете
+
+
+class CrossRateTable(RateGraph):
+    """Материализованные кросс-курсы: путь и курс для каждой связной пары.
+
+    Таблица строится целиком при загрузке (обход в ширину из каждой валюты),
+    а запись курса пересчитывает только зависящие от нее строки:
+
+    - курс существующего ребра — строки, чьи пути через него идут (сами пути
+      не меняются, пересчитывается произведение курсов);
+    - новое ребро u—v — строки валют-источников, для которых путь через ребро
+      не длиннее текущего: обход из остальных источников его не использует.
+
+    find() — одно обращение к словарю без поиска и блокировки. Пути и методы
+    совпадают с RateGraph, так что ответы /convert не зависят от режима.
+    """
+
+    def load(self, currencies: list[dict], rates: list[tuple]) -> None:
+        with self._lock:
+            super().load(currencies, rates)
+            for source in list(self._neighbors):
+                self._refresh_source(source)
+
+    def find(self, from_code: str, to_code: str) -> ConversionPath | None:
+        return self._paths.get((from_code, to_code))
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def set_rate(self, rate_id: int, base: dict, target: dict, rate: float) -> None:
+        from_code, to_code = base['code'], target['code']
+        with self._lock:
+            self._currencies[from_code] = base
+            self._currencies[to_code] = target
+            if to_code in self._neighbors.get(from_code, ()):
+                self._rates[(from_code, to_code)] = (rate_id, rate)
+                self._refresh_edges([_edge_key(from_code, to_code)])
+                return
+            # Затронутые источники считаются по расстояниям до появления ребра
+            sources = self._affected_sources(from_code, to_code)
+            self._rates[(from_code, to_code)] = (rate_id, rate)
+            self._neighbors[from_code].add(to_code)
+            self._neighbors[to_code].add(from_code)
+            for source in sources:
+                self._refresh_source(source)
+
+    def update_rates(self, changes: list[dict]) -> bool:
+        """Пакет курсов {'from', 'to', 'rate'} (событие RATES_UPSERTED).
+
+        Применяется на месте, только если все пары уже есть в таблице курсов;
+        для новых пар id строк неизвестны — возвращает False, и таблица
+        загружается заново.
+        """
+        with self._lock:
+            if any(
+                (change['from'], change['to']) not in self._rates for change in changes
+            ):
+                return False
+            for change in changes:
+                pair = (change['from'], change['to'])
+                self._rates[pair] = (self._rates[pair][0], change['rate'])
+            self._refresh_edges({_edge_key(c['from'], c['to']) for c in changes})
+            return True
+
+    def _refresh_edges(self, edges) -> None:
+        pairs = set()
+        for edge in edges:
+            pairs.update(self._dependents.get(edge, ()))
+        for pair in pairs:
+            self._paths[pair] = self._path_for(self._paths[pair].codes)
+
+    def _refresh_source(self, source: str) -> None:
+        previous = self._bfs(source)
+        for target in previous:
+            if target != source:
+                self._store(
+                    (source, target), self._path_for(self._codes_to(previous, target))
+                )
+
+    def _store(self, pair: tuple, path: ConversionPath) -> None:
+        self._invalidate(pair)  # Снимает старый путь из зависимостей ребер
+        self._paths[pair] = path
+        for a, b in zip(path.codes, path.codes[1:], strict=False):
+            self._dependents[_edge_key(a, b)].add(pair)
+
+    def _affected_sources(self, u: str, v: str) -> set:
+        """Источники, для которых новое ребро u—v дает путь не длиннее текущего.
+
+        При равной длине обход в ширину тоже может выбрать путь через ребро,
+        поэтому сравнение нестрогое.
+        """
+        dist_u = self._distances(u)
+        dist_v = self._distances(v)
+        nodes = dist_u.keys() | dist_v.keys()
+        infinity = float('inf')
+        sources = set()
+        for source in nodes:
+            for target in nodes:
+                if source == target:
+                    continue
+                path = self._paths.get((source, target))
+                current = path.hops if path is not None else infinity
+                via_edge = min(
+                    dist_u.get(source, infinity) + 1 + dist_v.get(target, infinity),
+                    dist_v.get(source, infinity) + 1 + dist_u.get(target, infinity),
+                )
+                if via_edge <= current:
+                    sources.add(source)
+                    break
+        return sources
+
+
+def diff_paths(expected: dict, actual: dict, complete: bool = True) -> dict:
+    """Расхождения строк кросс-курсов с построенными заново.
+
+    complete=False — у actual ленивый кэш путей (RateGraph): отсутствующие
+    строки не считаются ошибкой.
+    """
+    missing = [pair for pair in expected if pair not in actual] if complete else []
+    extra = [
+        pair
+        for pair, path in actual.items()
+        if path is not None and pair not in expected
+    ]
+    changed = []
+    for pair, path in actual.items():
+        reference = expected.get(pair)
+        if path is None or reference is None:
+            continue
+        if (
+            path.codes != reference.codes
+            or path.method != reference.method
+            or not (math.isclose(path.rate, reference.rate, rel_tol=1e-12))
+        ):
+            changed.append(
+                {
+                    'pair': ''.join(pair),
+                    'expected': {'path': list(reference.codes), 'rate': reference.rate},
+                    'actual': {'path': list(path.codes), 'rate': path.rate},
+                }
+            )
+    return {
+        'consistent': not (missing or extra or changed),
+        'rows': len(expected),
+        'checked': len(actual),
+        'missing': [''.join(pair) for pair in missing[:DIFF_SAMPLE]],
+        'extra': [''.join(pair) for pair in extra[:DIFF_SAMPLE]],
+        'changed': changed[:DIFF_SAMPLE],
+        'counts': {
+            'missing': len(missing),
+            'extra': len(extra),
+            'changed': len(changed),
+        },
+    }
@@ -1,15 +1,50 @@
 import sqlite3
 
 from dto import CurrencyDTO
-from errors import CurrencyAlreadyExistsError, CurrencyNotFoundError
+from errors import BulkConflictError, CurrencyAlreadyExistsError, CurrencyNotFoundError
+from events import CLEARED, CURRENCIES_UPSERTED, CURRENCY_ADDED
+from serializer import JSONRows, Page, RowStream
 
 from .base import BaseModel
+from .interfaces import CurrencyStore
+from .projection import Field, Projection
 
+SELECT_CURRENCIES = 'SELECT id, code, name, sign FROM currencies'
 
-class CurrencyModel(BaseModel):
+# Поля ответа для ?fields=
+CURRENCY_FIELDS = {
+    'id': Field(('id',), '%s'),
+    'code': Field(('code',), '%s'),
+    'name': Field(('name',), '%s'),
+    'sign': Field(('sign',), '%s'),
+}
+
+
+def plan_bulk_currencies(rows: list[tuple], existing, upsert: bool) -> tuple:
+    """Разбор пакета валют: (code, name, sign) к записи, ошибки строк, число обновлений"""
+    values, errors, seen = [], [], set()
+    updated = 0
+    for index, code, name, sign in rows:
+        if code in seen:
+            errors.append((index, f"Duplicate currency '{code}' in request"))
+            continue
+        seen.add(code)
+        if code in existing:
+            if not upsert:
+                errors.append((index, CurrencyAlreadyExistsError(code).message))
+                continue
+            updated += 1
+        values.append((code, name, sign))
+    return values, errors, updated
+
+
+class CurrencyModel(BaseModel, CurrencyStore):
     """Модель для работы с валютами в базе данных."""
 
     def get_currency_by_code(self, code: str) -> dict:
+        return self._cached(code, lambda: self._fetch_currency(code))
+
+    def _fetch_currency(self, code: str) -> dict:
         conn, cursor = self._get_connection_and_cursor()
         cursor.execute(
             'SELECT id, code, name, sign FROM currencies WHERE code = ?', (code,)
@@ -19,12 +54,30 @@ class CurrencyModel(BaseModel):
             raise CurrencyNotFoundError(code)
         return CurrencyDTO(*row).to_dict()
 
-    def get_currencies(self) -> list[dict]:
-        conn, cursor = self._get_connection_and_cursor()
+    def get_currencies(
+        self, fields: str = None, after: int = 0, limit: int = None
+    ) -> JSONRows | Page:
+        """Валюты; с limit — страница после id=after и курсор следующей"""
+        if not fields and not after and limit is None:
+            conn, cursor = self._get_connection_and_cursor()
+            cursor.execute(SELECT_CURRENCIES)
+            rows = cursor.fetchall()
+            return JSONRows(rows, CurrencyDTO.JSON_ROW, CurrencyDTO.row_to_dict)
+        projection = Projection.parse(CURRENCY_FIELDS, fields)
+        sql, parameters = self._collection_sql(
+            'currencies', 'id', projection, after=after, limit=limit
+        )
+        return self._fetch_collection(
+            sql, parameters, projection.template, projection.row_to_dict, limit
+        )
 
-        cursor.execute('SELECT id, code, name, sign FROM currencies')
-        rows = cursor.fetchall()
-        return [CurrencyDTO(*row).to_dict() for row in rows]
+    def stream_currencies(self, fmt: str = 'json', fields: str = None) -> RowStream:
+        """Все валюты потоком: строки читаются из курсора при отправке"""
+        if not fields:
+            return RowStream(self._stream(SELECT_CURRENCIES), CurrencyDTO.JSON_ROW, fmt)
+        projection = Projection.parse(CURRENCY_FIELDS, fields)
+        sql, parameters = self._collection_sql('currencies', 'id', projection)
+        return RowStream(self._stream(sql, parameters), projection.template, fmt)
 
     def add_currency(self, code: str, name: str, sign: str) -> dict:
         code = code.upper()
@@ -36,17 +89,56 @@ class CurrencyModel(BaseModel):
             )
             conn.commit()
             currency_id = cursor.lastrowid
-            return CurrencyDTO(currency_id, code, name, sign).to_dict()
         except sqlite3.IntegrityError as e:
             raise CurrencyAlreadyExistsError(code) from e
+        currency = CurrencyDTO(currency_id, code, name, sign).to_dict()
+        self._invalidate(code)
+        self._publish(CURRENCY_ADDED, payload=currency)
+        return currency
+
+    def bulk_add_currencies(self, rows: list[tuple], upsert: bool = False) -> dict:
+        """Массовое добавление валют одной транзакцией через executemany.
+
+        rows — кортежи (номер строки, code, name, sign). Повторы в запросе и,
+        без upsert, уже существующие коды попадают в errors с номером строки.
+        """
+        conn, cursor = self._get_connection_and_cursor()
+        cursor.execute('SELECT code FROM currencies')
+        existing = {row[0] for row in cursor.fetchall()}
+        values, errors, updated = plan_bulk_currencies(rows, existing, upsert)
+
+        if values:
+            sql = 'INSERT INTO currencies (code, name, sign) VALUES (?, ?, ?)'
+            if upsert:
+                sql += (
+                    ' ON CONFLICT(code) DO UPDATE SET'
+                    ' name = excluded.name, sign = excluded.sign'
+                )
+            try:
+                with conn:
+                    cursor.executemany(sql, values)
+            except sqlite3.IntegrityError as e:
+                raise BulkConflictError() from e
+            self._invalidate()
+            self._publish(
+                CURRENCIES_UPSERTED, payload={'codes': [value[0] for value in values]}
+            )
+        return {
+            'inserted': len(values) - updated,
+            'updated': updated,
+            'errors': errors,
+        }
 
     def delete_all_currencies(self):
         conn, cursor = self._get_connection_and_cursor()
         cursor.executescript("""
             DELETE FROM exchange_rates;
+            DELETE FROM exchange_rate_history;
             DELETE FROM currencies;
             DELETE FROM sqlite_sequence WHERE name='exchange_rates';
             DELETE FROM sqlite_sequence WHERE name='currencies';
         """)
         conn.commit()
+        self._invalidate()
+        self._publish(CLEARED)
         return {'message': 'All currencies and exchange rates deleted, ids reset'}
@@ -1,15 +1,157 @@
+import math
 import sqlite3
 import logging
 from dto import CurrencyDTO, CurrencyExchangeDTO
-from errors import ExchangeRateAlreadyExistsError, ExchangeRateNotFoundError, CurrencyNotFoundError
+from errors import (
+    ExchangeRateAlreadyExistsError,
+    ExchangeRateNotFoundError,
+    CurrencyNotFoundError,
+    BulkConflictError,
+    InvalidRateFormatError,
+)
+from events import CLEARED, RATE_ADDED, RATE_UPDATED, RATES_UPSERTED
+from serializer import JSONRows, Page, RowStream
 
 from .base import BaseModel
+from .interfaces import ExchangeRateStore
+from .projection import Field, Projection
 
 logger = logging.getLogger(__name__)
 
+SELECT_EXCHANGE_RATES = """
+    SELECT
+        er.id,
+        base.id, base.code, base.name, base.sign,
+        target.id, target.code, target.name, target.sign,
+        er.rate
+    FROM exchange_rates er
+    JOIN currencies base ON base.id = er.base_currency_id
+    JOIN currencies target ON target.id = er.target_currency_id
+"""
+# Код валюты -> id для условий по паре (индекс UNIQUE(code) в currencies)
+CURRENCY_ID_SQL = '(SELECT id FROM currencies WHERE code = ?)'
+BASE_JOIN = 'JOIN currencies base ON base.id = er.base_currency_id'
+TARGET_JOIN = 'JOIN currencies target ON target.id = er.target_currency_id'
+
+# Поля ответа для ?fields=; вложенные валюты требуют JOIN, остальные — нет
+EXCHANGE_RATE_FIELDS = {
+    'id': Field(('er.id',), '%s'),
+    'baseCurrency': Field(
+        ('base.id', 'base.code', 'base.name', 'base.sign'),
+        CurrencyDTO.JSON_ROW,
+        CurrencyDTO.row_to_dict,
+        (BASE_JOIN,),
+    ),
+    'targetCurrency': Field(
+        ('target.id', 'target.code', 'target.name', 'target.sign'),
+        CurrencyDTO.JSON_ROW,
+        CurrencyDTO.row_to_dict,
+        (TARGET_JOIN,),
+    ),
+    'rate': Field(('er.rate',), '%s'),
+    'pair': Field(('base.code || target.code',), '%s', None, (BASE_JOIN, TARGET_JOIN)),
+    'base': Field(('base.code',), '%s', None, (BASE_JOIN,)),
+    'target': Field(('target.code',), '%s', None, (TARGET_JOIN,)),
+}
+DEFAULT_EXCHANGE_RATE_FIELDS = ['id', 'baseCurrency', 'targetCurrency', 'rate']
+
+
+def parse_rate(value) -> float:
+    """Курс из запроса: положительное конечное число, иначе InvalidRateFormatError.
+
+    От курса строятся граф, кросс-курсы и история, поэтому строка или NaN
+    не должны дойти до БД.
+    """
+    try:
+        rate = float(value)
+    except (TypeError, ValueError) as e:
+        raise InvalidRateFormatError() from e
+    if not rate > 0 or not math.isfinite(rate):
+        raise InvalidRateFormatError()
+    return rate
+
+
+def normalize_rates(rates) -> dict:
+    """(from, to, rate) -> {(FROM, TO): rate}; из повторов пары берется последний"""
+    received = {}
+    for from_currency, to_currency, rate in rates:
+        received[(from_currency.upper(), to_currency.upper())] = float(rate)
+    return received
+
+
+def plan_rate_upsert(received: dict, ids, existing: dict) -> tuple[list, int]:
+    """Изменившиеся курсы (from, to, rate) и число пропущенных пар.
+
+    Пропускаются пары с неизвестными валютами, курс валюты к самой себе и
+    неположительные курсы; existing — {(from, to): rate} текущих курсов.
+    """
+    changes, skipped = [], 0
+    for (from_currency, to_currency), rate in received.items():
+        if (
+            from_currency not in ids
+            or to_currency not in ids
+            or from_currency == to_currency
+            or not rate > 0
+        ):
+            skipped += 1
+        elif existing.get((from_currency, to_currency)) != rate:
+            changes.append((from_currency, to_currency, rate))
+    return changes, skipped
+
+
+def upsert_report(received: dict, changes: list, skipped: int, existing) -> dict:
+    inserted = sum(1 for base, target, _ in changes if (base, target) not in existing)
+    result = {
+        'received': len(received),
+        'inserted': inserted,
+        'updated': len(changes) - inserted,
+        'unchanged': len(received) - len(changes) - skipped,
+        'skipped': skipped,
+    }
+    logger.info('Массовая запись курсов: %s', result)
+    return result
+
+
+def plan_bulk_rates(rows: list[tuple], ids, existing, upsert: bool) -> tuple:
+    """Разбор пакета курсов: (from, to, rate) к записи, ошибки строк, число обновлений"""
+    values, errors, seen = [], [], set()
+    updated = 0
+    for index, from_currency, to_currency, rate in rows:
+        pair = (from_currency, to_currency)
+        missing = [code for code in pair if code not in ids]
+        if missing:
+            errors.append((index, CurrencyNotFoundError(*missing).message))
+            continue
+        if pair in seen:
+            errors.append(
+                (index, f'Duplicate pair {from_currency} → {to_currency} in request')
+            )
+            continue
+        seen.add(pair)
+        if pair in existing:
+            if not upsert:
+                errors.append((index, ExchangeRateAlreadyExistsError(*pair).message))
+                continue
+            updated += 1
+        values.append((from_currency, to_currency, rate))
+    return values, errors, updated
+
+
+class ExchangeRateModel(BaseModel, ExchangeRateStore):
+    def __init__(self, connector=None, events=None, cache=None):
+        super().__init__(connector, events, cache)
+        # Удаление всех валют (CurrencyModel) удаляет и курсы
+        self.events.subscribe(self._on_data_event)
+
+    def _on_data_event(self, event) -> None:
+        if event.kind in (CLEARED, RATES_UPSERTED):
+            self._invalidate()
 
-class ExchangeRateModel(BaseModel):
     def get_exchange_rate(self, from_currency: str, to_currency: str) -> dict:
+        key = (from_currency.upper(), to_currency.upper())
+        return self._cached(key, lambda: self._fetch_exchange_rate(*key))
+
+    def _fetch_exchange_rate(self, from_currency: str, to_currency: str) -> dict:
         conn, cursor = self._get_connection_and_cursor()
         cursor.execute(
             """
@@ -18,12 +160,13 @@ class ExchangeRateModel(BaseModel):
                 base.id, base.code, base.name, base.sign,
                 target.id, target.code, target.name, target.sign,
                 er.rate
-            FROM exchange_rates er
-            JOIN currencies base ON er.from_currency = base.code
-            JOIN currencies target ON er.to_currency = target.code
-            WHERE er.from_currency = ? AND er.to_currency = ?
+            FROM currencies base
+            JOIN currencies target ON target.code = ?
+            JOIN exchange_rates er
+                ON er.base_currency_id = base.id AND er.target_currency_id = target.id
+            WHERE base.code = ?
         """,
-            (from_currency.upper(), to_currency.upper()),
+            (to_currency.upper(), from_currency.upper()),
         )
         row = cursor.fetchone()
 
@@ -55,9 +198,12 @@ class ExchangeRateModel(BaseModel):
     def add_exchange_rate(self, from_currency: str, to_currency: str, rate: float):
         from_currency = from_currency.upper()
         to_currency = to_currency.upper()
+        rate = parse_rate(rate)
         conn, cursor = self._get_connection_and_cursor()
 
-        logger.info(f'Adding exchange rate: {from_currency} -> {to_currency} = {rate}')
+        logger.info(
+            'Adding exchange rate: %s -> %s = %s', from_currency, to_currency, rate
+        )
 
         try:
             # 🔍 Проверка существования валют
@@ -89,16 +235,26 @@ class ExchangeRateModel(BaseModel):
 
             # 💾 Вставка курса
             cursor.execute(
-                'INSERT INTO exchange_rates (from_currency, to_currency, rate) VALUES (?, ?, ?)',
-                (from_currency, to_currency, rate),
+                'INSERT INTO exchange_rates (base_currency_id, target_currency_id, rate)'
+                ' VALUES (?, ?, ?)',
+                (row[0], row[4], rate),
             )
             conn.commit()
             exchange_id = cursor.lastrowid
+            self._invalidate((from_currency, to_currency))
 
             # 📤 Возврат в виде DTO
-            return CurrencyExchangeDTO(
+            exchange_rate = CurrencyExchangeDTO(
                 exchange_id, base_currency, target_currency, rate
             ).to_dict()
+            self._publish(
+                RATE_ADDED,
+                from_currency=from_currency,
+                to_currency=to_currency,
+                rate=rate,
+                payload=exchange_rate,
+            )
+            return exchange_rate
 
         except sqlite3.IntegrityError as e:
             raise ExchangeRateAlreadyExistsError(from_currency, to_currency) from e
@@ -109,57 +265,184 @@ class ExchangeRateModel(BaseModel):
     def patch_exchange_rate(
         self, from_currency: str, to_currency: str, rate: float
     ) -> dict:
+        rate = parse_rate(rate)
         conn, cursor = self._get_connection_and_cursor()
 
         cursor.execute(
-            'UPDATE exchange_rates SET rate = ? WHERE from_currency = ? AND to_currency = ?',
+            'UPDATE exchange_rates SET rate = ?'
+            f' WHERE base_currency_id = {CURRENCY_ID_SQL}'
+            f' AND target_currency_id = {CURRENCY_ID_SQL}',
             (rate, from_currency.upper(), to_currency.upper()),
         )
         if cursor.rowcount == 0:
             raise ExchangeRateNotFoundError(from_currency, to_currency)
         conn.commit()
-        return self.get_exchange_rate(from_currency, to_currency)
+        self._invalidate((from_currency.upper(), to_currency.upper()))
+        exchange_rate = self.get_exchange_rate(from_currency, to_currency)
+        self._publish(
+            RATE_UPDATED,
+            from_currency=exchange_rate['baseCurrency']['code'],
+            to_currency=exchange_rate['targetCurrency']['code'],
+            rate=exchange_rate['rate'],
+            payload=exchange_rate,
+        )
+        return exchange_rate
+
+    @staticmethod
+    def _currency_ids(cursor) -> tuple[dict, dict]:
+        """Справочники код -> id и id -> код для пакетных записей"""
+        cursor.execute('SELECT id, code FROM currencies')
+        rows = cursor.fetchall()
+        return {code: id_ for id_, code in rows}, dict(rows)
 
-    def get_exchange_rates(self) -> list[dict]:
+    def upsert_exchange_rates(self, rates) -> dict:
+        """Массовая запись курсов (from, to, rate) одной транзакцией.
+
+        Новые пары добавляются, измененные обновляются; неизменные курсы и пары
+        с неизвестными валютами пропускаются. Подписчики получают одно событие
+        RATES_UPSERTED со списком изменений.
+        """
+        received = normalize_rates(rates)
         conn, cursor = self._get_connection_and_cursor()
+        ids, codes = self._currency_ids(cursor)
+        cursor.execute(
+            'SELECT base_currency_id, target_currency_id, rate FROM exchange_rates'
+        )
+        existing = {(codes[row[0]], codes[row[1]]): row[2] for row in cursor.fetchall()}
+        changes, skipped = plan_rate_upsert(received, ids, existing)
 
-        cursor.execute("""
-            SELECT
-                er.id,
-                base.id, base.code, base.name, base.sign,
-                target.id, target.code, target.name, target.sign,
-                er.rate
-            FROM exchange_rates er
-            JOIN currencies base ON er.from_currency = base.code
-            JOIN currencies target ON er.to_currency = target.code
-        """)
-        rows = cursor.fetchall()
+        if changes:
+            with conn:  # Одна транзакция на весь пакет
+                cursor.executemany(
+                    """
+                    INSERT INTO exchange_rates (base_currency_id, target_currency_id, rate)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(base_currency_id, target_currency_id)
+                    DO UPDATE SET rate = excluded.rate
+                """,
+                    [(ids[base], ids[target], rate) for base, target, rate in changes],
+                )
+            self._invalidate()
+            self._publish(
+                RATES_UPSERTED,
+                payload={
+                    'changes': [
+                        {'from': base, 'to': target, 'rate': rate}
+                        for base, target, rate in changes
+                    ]
+                },
+            )
 
-        result = []
-        for row in rows:
-            (
-                ex_id,
-                base_id,
-                base_code,
-                base_name,
-                base_sign,
-                target_id,
-                target_code,
-                target_name,
-                target_sign,
-                rate,
-            ) = row
-
-            base_currency = CurrencyDTO(
-                base_id, base_code, base_name, base_sign
-            ).to_dict()
-            target_currency = CurrencyDTO(
-                target_id, target_code, target_name, target_sign
-            ).to_dict()
+        return upsert_report(received, changes, skipped, existing)
+
+    def bulk_add_exchange_rates(self, rows: list[tuple], upsert: bool = False) -> dict:
+        """Массовое добавление курсов одной транзакцией через executemany.
 
-            exchange_dto = CurrencyExchangeDTO(
-                ex_id, base_currency, target_currency, rate
+        rows — кортежи (номер строки, from, to, rate). Пары с валютами,
+        которых нет в БД, повторы и, без upsert, существующие пары попадают
+        в errors с номером строки.
+        """
+        conn, cursor = self._get_connection_and_cursor()
+        ids, codes = self._currency_ids(cursor)
+        cursor.execute(
+            'SELECT base_currency_id, target_currency_id FROM exchange_rates'
+        )
+        existing = {(codes[base], codes[target]) for base, target in cursor.fetchall()}
+        values, errors, updated = plan_bulk_rates(rows, ids, existing, upsert)
+
+        if values:
+            sql = (
+                'INSERT INTO exchange_rates (base_currency_id, target_currency_id, rate)'
+                ' VALUES (?, ?, ?)'
+            )
+            if upsert:
+                sql += (
+                    ' ON CONFLICT(base_currency_id, target_currency_id)'
+                    ' DO UPDATE SET rate = excluded.rate'
+                )
+            try:
+                with conn:
+                    cursor.executemany(
+                        sql,
+                        [
+                            (ids[base], ids[target], rate)
+                            for base, target, rate in values
+                        ],
+                    )
+            except sqlite3.IntegrityError as e:
+                raise BulkConflictError() from e
+            self._invalidate()
+            self._publish(
+                RATES_UPSERTED,
+                payload={
+                    'changes': [
+                        {'from': base, 'to': target, 'rate': rate}
+                        for base, target, rate in values
+                    ]
+                },
+            )
+        return {
+            'inserted': len(values) - updated,
+            'updated': updated,
+            'errors': errors,
+        }
+
+    def get_exchange_rates(
+        self,
+        fields: str = None,
+        base: str = None,
+        target: str = None,
+        after: int = 0,
+        limit: int = None,
+    ) -> JSONRows | Page:
+        """Курсы; строки кодируются в JSON без промежуточных словарей.
+
+        fields — проекция, base/target — фильтр по валютам пары, limit/after —
+        keyset-пагинация по id; все это выполняется в SQL.
+        """
+        if not (fields or base or target or after) and limit is None:
+            conn, cursor = self._get_connection_and_cursor()
+            cursor.execute(SELECT_EXCHANGE_RATES)
+            rows = cursor.fetchall()
+            return JSONRows(
+                rows, CurrencyExchangeDTO.JSON_ROW, CurrencyExchangeDTO.row_to_dict
+            )
+        projection, sql, parameters = self._rates_query(
+            fields, base, target, after, limit
+        )
+        return self._fetch_collection(
+            sql, parameters, projection.template, projection.row_to_dict, limit
+        )
+
+    def stream_exchange_rates(
+        self,
+        fmt: str = 'json',
+        fields: str = None,
+        base: str = None,
+        target: str = None,
+    ) -> RowStream:
+        """Все курсы потоком: пачки fetchmany кодируются по мере отправки"""
+        if not (fields or base or target):
+            return RowStream(
+                self._stream(SELECT_EXCHANGE_RATES), CurrencyExchangeDTO.JSON_ROW, fmt
             )
-            result.append(exchange_dto.to_dict())
+        projection, sql, parameters = self._rates_query(fields, base, target)
+        return RowStream(self._stream(sql, parameters), projection.template, fmt)
 
-        return result
+    def _rates_query(
+        self, fields: str, base: str, target: str, after: int = 0, limit: int = None
+    ) -> tuple:
+        projection = Projection.parse(
+            EXCHANGE_RATE_FIELDS, fields, DEFAULT_EXCHANGE_RATE_FIELDS
+        )
+        filters = []
+        if base:
+            filters.append((f'er.base_currency_id = {CURRENCY_ID_SQL}', base.upper()))
+        if target:
+            filters.append(
+                (f'er.target_currency_id = {CURRENCY_ID_SQL}', target.upper())
+            )
+        sql, parameters = self._collection_sql(
+            'exchange_rates er', 'er.id', projection, filters, after, limit
+        )
+        return projection, sql, parameters
@@ -0,0 +1,254 @@
+import logging
+import math
+import os
+import threading
+import time
+from datetime import UTC, datetime
+
+from errors import ExchangeRateNotFoundError, InvalidHistoryQueryError
+from events import RATE_ADDED, RATE_UPDATED, RATES_UPSERTED, DataEvent
+
+from .base import BaseModel
+from .interfaces import HistoryStore
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FETCH_ROWS = 1000
+AGGREGATIONS = ('last', 'mean', 'ohlc')
+# Границы, которые datetime.fromtimestamp() переводит в дату (годы 1–9999)
+MIN_TIMESTAMP = datetime(1, 1, 2, tzinfo=UTC).timestamp()
+MAX_TIMESTAMP = datetime(9999, 12, 31, tzinfo=UTC).timestamp()
+
+
+def to_timestamp(value: str) -> float:
+    """Граница периода: секунды Unix или ISO 8601 (без зоны — UTC)"""
+    try:
+        ts = float(value)
+    except ValueError:
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError as e:
+            raise InvalidHistoryQueryError(f'Invalid timestamp: {value}') from e
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=UTC)
+        ts = moment.timestamp()
+    # nan, inf и даты за пределами datetime иначе падают при выводе точек
+    if not MIN_TIMESTAMP <= ts <= MAX_TIMESTAMP:
+        raise InvalidHistoryQueryError(f'Invalid timestamp: {value}')
+    return ts
+
+
+def parse_step(value: str) -> float:
+    """Шаг агрегации: секунды или число с суффиксом s, m, h, d (15m, 1h)"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    multiplier = units.get(value[-1:].lower())
+    number = value[:-1] if multiplier else value
+    try:
+        step = float(number) * (multiplier or 1)
+    except ValueError as e:
+        raise InvalidHistoryQueryError(f'Invalid step: {value}') from e
+    if not step > 0 or math.isinf(step):
+        raise InvalidHistoryQueryError(f'Invalid step: {value}')
+    return step
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, UTC).isoformat(timespec='milliseconds')
+
+
+class _Bucket:
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'total', 'count')
+
+    def __init__(self, start: float, rate: float):
+        self.start = start
+        self.open = self.high = self.low = self.close = rate
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, rate: float) -> None:
+        self.high = max(self.high, rate)
+        self.low = min(self.low, rate)
+        self.close = rate
+        self.total += rate
+        self.count += 1
+
+    def to_dict(self, agg: str) -> dict:
+        point = {'timestamp': _iso(self.start)}
+        if agg == 'last':
+            point['rate'] = self.close
+        elif agg == 'mean':
+            point['rate'] = self.total / self.count
+        else:
+            point.update(open=self.open, high=self.high, low=self.low, close=self.close)
+        point['count'] = self.count
+        return point
+
+
+class HistoryModel(BaseModel, HistoryStore):
+    """История курсов из таблицы exchange_rate_history.
+
+    Таблицу пополняют триггеры на exchange_rates (см. db_initializer), поэтому
+    в историю попадает любая запись курса. Первичный ключ (from, to, ts) в
+    таблице WITHOUT ROWID покрывает запрос по периоду: строки читаются по
+    индексу в порядке времени без обращения к основной таблице.
+
+    Срок хранения соблюдается подрезкой на записи курсов — не чаще раза в
+    prune_interval секунд, независимо от планировщика загрузки.
+    """
+
+    def __init__(
+        self,
+        connector=None,
+        events=None,
+        retention_days: float = None,
+        prune_interval: float = None,
+    ):
+        super().__init__(connector, events)
+        if retention_days is None:
+            retention_days = float(os.getenv('HISTORY_RETENTION_DAYS', 365))
+        self.retention = retention_days * 86400 or None  # 0 — хранить всю историю
+        self.max_points = int(os.getenv('HISTORY_MAX_POINTS', 10000))
+        if prune_interval is None:
+            prune_interval = float(os.getenv('HISTORY_PRUNE_INTERVAL', 3600))
+        self.prune_interval = prune_interval  # 0 — без подрезки на записи
+        self._pruned_at = time.monotonic()
+        self._prune_lock = threading.Lock()
+        self.events.subscribe(self._on_data_event)
+
+    def _on_data_event(self, event: DataEvent) -> None:
+        if event.kind not in (RATE_ADDED, RATE_UPDATED, RATES_UPSERTED):
+            return
+        if self.retention is None or not self.prune_interval:
+            return
+        with self._prune_lock:
+            if time.monotonic() - self._pruned_at < self.prune_interval:
+                return
+            self._pruned_at = time.monotonic()
+        try:
+            self.prune()
+        except Exception:  # Запись курса уже выполнена: ошибка подрезки ее не отменяет
+            logger.exception('Ошибка подрезки истории курсов')
+
+    def retention_start(self, now: float = None) -> float | None:
+        if self.retention is None:
+            return None
+        return (time.time() if now is None else now) - self.retention
+
+    def prune(self, now: float = None) -> int:
+        """Удаляет записи старше срока хранения; возвращает их число"""
+        self._pruned_at = time.monotonic()
+        cutoff = self.retention_start(now)
+        if cutoff is None:
+            return 0
+        conn, cursor = self._get_connection_and_cursor()
+        with conn:
+            cursor.execute('DELETE FROM exchange_rate_history WHERE ts < ?', (cutoff,))
+        if cursor.rowcount:
+            logger.info('Удалено записей истории курсов: %d', cursor.rowcount)
+        return cursor.rowcount
+
+    def get_history(
+        self,
+        from_currency: str,
+        to_currency: str,
+        start: float = None,
+        end: float = None,
+        step: float = None,
+        agg: str = 'last',
+    ) -> dict:
+        """Курсы пары за период [start, end]; со step — по корзинам step секунд.
+
+        agg: last — последний курс корзины, mean — среднее,
+        ohlc — open/high/low/close.
+        """
+        if agg not in AGGREGATIONS:
+            raise InvalidHistoryQueryError(
+                f'Invalid agg: {agg}, expected one of {", ".join(AGGREGATIONS)}'
+            )
+        now = time.time()
+        # Без верхней границы берем и точки, сдвинутые триггером чуть вперед
+        upper = math.inf if end is None else end
+        end = now if end is None else end
+        floor = self.retention_start(now)
+        if start is None:
+            start = floor if floor is not None else 0.0
+        elif floor is not None:
+            start = max(start, floor)  # Старше срока хранения данных нет
+        if start > end:
+            raise InvalidHistoryQueryError('Period start is after its end')
+        if step is not None and (end - start) / step > self.max_points:
+            raise InvalidHistoryQueryError(
+                f'Too many buckets, increase step (limit {self.max_points})'
+            )
+
+        batches = self._select_points(from_currency, to_currency, start, upper)
+        if step is None:
+            points = self._raw_points(batches)
+        else:
+            points = self._downsample(batches, start, step, agg)
+        if not points and not self._pair_exists(from_currency, to_currency):
+            raise ExchangeRateNotFoundError(from_currency, to_currency)
+        return {
+            'from': from_currency,
+            'to': to_currency,
+            'start': _iso(start),
+            'end': _iso(end),
+            'step': step,
+            'agg': agg if step is not None else None,
+            'points': points,
+        }
+
+    def _select_points(
+        self, from_currency: str, to_currency: str, start: float, end: float
+    ):
+        conn, cursor = self._get_connection_and_cursor()
+        cursor.execute(
+            """
+            SELECT ts, rate FROM exchange_rate_history
+            WHERE from_currency = ? AND to_currency = ? AND ts BETWEEN ? AND ?
+            ORDER BY ts
+        """,
+            (from_currency, to_currency, start, end),
+        )
+        while rows := cursor.fetchmany(HISTORY_FETCH_ROWS):
+            yield rows
+
+    def _raw_points(self, batches) -> list:
+        points = []
+        for rows in batches:
+            points.extend({'timestamp': _iso(ts), 'rate': rate} for ts, rate in rows)
+            if len(points) > self.max_points:
+                raise InvalidHistoryQueryError(
+                    f'Too many points, set step (limit {self.max_points})'
+                )
+        return points
+
+    def _downsample(self, batches, start: float, step: float, agg: str) -> list:
+        """Один проход по упорядоченным строкам: корзины закрываются по порядку"""
+        points, bucket = [], None
+        for rows in batches:
+            for ts, rate in rows:
+                bucket_start = start + (ts - start) // step * step
+                if bucket is None or bucket.start != bucket_start:
+                    if bucket is not None:
+                        points.append(bucket.to_dict(agg))
+                    bucket = _Bucket(bucket_start, rate)
+                bucket.add(rate)
+        if bucket is not None:
+            points.append(bucket.to_dict(agg))
+        return points
+
+    def _pair_exists(self, from_currency: str, to_currency: str) -> bool:
+        conn, cursor = self._get_connection_and_cursor()
+        cursor.execute(
+            """
+            SELECT 1 FROM exchange_rates
+            WHERE base_currency_id = (SELECT id FROM currencies WHERE code = ?)
+            AND target_currency_id = (SELECT id FROM currencies WHERE code = ?)
+            UNION ALL
+            SELECT 1 FROM exchange_rate_history
+            WHERE from_currency = ? AND to_currency = ? LIMIT 1
+        """,
+            (from_currency, to_currency, from_currency, to_currency),
+        )
+        return cursor.fetchone() is not None
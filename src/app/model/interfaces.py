@@ -0,0 +1,100 @@
+from abc import ABC, abstractmethod
+
+from serializer import JSONRows, Page, RowStream
+
+
+class CurrencyStore(ABC):
+    """Операции с валютами, которые предоставляет хранилище (SQLite или память)"""
+
+    @abstractmethod
+    def get_currency_by_code(self, code: str) -> dict: ...
+
+    @abstractmethod
+    def get_currencies(
+        self, fields: str = None, after: int = 0, limit: int = None
+    ) -> JSONRows | Page: ...
+
+    @abstractmethod
+    def stream_currencies(self, fmt: str = 'json', fields: str = None) -> RowStream: ...
+
+    @abstractmethod
+    def add_currency(self, code: str, name: str, sign: str) -> dict: ...
+
+    @abstractmethod
+    def bulk_add_currencies(self, rows: list[tuple], upsert: bool = False) -> dict: ...
+
+    @abstractmethod
+    def delete_all_currencies(self) -> dict: ...
+
+
+class ExchangeRateStore(ABC):
+    """Операции с курсами; строки коллекций — как в SELECT_EXCHANGE_RATES"""
+
+    @abstractmethod
+    def get_exchange_rate(self, from_currency: str, to_currency: str) -> dict: ...
+
+    @abstractmethod
+    def add_exchange_rate(
+        self, from_currency: str, to_currency: str, rate: float
+    ) -> dict: ...
+
+    @abstractmethod
+    def patch_exchange_rate(
+        self, from_currency: str, to_currency: str, rate: float
+    ) -> dict: ...
+
+    @abstractmethod
+    def upsert_exchange_rates(self, rates) -> dict: ...
+
+    @abstractmethod
+    def bulk_add_exchange_rates(
+        self, rows: list[tuple], upsert: bool = False
+    ) -> dict: ...
+
+    @abstractmethod
+    def get_exchange_rates(
+        self,
+        fields: str = None,
+        base: str = None,
+        target: str = None,
+        after: int = 0,
+        limit: int = None,
+    ) -> JSONRows | Page: ...
+
+    @abstractmethod
+    def stream_exchange_rates(
+        self,
+        fmt: str = 'json',
+        fields: str = None,
+        base: str = None,
+        target: str = None,
+    ) -> RowStream: ...
+
+
+class ConversionStore(ABC):
+    """Источник данных конвертации: граф и матрица строятся поверх _fetch_rates"""
+
+    @abstractmethod
+    def _fetch_rates(self) -> tuple[list[dict], list[tuple]]:
+        """Валюты (словари) и курсы (id, from, to, rate)"""
+
+    @abstractmethod
+    def get_conversion_info(
+        self, from_currency: str, to_currency: str, amount: float
+    ) -> dict: ...
+
+
+class HistoryStore(ABC):
+    """Точки истории курсов; агрегация по корзинам общая (HistoryModel)"""
+
+    @abstractmethod
+    def prune(self, now: float = None) -> int: ...
+
+    @abstractmethod
+    def _select_points(
+        self, from_currency: str, to_currency: str, start: float, end: float
+    ):
+        """Пачки (ts, rate) пары за [start, end] в порядке времени"""
+
+    @abstractmethod
+    def _pair_exists(self, from_currency: str, to_currency: str) -> bool: ...
@@ -0,0 +1,450 @@
+import logging
+import time
+from bisect import bisect_right
+from operator import itemgetter
+
+from dto import CurrencyDTO, CurrencyExchangeDTO
+from errors import (
+    CurrencyAlreadyExistsError,
+    CurrencyNotFoundError,
+    ExchangeRateAlreadyExistsError,
+    ExchangeRateNotFoundError,
+)
+from events import (
+    CLEARED,
+    CURRENCIES_UPSERTED,
+    CURRENCY_ADDED,
+    RATE_ADDED,
+    RATE_UPDATED,
+    RATES_UPSERTED,
+)
+from memory_store import MemoryStore
+from serializer import STREAM_CHUNK_ROWS, JSONRows, Page, RowStream
+
+from .base import BaseModel
+from .conversion import ConversionModel
+from .currencies import CURRENCY_FIELDS, plan_bulk_currencies
+from .exchange_rates import (
+    DEFAULT_EXCHANGE_RATE_FIELDS,
+    EXCHANGE_RATE_FIELDS,
+    normalize_rates,
+    parse_rate,
+    plan_bulk_rates,
+    plan_rate_upsert,
+    upsert_report,
+)
+from .history import HistoryModel
+from .interfaces import CurrencyStore, ExchangeRateStore
+from .projection import Projection
+
+logger = logging.getLogger(__name__)
+
+# Позиции колонок полей ?fields= в строке валюты (id, code, name, sign)
+CURRENCY_COLUMNS = {'id': (0,), 'code': (1,), 'name': (2,), 'sign': (3,)}
+# ... и в строке курса как у SELECT_EXCHANGE_RATES, дополненной кодом пары (10)
+RATE_COLUMNS = {
+    'id': (0,),
+    'baseCurrency': (1, 2, 3, 4),
+    'targetCurrency': (5, 6, 7, 8),
+    'rate': (9,),
+    'pair': (10,),
+    'base': (2,),
+    'target': (6,),
+}
+
+
+def _projector(columns: dict, projection: Projection):
+    """Строка -> кортеж колонок проекции в порядке Projection.columns"""
+    getter = itemgetter(*(i for name in projection.names for i in columns[name]))
+    if len(projection.columns) == 1:
+        return lambda row: (getter(row),)
+    return getter
+
+
+def _collection(
+    rows: list, limit: int, template: str, to_dict, project: callable = None
+) -> JSONRows | Page:
+    """Коллекция из строк по возрастанию id (id — первая колонка).
+
+    С limit — страница и курсор следующей, как у BaseModel._fetch_collection;
+    project применяется только к строкам, попавшим в ответ.
+    """
+    next_cursor = None
+    if limit is not None:
+        if len(rows) > limit:
+            next_cursor = str(rows[limit - 1][0])
+        rows = rows[:limit]
+    rows = list(rows) if project is None else [project(row) for row in rows]
+    items = JSONRows(rows, template, to_dict)
+    return items if limit is None else Page(items, next_cursor)
+
+
+def _batches(rows, size: int = STREAM_CHUNK_ROWS):
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+class MemoryModel(BaseModel):
+    """Модель поверх MemoryStore: запросы — обращения к словарям и спискам.
+
+    Кэш чтения не нужен: строки уже лежат в памяти, а словари ответов
+    запоминаются по самим строкам-кортежам и пересобираются, только когда
+    запись заменила строку.
+    """
+
+    def __init__(self, store: MemoryStore, events=None):
+        super().__init__(store, events)
+        self.store = store
+        self._dicts = {}  # ключ -> (строки-источники, словарь ответа)
+
+    def _external_writes(self) -> bool:
+        return False  # Хранилище одно на процесс: все записи идут через EventBus
+
+    def _memo(self, key, sources: tuple, build: callable) -> dict:
+        cached = self._dicts.get(key)
+        if cached is not None and all(
+            a is b for a, b in zip(cached[0], sources, strict=True)
+        ):
+            return cached[1]
+        value = build()
+        self._dicts[key] = (sources, value)
+        return value
+
+    def _currency_dict(self, row: tuple) -> dict:
+        return self._memo(row[1], (row,), lambda: CurrencyDTO.row_to_dict(row))
+
+    def _rate_dict(self, row: tuple) -> dict:
+        base = self.store.currency_by_id[row[1]]
+        target = self.store.currency_by_id[row[2]]
+        return self._memo(
+            (base[1], target[1]),
+            (row, base, target),
+            lambda: CurrencyExchangeDTO(
+                row[0], self._currency_dict(base), self._currency_dict(target), row[3]
+            ).to_dict(),
+        )
+
+    def _rate_row(self, row: tuple) -> tuple:
+        """(id, base_id, target_id, rate) -> строка SELECT_EXCHANGE_RATES"""
+        currencies = self.store.currency_by_id
+        return (row[0], *currencies[row[1]], *currencies[row[2]], row[3])
+
+    @staticmethod
+    def _after(rows: list, after: int) -> list:
+        return rows[bisect_right(rows, after, key=itemgetter(0)) :] if after else rows
+
+
+class MemoryCurrencyModel(MemoryModel, CurrencyStore):
+    def get_currency_by_code(self, code: str) -> dict:
+        row = self.store.currency(code)
+        if row is None:
+            raise CurrencyNotFoundError(code)
+        return self._currency_dict(row)
+
+    def get_currencies(
+        self, fields: str = None, after: int = 0, limit: int = None
+    ) -> JSONRows | Page:
+        rows = self._after(self.store.currency_rows, after)
+        if not fields:
+            return _collection(
+                rows, limit, CurrencyDTO.JSON_ROW, CurrencyDTO.row_to_dict
+            )
+        projection = Projection.parse(CURRENCY_FIELDS, fields)
+        return _collection(
+            rows,
+            limit,
+            projection.template,
+            projection.row_to_dict,
+            _projector(CURRENCY_COLUMNS, projection),
+        )
+
+    def stream_currencies(self, fmt: str = 'json', fields: str = None) -> RowStream:
+        rows = list(self.store.currency_rows)  # Снимок: запись не меняет выдачу
+        if not fields:
+            return RowStream(_batches(rows), CurrencyDTO.JSON_ROW, fmt)
+        projection = Projection.parse(CURRENCY_FIELDS, fields)
+        project = _projector(CURRENCY_COLUMNS, projection)
+        batches = ([project(row) for row in batch] for batch in _batches(rows))
+        return RowStream(batches, projection.template, fmt)
+
+    def add_currency(self, code: str, name: str, sign: str) -> dict:
+        code = code.upper()
+        with self.store.lock:
+            if self.store.currency(code) is not None:
+                raise CurrencyAlreadyExistsError(code)
+            (row,) = self.store.commit([('currency', code, name, sign)])
+        currency = self._currency_dict(row)
+        self._publish(CURRENCY_ADDED, payload=currency)
+        return currency
+
+    def bulk_add_currencies(self, rows: list[tuple], upsert: bool = False) -> dict:
+        """Массовое добавление валют одной транзакцией журнала"""
+        with self.store.lock:
+            values, errors, updated = plan_bulk_currencies(
+                rows, self.store.currency_index, upsert
+            )
+            if values:
+                self.store.commit([('currency', *value) for value in values])
+        if values:
+            self._publish(
+                CURRENCIES_UPSERTED, payload={'codes': [value[0] for value in values]}
+            )
+        return {
+            'inserted': len(values) - updated,
+            'updated': updated,
+            'errors': errors,
+        }
+
+    def delete_all_currencies(self):
+        self.store.commit([('clear',)])
+        self._dicts.clear()
+        self._publish(CLEARED)
+        return {'message': 'All currencies and exchange rates deleted, ids reset'}
+
+
+class MemoryExchangeRateModel(MemoryModel, ExchangeRateStore):
+    def get_exchange_rate(self, from_currency: str, to_currency: str) -> dict:
+        row = self.store.rate(from_currency.upper(), to_currency.upper())
+        if row is None:
+            raise ExchangeRateNotFoundError(from_currency, to_currency)
+        return self._rate_dict(row)
+
+    def add_exchange_rate(self, from_currency: str, to_currency: str, rate: float):
+        from_currency = from_currency.upper()
+        to_currency = to_currency.upper()
+        rate = parse_rate(rate)
+        logger.info(
+            'Adding exchange rate: %s -> %s = %s', from_currency, to_currency, rate
+        )
+        with self.store.lock:
+            base = self.store.currency(from_currency)
+            target = self.store.currency(to_currency)
+            missing = [
+                code
+                for code, row in ((from_currency, base), (to_currency, target))
+                if row is None
+            ]
+            if missing:
+                raise CurrencyNotFoundError(*missing)
+            if self.store.rate(from_currency, to_currency) is not None:
+                raise ExchangeRateAlreadyExistsError(from_currency, to_currency)
+            (row,) = self.store.commit(
+                [('rate', base[0], target[0], rate, time.time())]
+            )
+        exchange_rate = self._rate_dict(row)
+        self._publish(
+            RATE_ADDED,
+            from_currency=from_currency,
+            to_currency=to_currency,
+            rate=row[3],
+            payload=exchange_rate,
+        )
+        return exchange_rate
+
+    def patch_exchange_rate(
+        self, from_currency: str, to_currency: str, rate: float
+    ) -> dict:
+        from_currency = from_currency.upper()
+        to_currency = to_currency.upper()
+        rate = parse_rate(rate)
+        with self.store.lock:
+            row = self.store.rate(from_currency, to_currency)
+            if row is None:
+                raise ExchangeRateNotFoundError(from_currency, to_currency)
+            (row,) = self.store.commit([('rate', row[1], row[2], rate, time.time())])
+        exchange_rate = self._rate_dict(row)
+        self._publish(
+            RATE_UPDATED,
+            from_currency=from_currency,
+            to_currency=to_currency,
+            rate=rate,
+            payload=exchange_rate,
+        )
+        return exchange_rate
+
+    def upsert_exchange_rates(self, rates) -> dict:
+        """Массовая запись курсов (from, to, rate) одной транзакцией журнала"""
+        received = normalize_rates(rates)
+        with self.store.lock:
+            existing = self.store.rates_by_codes()
+            changes, skipped = plan_rate_upsert(
+                received, self.store.currency_index, existing
+            )
+            if changes:
+                self._commit_rates(changes)
+        if changes:
+            self._publish_changes(changes)
+        return upsert_report(received, changes, skipped, existing)
+
+    def bulk_add_exchange_rates(self, rows: list[tuple], upsert: bool = False) -> dict:
+        """Массовое добавление курсов одной транзакцией журнала"""
+        with self.store.lock:
+            values, errors, updated = plan_bulk_rates(
+                rows, self.store.currency_index, self.store.rates_by_codes(), upsert
+            )
+            if values:
+                self._commit_rates(values)
+        if values:
+            self._publish_changes(values)
+        return {
+            'inserted': len(values) - updated,
+            'updated': updated,
+            'errors': errors,
+        }
+
+    def _commit_rates(self, changes: list) -> None:
+        now, currencies = time.time(), self.store.currency_index
+        self.store.commit(
+            [
+                ('rate', currencies[base][0], currencies[target][0], rate, now)
+                for base, target, rate in changes
+            ]
+        )
+
+    def _publish_changes(self, changes: list) -> None:
+        self._publish(
+            RATES_UPSERTED,
+            payload={
+                'changes': [
+                    {'from': base, 'to': target, 'rate': rate}
+                    for base, target, rate in changes
+                ]
+            },
+        )
+
+    def get_exchange_rates(
+        self,
+        fields: str = None,
+        base: str = None,
+        target: str = None,
+        after: int = 0,
+        limit: int = None,
+    ) -> JSONRows | Page:
+        """Курсы; фильтр и страница выбираются по списку строк до сборки кортежей"""
+        rows = self._filtered(base, target, self._after(self.store.rate_rows, after))
+        if limit is not None:
+            rows = rows[: limit + 1]
+        rows = [self._rate_row(row) for row in rows]
+        if not fields:
+            return _collection(
+                rows,
+                limit,
+                CurrencyExchangeDTO.JSON_ROW,
+                CurrencyExchangeDTO.row_to_dict,
+            )
+        projection = self._projection(fields)
+        return _collection(
+            rows,
+            limit,
+            projection.template,
+            projection.row_to_dict,
+            self._rate_projector(projection),
+        )
+
+    def stream_exchange_rates(
+        self,
+        fmt: str = 'json',
+        fields: str = None,
+        base: str = None,
+        target: str = None,
+    ) -> RowStream:
+        rows = self._filtered(base, target, list(self.store.rate_rows))
+        if not fields:
+            batches = (
+                [self._rate_row(row) for row in batch] for batch in _batches(rows)
+            )
+            return RowStream(batches, CurrencyExchangeDTO.JSON_ROW, fmt)
+        projection = self._projection(fields)
+        project = self._rate_projector(projection)
+        batches = (
+            [project(self._rate_row(row)) for row in batch] for batch in _batches(rows)
+        )
+        return RowStream(batches, projection.template, fmt)
+
+    @staticmethod
+    def _projection(fields: str) -> Projection:
+        return Projection.parse(
+            EXCHANGE_RATE_FIELDS, fields, DEFAULT_EXCHANGE_RATE_FIELDS
+        )
+
+    @staticmethod
+    def _rate_projector(projection: Projection) -> callable:
+        project = _projector(RATE_COLUMNS, projection)
+        return lambda row: project((*row, row[2] + row[6]))
+
+    def _filtered(self, base: str, target: str, rows: list) -> list:
+        """Курсы с базовой и/или целевой валютой; неизвестный код — пустой список"""
+        conditions = []
+        for index, code in ((1, base), (2, target)):
+            if code:
+                currency = self.store.currency(code.upper())
+                if currency is None:
+                    return []
+                conditions.append((index, currency[0]))
+        for index, currency_id in conditions:
+            rows = [row for row in rows if row[index] == currency_id]
+        return rows
+
+
+class MemoryConversionModel(ConversionModel):
+    """Конвертация через граф курсов; граф загружается из MemoryStore"""
+
+    def __init__(self, store: MemoryStore, events=None, materialized: bool = False):
+        super().__init__(store, events, materialized)
+        self.store = store
+
+    def _external_writes(self) -> bool:
+        return False
+
+    def _fetch_rates(self) -> tuple[list[dict], list[tuple]]:
+        currencies = self.store.currency_by_id
+        rates = [
+            (rate_id, currencies[base][1], currencies[target][1], rate)
+            for rate_id, base, target, rate in self.store.rate_rows
+        ]
+        return [CurrencyDTO.row_to_dict(row) for row in self.store.currency_rows], rates
+
+    def get_conversion_info(
+        self, from_currency: str, to_currency: str, amount: float
+    ) -> dict:
+        row = self.store.rate(from_currency.upper(), to_currency.upper())
+        if row is None:
+            raise ExchangeRateNotFoundError(from_currency, to_currency)
+        return {
+            'baseCurrency': CurrencyDTO.row_to_dict(self.store.currency_by_id[row[1]]),
+            'targetCurrency': CurrencyDTO.row_to_dict(
+                self.store.currency_by_id[row[2]]
+            ),
+            'rate': row[3],
+            'amount': amount,
+            'convertedAmount': round(row[3] * amount, 2),
+        }
+
+
+class MemoryHistoryModel(HistoryModel):
+    """История курсов из MemoryStore: точки пары — список по времени"""
+
+    def __init__(self, store: MemoryStore, events=None, retention_days: float = None):
+        super().__init__(store, events, retention_days)
+        self.store = store
+
+    def prune(self, now: float = None) -> int:
+        self._pruned_at = time.monotonic()
+        cutoff = self.retention_start(now)
+        if cutoff is None:
+            return 0
+        removed = self.store.prune_history(cutoff)
+        if removed:
+            logger.info('Удалено записей истории курсов: %d', removed)
+        return removed
+
+    def _select_points(
+        self, from_currency: str, to_currency: str, start: float, end: float
+    ):
+        yield self.store.points(from_currency, to_currency, start, end)
+
+    def _pair_exists(self, from_currency: str, to_currency: str) -> bool:
+        return (
+            self.store.rate(from_currency, to_currency) is not None
+            or (from_currency, to_currency) in self.store.history
+        )
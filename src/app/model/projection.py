@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+
+from errors import InvalidQueryError
+
+
+@dataclass(frozen=True)
+class Field:
+    """Поле коллекции: SQL-выражения колонок, фрагмент JSON-шаблона и join"""
+
+    columns: tuple
+    template: str
+    to_value: callable = None  # Значение поля из своих колонок; None — первая колонка
+    joins: tuple = ()  # JOIN, без которых поле не выбрать
+
+
+class Projection:
+    """Набор полей ответа, собранный в SELECT и %-шаблон JSONRows.
+
+    Колонки и JOIN попадают в запрос только для запрошенных полей, так что
+    ответ {pair, rate} читает одну таблицу без вложенных валют.
+    """
+
+    def __init__(self, fields: dict, names: list):
+        self.names = names
+        self.fields = [fields[name] for name in names]
+        self.columns = [column for field in self.fields for column in field.columns]
+        self.template = (
+            '{'
+            + ','.join(
+                f'"{name}":{field.template}'
+                for name, field in zip(names, self.fields, strict=True)
+            )
+            + '}'
+        )
+        self.joins = list(
+            dict.fromkeys(join for field in self.fields for join in field.joins)
+        )
+
+    @classmethod
+    def parse(
+        cls, fields: dict, value: str = None, default: list = None
+    ) -> 'Projection':
+        """?fields=pair,rate; без параметра — поля default (по умолчанию все)"""
+        if not value:
+            return cls(fields, list(default or fields))
+        names = list(
+            dict.fromkeys(name.strip() for name in value.split(',') if name.strip())
+        )
+        unknown = [name for name in names if name not in fields]
+        if unknown or not names:
+            raise InvalidQueryError(
+                f'Unknown fields: {", ".join(unknown) or value}; '
+                f'available: {", ".join(fields)}'
+            )
+        return cls(fields, names)
+
+    def row_to_dict(self, row: tuple) -> dict:
+        result, index = {}, 0
+        for name, field in zip(self.names, self.fields, strict=True):
+            width = len(field.columns)
+            values = row[index : index + width]
+            result[name] = field.to_value(values) if field.to_value else values[0]
+            index += width
+        return result
+
+
+def page_limit(limit: str = None, maximum: int = 1000) -> int | None:
+    """Размер страницы из ?limit=; None — без пагинации"""
+    if limit is None or limit == '':
+        return None
+    if not str(limit).isdigit() or not 0 < int(limit) <= maximum:
+        raise InvalidQueryError(f'limit must be an integer from 1 to {maximum}')
+    return int(limit)
+
+
+def page_after(after: str = None) -> int:
+    """Курсор ?after= — id последней строки предыдущей страницы"""
+    if after is None or after == '':
+        return 0
+    if not str(after).isdigit():
+        raise InvalidQueryError('after must be a row id from the previous page')
+    return int(after)
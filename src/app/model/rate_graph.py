@@ -0,0 +1,203 @@
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass
+
+PIVOT = 'USD'  # При равной длине пути предпочитаем кросс-курс через USD
+
+
+@dataclass(frozen=True)
+class ConversionPath:
+    """Найденный путь конвертации и итоговый курс"""
+
+    codes: tuple  # ('EUR', 'GBP', 'INR')
+    rate: float
+    rate_id: int  # id строки exchange_rates для пути из одного шага, иначе -1
+    method: str  # 'direct', 'reverse' или 'via_<валюты>'
+
+    @property
+    def hops(self) -> int:
+        return len(self.codes) - 1
+
+
+def _edge_key(a: str, b: str) -> frozenset:
+    return frozenset((a, b))
+
+
+class RateGraph:
+    """Граф курсов валют в памяти.
+
+    Вершины — коды валют, ребра — строки exchange_rates (по ребру можно идти
+    в обе стороны, обратный курс 1/rate). Путь ищется поиском в ширину
+    (минимум промежуточных валют) и кэшируется; повторный запрос по той же
+    паре — поиск в словаре. Изменение курса сбрасывает только пути,
+    проходящие через измененное ребро.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self._currencies = {}  # code -> CurrencyDTO.to_dict()
+        self._rates = {}  # (from, to) -> (id, rate)
+        self._neighbors = defaultdict(set)
+        self._paths = {}  # (from, to) -> ConversionPath | None (пути нет)
+        self._dependents = defaultdict(set)  # ребро -> пары, чьи пути через него идут
+
+    def load(self, currencies: list[dict], rates: list[tuple]) -> None:
+        """Заполняет граф: rates — кортежи (id, from_code, to_code, rate)"""
+        with self._lock:
+            self._reset()
+            for currency in currencies:
+                self._currencies[currency['code']] = currency
+            for rate_id, from_code, to_code, rate in rates:
+                self._rates[(from_code, to_code)] = (rate_id, rate)
+                self._neighbors[from_code].add(to_code)
+                self._neighbors[to_code].add(from_code)
+            self.loaded = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            self.loaded = True
+
+    def _reset(self) -> None:
+        self._currencies.clear()
+        self._rates.clear()
+        self._neighbors.clear()
+        self._paths.clear()
+        self._dependents.clear()
+
+    def currency(self, code: str) -> dict:
+        return self._currencies.get(code)
+
+    def add_currency(self, currency: dict) -> None:
+        with self._lock:
+            self._currencies[currency['code']] = currency
+
+    def set_rate(self, rate_id: int, base: dict, target: dict, rate: float) -> None:
+        """Добавляет или обновляет курс и сбрасывает зависящие от него пути"""
+        from_code, to_code = base['code'], target['code']
+        with self._lock:
+            self._currencies[from_code] = base
+            self._currencies[to_code] = target
+            is_new_edge = to_code not in self._neighbors[from_code]
+            self._rates[(from_code, to_code)] = (rate_id, rate)
+            self._neighbors[from_code].add(to_code)
+            self._neighbors[to_code].add(from_code)
+
+            for pair in self._dependents.pop(_edge_key(from_code, to_code), ()):
+                self._invalidate(pair)
+            if is_new_edge:
+                self._invalidate_shortcuts(from_code, to_code)
+
+    def _invalidate(self, pair: tuple) -> None:
+        path = self._paths.pop(pair, None)
+        if path is None:  # Пути не было или закэшировано его отсутствие
+            return
+        for a, b in zip(path.codes, path.codes[1:], strict=False):
+            dependents = self._dependents.get(_edge_key(a, b))
+            if dependents is not None:
+                dependents.discard(pair)
+
+    def _invalidate_shortcuts(self, u: str, v: str) -> None:
+        """Сбрасывает пути, которые новое ребро u—v делает короче (или возможными)"""
+        dist_u = self._distances(u)
+        dist_v = self._distances(v)
+        infinity = float('inf')
+        for pair, path in list(self._paths.items()):
+            source, target = pair
+            via_edge = min(
+                dist_u.get(source, infinity) + 1 + dist_v.get(target, infinity),
+                dist_v.get(source, infinity) + 1 + dist_u.get(target, infinity),
+            )
+            current = path.hops if path is not None else infinity
+            if via_edge < current:
+                self._invalidate(pair)
+
+    def _distances(self, start: str) -> dict:
+        distances = {start: 0}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for neighbor in self._neighbors.get(node, ()):
+                if neighbor not in distances:
+                    distances[neighbor] = distances[node] + 1
+                    queue.append(neighbor)
+        return distances
+
+    def find(self, from_code: str, to_code: str) -> ConversionPath | None:
+        """Путь конвертации from_code → to_code или None, если его нет"""
+        pair = (from_code, to_code)
+        try:
+            return self._paths[pair]
+        except KeyError:
+            pass
+        with self._lock:
+            if pair in self._paths:
+                return self._paths[pair]
+            if from_code not in self._neighbors or to_code not in self._neighbors:
+                # Не вершины графа (в том числе любые коды из запроса): не кэшируем,
+                # иначе кэш растет без предела
+                return None
+            path = self._search(from_code, to_code)
+            self._paths[pair] = path
+            if path is not None:
+                for a, b in zip(path.codes, path.codes[1:], strict=False):
+                    self._dependents[_edge_key(a, b)].add(pair)
+            return path
+
+    def _order(self, codes) -> list:
+        return sorted(codes, key=lambda code: (code != PIVOT, code))
+
+    def _search(self, from_code: str, to_code: str) -> ConversionPath | None:
+        if from_code == to_code or from_code not in self._neighbors:
+            return None
+        previous = self._bfs(from_code, to_code)
+        if to_code not in previous:
+            return None
+        return self._path_for(self._codes_to(previous, to_code))
+
+    def _bfs(self, from_code: str, to_code: str = None) -> dict:
+        """Дерево обхода в ширину: code -> предыдущая валюта (None для from_code).
+
+        Без to_code обходит всю компоненту; остановка на to_code не меняет
+        уже найденные предки, поэтому пути совпадают в обоих режимах.
+        """
+        previous = {from_code: None}
+        queue = deque([from_code])
+        while queue and to_code not in previous:
+            node = queue.popleft()
+            for neighbor in self._order(self._neighbors[node]):
+                if neighbor not in previous:
+                    previous[neighbor] = node
+                    queue.append(neighbor)
+        return previous
+
+    @staticmethod
+    def _codes_to(previous: dict, to_code: str) -> tuple:
+        codes = [to_code]
+        while previous[codes[-1]] is not None:
+            codes.append(previous[codes[-1]])
+        codes.reverse()
+        return tuple(codes)
+
+    def _path_for(self, codes: tuple) -> ConversionPath:
+        """Курс, метод и id строки курса для пути по кодам валют"""
+        rate = 1.0
+        for a, b in zip(codes, codes[1:], strict=False):
+            rate *= self._hop_rate(a, b)
+
+        from_code, to_code = codes[0], codes[-1]
+        if len(codes) == 2:
+            direct = self._rates.get((from_code, to_code))
+            if direct is not None:
+                return ConversionPath(codes, rate, direct[0], 'direct')
+            reverse = self._rates[(to_code, from_code)]
+            return ConversionPath(codes, rate, reverse[0], 'reverse')
+        method = 'via_' + '_'.join(codes[1:-1]).lower()
+        return ConversionPath(codes, rate, -1, method)
+
+    def _hop_rate(self, a: str, b: str) -> float:
+        direct = self._rates.get((a, b))
+        if direct is not None:
+            return direct[1]
+        return 1.0 / self._rates[(b, a)][1]
@@ -0,0 +1,176 @@
+import threading
+
+import numpy as np
+
+from .rate_graph import PIVOT
+
+
+class RateMatrix:
+    """Плотная матрица кросс-курсов N×N (float64).
+
+    Строки и столбцы упорядочены по id валют из таблицы currencies;
+    matrix[i, j] — сколько единиц валюты j дают за единицу валюты i
+    (NaN, если пары нельзя связать).
+
+    Курсы идут по тем же путям, что и /convert (RateGraph): обход в ширину
+    из каждой валюты с тем же порядком соседей. Обход выполняется сразу для
+    всех источников — по одной векторной операции на позицию очереди, —
+    и дает матрицу предков parent[s, t]; курс пути собирается по уровням
+    глубины выборками из матриц предков и курсов шага. Изменение курса
+    существующей пары умножает только ячейки, чьи пути через нее проходят;
+    новая пара или валюта перестраивает матрицу целиком.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self._codes = []
+        self._index = {}  # code -> номер строки
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rates = {}  # (from, to) -> rate
+        self._hops = np.empty((0, 0))  # Курс шага a -> b по ребру (NaN — ребра нет)
+        self._parent = np.empty((0, 0), dtype=np.int64)  # Предок t при обходе из s; -1
+        self._depth = np.empty(
+            (0, 0), dtype=np.int64
+        )  # Число шагов пути; -1 — пути нет
+        self._matrix = np.empty((0, 0))
+
+    def load(self, currencies: list[dict], rates: list[tuple]) -> None:
+        """Строит матрицу; rates — кортежи (id, from_code, to_code, rate)"""
+        with self._lock:
+            ordered = sorted(currencies, key=lambda c: c['id'])
+            self._codes = [c['code'] for c in ordered]
+            self._index = {code: i for i, code in enumerate(self._codes)}
+            self._ids = np.array([c['id'] for c in ordered], dtype=np.int64)
+            self._rates = {(f, t): rate for _, f, t, rate in rates}
+            self._rebuild()
+            self.loaded = True
+
+    def clear(self) -> None:
+        self.load([], [])
+
+    def _rebuild(self) -> None:
+        size = len(self._codes)
+        hops = np.full((size, size), np.nan)
+        for (f, t), rate in self._rates.items():
+            hops[self._index[t], self._index[f]] = 1.0 / rate
+        for (f, t), rate in self._rates.items():  # Прямой курс важнее обратного
+            hops[self._index[f], self._index[t]] = rate
+        self._hops = hops
+        self._parent, self._depth = self._bfs(~np.isnan(hops))
+
+        matrix = np.full((size, size), np.nan)
+        np.fill_diagonal(matrix, 1.0)
+        for level in range(1, self._depth.max(initial=0) + 1):
+            sources, targets = np.nonzero(self._depth == level)
+            parents = self._parent[sources, targets]
+            matrix[sources, targets] = matrix[sources, parents] * hops[parents, targets]
+        self._matrix = matrix
+
+    def _bfs(self, adjacent: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Обход в ширину из всех валют сразу.
+
+        Шаг k снимает с очереди каждого источника его k-ю валюту и ставит в
+        очередь ее непосещенных соседей в порядке RateGraph._order (USD, затем
+        по коду) — предки совпадают с теми, что находит RateGraph.find().
+        """
+        size = len(self._codes)
+        order = np.array(
+            sorted(
+                range(size), key=lambda i: (self._codes[i] != PIVOT, self._codes[i])
+            ),
+            dtype=np.int64,
+        )
+        rows = np.arange(size)
+        parent = np.full((size, size), -1, dtype=np.int64)
+        depth = np.full((size, size), -1, dtype=np.int64)
+        depth[rows, rows] = 0
+        queue = np.full(
+            (size, size), -1, dtype=np.int64
+        )  # queue[s, k] — k-я валюта очереди
+        queue[:, 0] = rows
+        tail = np.ones(size, dtype=np.int64)
+        for position in range(size):
+            active = tail > position
+            if not active.any():
+                break
+            sources = rows[active]
+            nodes = queue[sources, position]
+            found = adjacent[nodes][:, order] & (depth[sources][:, order] < 0)
+            slots = tail[sources, np.newaxis] + np.cumsum(found, axis=1) - 1
+            hit_rows, hit_cols = np.nonzero(found)
+            hit_sources, targets = sources[hit_rows], order[hit_cols]
+            parent[hit_sources, targets] = nodes[hit_rows]
+            depth[hit_sources, targets] = depth[hit_sources, nodes[hit_rows]] + 1
+            queue[hit_sources, slots[hit_rows, hit_cols]] = targets
+            tail[sources] += found.sum(axis=1)
+        return parent, depth
+
+    def set_rate(self, from_code: str, to_code: str, rate: float) -> None:
+        self.set_rates([(from_code, to_code, rate)])
+
+    def set_rates(self, changes: list[tuple]) -> None:
+        """Применяет записанные курсы (from, to, rate).
+
+        Пара, которая уже связывала валюты (в любую сторону), не меняет
+        деревья обхода: ячейки поддеревьев под ее ребром умножаются на
+        отношение нового курса шага к старому. Новое ребро перестраивает
+        матрицу, новая валюта — сбрасывает ее до следующего запроса.
+        """
+        with self._lock:
+            if any(f not in self._index or t not in self._index for f, t, _ in changes):
+                self.loaded = False
+                return
+            new_edge = False
+            for f, t, rate in changes:
+                new_edge |= (f, t) not in self._rates and (t, f) not in self._rates
+                self._rates[(f, t)] = rate
+            if new_edge:
+                self._rebuild()
+                return
+            for f, t, _ in changes:
+                self._update_edge(self._index[f], self._index[t])
+
+    def _update_edge(self, a: int, b: int) -> None:
+        codes = self._codes
+        rate = self._rates.get((codes[a], codes[b]))
+        reverse = self._rates.get((codes[b], codes[a]))
+        for x, y, hop in (
+            (a, b, rate if rate is not None else 1.0 / reverse),
+            (b, a, reverse if reverse is not None else 1.0 / rate),
+        ):
+            factor = hop / self._hops[x, y]
+            self._hops[x, y] = hop
+            if factor != 1.0:
+                self._scale_subtrees(x, y, factor)
+
+    def _scale_subtrees(self, x: int, y: int, factor: float) -> None:
+        """Умножает ячейки (s, t), чей путь из s идет шагом x -> y"""
+        sources = np.nonzero(self._parent[:, y] == x)[0]
+        if not len(sources):
+            return
+        parent = self._parent[sources]
+        rows = np.arange(len(sources))[:, np.newaxis]
+        current = np.broadcast_to(np.arange(len(self._codes)), parent.shape).copy()
+        inside = current == y
+        for _ in range(self._depth.max()):  # Подъем к корню: y среди предков t
+            current = np.where(current >= 0, parent[rows, np.maximum(current, 0)], -1)
+            inside |= current == y
+        block = self._matrix[sources]
+        block[inside] *= factor
+        self._matrix[sources] = block
+
+    def snapshot(self, codes: list[str] = None) -> tuple:
+        """Коды, id и копия матрицы (или ее подматрицы по списку кодов)"""
+        with self._lock:
+            if codes is None:
+                return list(self._codes), self._ids.tolist(), self._matrix.copy()
+            idx = np.array([self._index[code] for code in codes], dtype=np.int64)
+            return (
+                list(codes),
+                self._ids[idx].tolist(),
+                self._matrix[np.ix_(idx, idx)],
+            )
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._index
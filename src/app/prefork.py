@@ -0,0 +1,205 @@
+import logging
+import os
+import selectors
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Heartbeat:
+    """Сигнал жизни рабочего процесса мастеру через pipe.
+
+    Вызывается из цикла обслуживания сервера, поэтому подтверждает не просто
+    существование процесса, а то, что он принимает соединения.
+    """
+
+    def __init__(self, fd: int, interval: float, slot: int = 0):
+        self.fd = fd
+        self.interval = interval
+        self.slot = slot  # Номер слота рабочего процесса (0 — «ведущий»)
+        self._last = 0.0
+        os.set_blocking(fd, False)
+
+    def __call__(self) -> None:
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        try:
+            os.write(self.fd, b'.')
+        except (BlockingIOError, BrokenPipeError):
+            pass
+
+
+class Worker:
+    """Состояние рабочего процесса с точки зрения мастера"""
+
+    def __init__(self, slot: int, pid: int, fd: int):
+        self.slot = slot
+        self.pid = pid
+        self.fd = fd
+        self.started = time.monotonic()
+        self.last_heartbeat = self.started
+
+
+def _raise_exit(signum, frame):
+    raise SystemExit(0)
+
+
+class PreforkMaster:
+    """Мастер-процесс модели pre-fork.
+
+    Запускает workers рабочих процессов; каждый сам открывает слушающий сокет
+    с SO_REUSEPORT, и ядро распределяет соединения между ними. Мастер следит
+    за сигналами жизни, перезапускает упавшие и зависшие процессы и
+    по SIGTERM/SIGINT останавливает всех согласованно.
+    """
+
+    def __init__(
+        self,
+        worker_target: callable,
+        workers: int,
+        heartbeat_interval: float = 1.0,
+        heartbeat_timeout: float = 30.0,
+        shutdown_timeout: float = 10.0,
+    ):
+        if workers < 1:
+            raise ValueError('Количество рабочих процессов должно быть больше нуля')
+        self.worker_target = worker_target  # вызывается в дочернем процессе с Heartbeat
+        self.workers = workers
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self._children: dict[int, Worker] = {}
+        self._selector = selectors.DefaultSelector()
+        self._stopping = False
+        self._restart_delay = 0.0
+        self.restarts = 0
+
+    def run(self) -> None:
+        """Основной цикл мастера; возвращается после остановки всех процессов."""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        logger.info(
+            'Мастер %d запускает %d рабочих процессов', os.getpid(), self.workers
+        )
+        for slot in range(self.workers):
+            self._spawn(slot)
+        try:
+            while not self._stopping:
+                self._poll_heartbeats()
+                self._reap()
+                self._check_health()
+        finally:
+            self._stop_workers()
+            self._selector.close()
+
+    def _request_stop(self, signum, frame) -> None:
+        logger.info('Мастер получил сигнал %d, остановка', signum)
+        self._stopping = True
+
+    def _spawn(self, slot: int) -> None:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # Дочерний процесс
+            os.close(read_fd)
+            for worker in self._children.values():
+                os.close(worker.fd)
+            signal.signal(signal.SIGTERM, _raise_exit)
+            signal.signal(signal.SIGINT, _raise_exit)
+            code = 0
+            try:
+                self.worker_target(Heartbeat(write_fd, self.heartbeat_interval, slot))
+            except SystemExit as e:
+                code = e.code or 0
+            except BaseException:
+                logger.exception('Рабочий процесс %d завершился с ошибкой', os.getpid())
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+
+        os.close(write_fd)
+        os.set_blocking(read_fd, False)
+        worker = Worker(slot, pid, read_fd)
+        self._children[pid] = worker
+        self._selector.register(read_fd, selectors.EVENT_READ, worker)
+        logger.info('Рабочий процесс %d запущен (слот %d)', pid, slot)
+
+    def _poll_heartbeats(self) -> None:
+        for key, _ in self._selector.select(timeout=self.heartbeat_interval):
+            worker = key.data
+            try:
+                if os.read(worker.fd, 4096):
+                    worker.last_heartbeat = time.monotonic()
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                pass
+
+    def _reap(self) -> None:
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._children.pop(pid, None)
+            if worker is None:
+                continue
+            self._selector.unregister(worker.fd)
+            os.close(worker.fd)
+            logger.warning(
+                'Рабочий процесс %d завершился с кодом %d',
+                pid,
+                os.waitstatus_to_exitcode(status),
+            )
+            if not self._stopping:
+                self._restart(worker)
+
+    def _restart(self, worker: Worker) -> None:
+        # Процесс, упавший сразу после старта, перезапускаем с нарастающей задержкой
+        if time.monotonic() - worker.started < 1.0:
+            self._restart_delay = min(max(self._restart_delay * 2, 0.1), 30.0)
+            time.sleep(self._restart_delay)
+        else:
+            self._restart_delay = 0.0
+        self.restarts += 1
+        self._spawn(worker.slot)
+
+    def _check_health(self) -> None:
+        now = time.monotonic()
+        for worker in list(self._children.values()):
+            if now - worker.last_heartbeat > self.heartbeat_timeout:
+                logger.error(
+                    'Рабочий процесс %d не отвечает %.0f с, принудительная остановка',
+                    worker.pid,
+                    now - worker.last_heartbeat,
+                )
+                worker.last_heartbeat = now  # Не посылаем SIGKILL повторно
+                self._signal(worker.pid, signal.SIGKILL)
+
+    @staticmethod
+    def _signal(pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _stop_workers(self) -> None:
+        for pid in self._children:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid in list(self._children):
+            logger.warning('Рабочий процесс %d не завершился вовремя, SIGKILL', pid)
+            self._signal(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            worker = self._children.pop(pid)
+            self._selector.unregister(worker.fd)
+            os.close(worker.fd)
+        logger.info('Все рабочие процессы остановлены')
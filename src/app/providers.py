@@ -0,0 +1,114 @@
+import json
+import logging
+import random
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Курсы к USD для офлайн-провайдера по умолчанию
+DEFAULT_STUB_RATES = {
+    'EUR': 0.92,
+    'GBP': 0.79,
+    'JPY': 151.6,
+    'CNY': 7.24,
+    'RUB': 92.5,
+    'INR': 83.4,
+    'CHF': 0.9,
+    'CAD': 1.36,
+}
+
+
+def parse_rates_payload(data: dict, base: str = 'USD') -> list[tuple[str, str, float]]:
+    """Разбирает ответ вида {"base": "USD", "rates": {"EUR": 0.92, ...}}.
+
+    Поддерживается и поле base_code (open.er-api.com). Нечисловые и
+    неположительные курсы пропускаются.
+    """
+    base = (data.get('base') or data.get('base_code') or base).upper()
+    rates = data.get('rates')
+    if not isinstance(rates, dict):
+        raise ValueError('В ответе провайдера нет объекта rates')
+    result = []
+    for code, rate in rates.items():
+        if code.upper() == base or isinstance(rate, bool):
+            continue
+        if isinstance(rate, int | float) and rate > 0:
+            result.append((base, code.upper(), float(rate)))
+    return result
+
+
+class RateProvider(ABC):
+    """Источник курсов для планировщика загрузки"""
+
+    name = 'provider'
+
+    @abstractmethod
+    def fetch(self) -> list[tuple[str, str, float]]:
+        """Список (from, to, rate)"""
+
+
+class StubProvider(RateProvider):
+    """Офлайн-провайдер: курсы из JSON-файла или встроенные.
+
+    drift > 0 случайно смещает курсы на каждой загрузке (±drift), чтобы
+    имитировать изменения без сети.
+    """
+
+    name = 'stub'
+
+    def __init__(
+        self,
+        rates: dict = None,
+        base: str = 'USD',
+        path: str = None,
+        drift: float = 0.0,
+        seed: int = None,
+    ):
+        if path:
+            data = json.loads(Path(path).read_text(encoding='utf-8'))
+            base = data.get('base', base)
+            rates = data['rates']
+        self.base = base.upper()
+        self.rates = dict(rates if rates is not None else DEFAULT_STUB_RATES)
+        self.drift = drift
+        self._random = random.Random(seed)
+
+    def fetch(self) -> list[tuple[str, str, float]]:
+        if self.drift:
+            for code, rate in self.rates.items():
+                change = self._random.uniform(-self.drift, self.drift)
+                self.rates[code] = round(rate * (1 + change), 6)
+        return parse_rates_payload({'base': self.base, 'rates': self.rates})
+
+
+class HTTPRateProvider(RateProvider):
+    """Провайдер с HTTP API, отвечающим {"base": ..., "rates": {...}}"""
+
+    name = 'http'
+
+    def __init__(
+        self,
+        url: str,
+        base: str = 'USD',
+        symbols: list[str] = None,
+        timeout: float = 10.0,
+        session: requests.Session = None,
+    ):
+        self.url = url
+        self.base = base.upper()
+        self.symbols = symbols
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def fetch(self) -> list[tuple[str, str, float]]:
+        params = {'base': self.base}
+        if self.symbols:
+            params['symbols'] = ','.join(self.symbols)
+        response = self.session.get(self.url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        rates = parse_rates_payload(response.json(), self.base)
+        logger.debug('Провайдер %s вернул %d курсов', self.url, len(rates))
+        return rates
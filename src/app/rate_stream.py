@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from itertools import islice
+
+from errors import ServiceUnavailableError
+from events import CLEARED, RATE_ADDED, RATE_UPDATED, RATES_UPSERTED, EventBus
+from response import Response
+from serializer import encode_rows
+
+logger = logging.getLogger(__name__)
+
+EVENT_STREAM_CONTENT_TYPE = 'text/event-stream; charset=utf-8'
+# Шаблон data события rate; поля совпадают с ?fields=pair,base,target,rate
+RATE_EVENT_ROW = '{"pair":%s,"base":%s,"target":%s,"rate":%s}'
+RETRY_MS = 3000  # Задержка переподключения EventSource после обрыва
+PING = b': ping\n\n'
+
+
+def _frame(event: str, data: str, event_id: str = None) -> str:
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {data}\n\n'
+
+
+def _rate_frames(rows: list, ids: list = None) -> list[str]:
+    """Кадры rate для строк (base, target, rate) с id из ids (None — без id)"""
+    frames = []
+    for index, (base, target, rate) in enumerate(rows):
+        data = encode_rows(RATE_EVENT_ROW, [(base + target, base, target, rate)])
+        frames.append(_frame('rate', data, ids[index] if ids else None))
+    return frames
+
+
+class Subscription:
+    """Очередь одного подписчика: последнее значение на пару.
+
+    Быстрые обновления пары склеиваются — в очереди остается только самое
+    свежее, и порядок строк следует номерам событий. Поэтому медленный
+    клиент не задерживает запись и не копит память сверх одной строки на пару;
+    если пар в очереди больше max_pending, подписка закрывается, и клиент
+    продолжает с Last-Event-ID.
+    """
+
+    def __init__(self, epoch: str, pairs: set | None, max_pending: int):
+        self.epoch = epoch
+        self.pairs = pairs
+        self.max_pending = max_pending
+        self.closed = False
+        self.overflowed = False
+        self.waker = None  # Будит асинхронного читателя из потока записи
+        self._pending = {}  # (base, target) | None (сброс) -> (seq, rate)
+        self._cond = threading.Condition()
+
+    def offer(self, entries, bounded: bool = True) -> None:
+        with self._cond:
+            if self.closed:
+                return
+            for seq, key, rate in entries:
+                if key is None:  # Все курсы удалены: прежние строки не нужны
+                    self._pending.clear()
+                elif self.pairs is not None and key not in self.pairs:
+                    continue
+                else:
+                    self._pending.pop(key, None)
+                self._pending[key] = (seq, rate)
+            if bounded and len(self._pending) > self.max_pending:
+                self.overflowed = self.closed = True
+                self._pending.clear()
+            self._cond.notify_all()
+        if self.waker is not None:
+            self.waker()
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self.waker is not None:
+            self.waker()
+
+    def wait(self, timeout: float) -> bytes | None:
+        """Накопленные кадры; b'' — за timeout ничего не пришло, None — конец"""
+        with self._cond:
+            if not self._pending and not self.closed:
+                self._cond.wait(timeout)
+            return self._drain()
+
+    def poll(self) -> bytes | None:
+        with self._cond:
+            return self._drain()
+
+    def _drain(self) -> bytes | None:
+        if not self._pending:
+            return None if self.closed else b''
+        frames = []
+        for key, (seq, rate) in self._pending.items():
+            event_id = f'{self.epoch}-{seq}'
+            if key is None:
+                frames.append(_frame('reset', '{}', event_id))
+            else:
+                frames += _rate_frames([(*key, rate)], [event_id])
+        self._pending.clear()
+        return ''.join(frames).encode('utf-8')
+
+
+class RateEventStream:
+    """Тело ответа text/event-stream одного подписчика.
+
+    Синхронные движки читают его как итератор в рабочем потоке, асинхронный —
+    через async for, не занимая поток на время ожидания.
+    """
+
+    def __init__(
+        self, hub: 'RateStreamHub', subscription: Subscription, preamble: bytes
+    ):
+        self.hub = hub
+        self.subscription = subscription
+        self.preamble = preamble
+
+    def to_response(self, status_code: int) -> Response:
+        return Response(
+            status_code,
+            content_type=EVENT_STREAM_CONTENT_TYPE,
+            # X-Accel-Buffering: прокси не должен копить события
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+            chunks=self,
+        )
+
+    def __iter__(self):
+        try:
+            yield self.preamble
+            while True:
+                chunk = self.subscription.wait(self.hub.heartbeat)
+                if chunk is None:
+                    return
+                yield chunk or PING
+        finally:
+            self.close()
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def wake() -> None:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:  # Цикл событий уже закрыт
+                pass
+
+        self.subscription.waker = wake
+        try:
+            yield self.preamble
+            while True:
+                ready.clear()  # До poll: запись после него разбудит ожидание
+                chunk = self.subscription.poll()
+                if chunk is None:
+                    return
+                if chunk:
+                    yield chunk
+                    continue
+                try:
+                    await asyncio.wait_for(ready.wait(), self.hub.heartbeat)
+                except asyncio.TimeoutError:
+                    yield PING
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self.subscription)
+
+
+class RateStreamHub:
+    """Рассылка изменений курсов подписчикам Server-Sent Events.
+
+    Изменения приходят через EventBus (как в кэши ответов) и получают
+    сквозные номера; последние replay номеров хранятся в журнале, чтобы
+    переподключившийся клиент получил пропущенное по Last-Event-ID. Если
+    номер вытеснен из журнала или выдан другим процессом, клиент получает
+    reset и текущие курсы заново. Публикация не ждет подписчиков: она только
+    кладет строки в их очереди.
+    """
+
+    def __init__(
+        self,
+        events: EventBus,
+        max_subscribers: int = 1000,
+        max_pending: int = 1000,
+        replay: int = 10000,
+        heartbeat: float = 15.0,
+    ):
+        # Номера событий действительны только в этом экземпляре (процессе)
+        self.epoch = os.urandom(4).hex()
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self.heartbeat = heartbeat
+        self._seq = 0
+        self._log = deque(maxlen=replay)  # (seq, (base, target) | None, rate)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._opened = 0
+        self._overflows = 0
+        events.subscribe(self._on_data_event)
+
+    def _on_data_event(self, event) -> None:
+        if event.kind in (RATE_ADDED, RATE_UPDATED):
+            changes = [((event.from_currency, event.to_currency), event.rate)]
+        elif event.kind == RATES_UPSERTED:
+            changes = [
+                ((c['from'], c['to']), c['rate']) for c in event.payload['changes']
+            ]
+        elif event.kind == CLEARED:
+            changes = [(None, None)]
+        else:
+            return
+        with self._lock:
+            entries = []
+            for key, rate in changes:
+                self._seq += 1
+                entries.append((self._seq, key, rate))
+            self._log.extend(entries)
+            for subscription in self._subscribers:
+                subscription.offer(entries)
+
+    def open(
+        self, pairs: set | None, last_event_id: str, snapshot: callable
+    ) -> RateEventStream:
+        """Подписка на пары pairs ((base, target); None — все).
+
+        snapshot() возвращает текущие курсы [(base, target, rate)]; вызывается,
+        только если продолжить с last_event_id нельзя.
+        """
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_subscribers:
+                raise ServiceUnavailableError('Too many event stream subscribers')
+            subscription = Subscription(self.epoch, pairs, self.max_pending)
+            resumed = self._replay(subscription, last_event_id)
+            start = f'{self.epoch}-{self._seq}'
+            self._subscribers.add(subscription)
+            self._opened += 1
+        frames = [f'retry: {RETRY_MS}\n\n']
+        if not resumed:
+            try:
+                rows = [row for row in snapshot() if pairs is None or row[:2] in pairs]
+            except BaseException:
+                self.unsubscribe(subscription)
+                raise
+            if last_event_id:  # Пропущенное не восстановить: клиент начинает заново
+                frames.append(_frame('reset', '{}'))
+            frames += _rate_frames(rows)
+            if len(frames) > 1:
+                # id только на последнем кадре: обрыв посреди снимка повторит его целиком
+                frames[-1] = f'id: {start}\n' + frames[-1]
+        return RateEventStream(self, subscription, ''.join(frames).encode('utf-8'))
+
+    def _replay(self, subscription: Subscription, last_event_id: str) -> bool:
+        """Ставит в очередь события после last_event_id, если они есть в журнале"""
+        epoch, _, seq = (last_event_id or '').strip().rpartition('-')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+            return False
+        oldest = self._log[0][0] if self._log else self._seq + 1
+        if int(seq) < oldest - 1:
+            return False
+        subscription.offer(
+            islice(self._log, int(seq) + 1 - oldest, None), bounded=False
+        )
+        return True
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription not in self._subscribers:
+                return
+            self._subscribers.discard(subscription)
+            if subscription.overflowed:
+                self._overflows += 1
+                logger.warning(
+                    'Подписчик не успевал читать события курсов, поток закрыт'
+                )
+        subscription.close()
+
+    def close(self) -> None:
+        """Завершает все потоки (остановка сервера); новые подписки — 503"""
+        with self._lock:
+            self._closed = True
+            subscriptions = list(self._subscribers)
+        for subscription in subscriptions:
+            subscription.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'max_subscribers': self.max_subscribers,
+                'opened': self._opened,
+                'overflows': self._overflows,
+                'last_event': self._seq,
+                'replay': len(self._log),
+            }
+
+
+def create_hub(events: EventBus, max_subscribers: int = None) -> RateStreamHub:
+    """Рассылка по переменным STREAM_*; max_subscribers — предел движка сервера"""
+    limit = int(os.getenv('STREAM_MAX_SUBSCRIBERS', 1000))
+    if max_subscribers is not None:
+        limit = min(limit, max_subscribers)
+    return RateStreamHub(
+        events,
+        max_subscribers=limit,
+        max_pending=int(os.getenv('STREAM_MAX_PENDING', 1000)),
+        replay=int(os.getenv('STREAM_REPLAY', 10000)),
+        heartbeat=float(os.getenv('STREAM_HEARTBEAT', 15)),
+    )
@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass, field, replace
+from email.utils import parsedate_to_datetime
+
+from serializer import JSON_CONTENT_TYPE, JSONRows, Page, RowStream, dumps
+
+logger = logging.getLogger(__name__)
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PATCH, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+
+@dataclass
+class Response:
+    """HTTP-ответ, не зависящий от движка сервера"""
+
+    status: int
+    body: bytes = b''
+    content_type: str = None
+    headers: dict = field(default_factory=dict)
+    gzip_body: bytes = None  # Сжатый вариант тела, вычисляется один раз
+    # Тело частями для Transfer-Encoding: chunked; тогда body пустое
+    chunks: Iterable[bytes] = None
+
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'image/x-icon')
+# Заголовки, которые повторяются в ответе 304
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+
+def make_etag(body: bytes) -> str:
+    """Строгий ETag по содержимому тела ответа"""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, как требует RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+    return etag.removeprefix('W/') in candidates
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Разрешает ли Accept-Encoding клиента gzip (учитывая q=0)"""
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if coding.strip().lower() in ('gzip', '*'):
+            quality = params.replace(' ', '').lower().removeprefix('q=')
+            try:
+                return not params or float(quality) > 0
+            except ValueError:
+                return True
+    return False
+
+
+def negotiate_encoding(
+    response: Response, accept_encoding: str, min_size: int = 1024
+) -> Response:
+    """Выбирает gzip-вариант ответа, если клиент его принимает.
+
+    Сжимаются успешные ответы текстовых типов от min_size байт; для ответов
+    с заранее сжатым телом (статика, кэш) сжатие не повторяется.
+    """
+    if response.status != 200 or not response.body:
+        return response
+    if not (response.content_type or '').startswith(COMPRESSIBLE_TYPES):
+        return response
+    if response.gzip_body is None and len(response.body) < min_size:
+        return response
+
+    headers = {**response.headers, 'Vary': 'Accept-Encoding'}
+    if not accepts_gzip(accept_encoding):
+        return replace(response, headers=headers)
+    if response.gzip_body is None:
+        # Сохраняем на исходном объекте: закэшированный ответ сжимается один раз
+        response.gzip_body = gzip.compress(response.body, compresslevel=6)
+    if len(response.gzip_body) >= len(response.body):
+        return replace(response, headers=headers)
+    headers['Content-Encoding'] = 'gzip'
+    if 'ETag' in headers:
+        # Разные тела — разные ETag
+        headers['ETag'] = headers['ETag'][:-1] + '-gzip"'
+    return replace(response, body=response.gzip_body, headers=headers, gzip_body=None)
+
+
+def not_modified(response: Response, request_headers) -> Response | None:
+    """Ответ 304, если у клиента актуальная версия (If-None-Match/If-Modified-Since)"""
+    if response.status != 200:
+        return None
+    etag = response.headers.get('ETag')
+    if_none_match = request_headers.get('If-None-Match')
+    if if_none_match is not None:
+        if etag is None or not etag_matches(if_none_match, etag):
+            return None
+    else:
+        last_modified = response.headers.get('Last-Modified')
+        if_modified_since = request_headers.get('If-Modified-Since')
+        if not last_modified or not if_modified_since:
+            return None
+        try:
+            if parsedate_to_datetime(last_modified) > parsedate_to_datetime(
+                if_modified_since
+            ):
+                return None
+        except (TypeError, ValueError):
+            return None
+    headers = {
+        name: response.headers[name]
+        for name in VALIDATOR_HEADERS
+        if name in response.headers
+    }
+    return Response(304, headers=headers)
+
+
+def render_response(status_code: int, data: any, content_type: str = None) -> Response:
+    """Кодирует результат обработчика в тело ответа"""
+    if hasattr(data, 'to_response'):  # Готовые ответы, например статические файлы
+        return data.to_response(status_code)
+    if isinstance(data, RowStream):
+        return Response(
+            status_code, content_type=data.content_type, chunks=data.iter_encode()
+        )
+    if isinstance(data, JSONRows | Page):
+        if data.streamable():
+            return Response(
+                status_code, content_type=JSON_CONTENT_TYPE, chunks=data.iter_encode()
+            )
+        body = data.encode()
+        content_type = content_type or JSON_CONTENT_TYPE
+    elif isinstance(data, dict) or isinstance(data, list):
+        body = dumps(data)
+        content_type = content_type or JSON_CONTENT_TYPE
+    elif isinstance(data, str):
+        body = data.encode('utf-8')
+        content_type = content_type or 'text/html; charset=utf-8'
+    elif isinstance(data, bytes):
+        body = data
+        content_type = content_type or 'application/octet-stream'
+    else:
+        body = str(data).encode('utf-8')
+        content_type = content_type or 'text/plain; charset=utf-8'
+
+    logger.debug(
+        'Ответ с кодом состояния %s, тип: %s, тип содержимого: %s',
+        status_code,
+        content_type,
+        type(data).__name__,
+    )
+    return Response(status_code, body, content_type)
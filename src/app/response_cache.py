@@ -0,0 +1,61 @@
+import logging
+from urllib.parse import urlparse
+
+from cache import LRUCache
+from events import EventBus
+from response import Response, make_etag
+from serializer import NDJSON_CONTENT_TYPE
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Кэш закодированных ответов GET для коллекций.
+
+    Ответ хранится вместе с ETag до первой записи в данные: любое событие
+    EventBus увеличивает версию данных и сбрасывает кэш. Записи других
+    процессов замечает changed() (DataVersionProbe) перед выдачей из кэша;
+    TTL только страхует.
+    """
+
+    def __init__(
+        self,
+        events: EventBus,
+        paths: set,
+        maxsize: int = 64,
+        ttl: float = None,
+        changed: callable = None,
+    ):
+        self.paths = paths
+        self._cache = LRUCache(maxsize, ttl)
+        self._changed = changed
+        events.subscribe(self._on_data_event)
+
+    @property
+    def version(self) -> int:
+        """Версия данных: растет при каждой записи"""
+        return self._cache.version
+
+    def _on_data_event(self, event) -> None:
+        self._cache.clear()
+
+    def is_cacheable(self, target: str, headers=None) -> bool:
+        """Потоковые ответы (Accept: application/x-ndjson) мимо кэша"""
+        if headers is not None and NDJSON_CONTENT_TYPE in headers.get('Accept', ''):
+            return False
+        return urlparse(target).path in self.paths
+
+    def get(self, target: str) -> Response | None:
+        if self._changed is not None and self._changed():
+            self._cache.clear()
+        return self._cache.get(target, None)
+
+    def store(self, target: str, response: Response, version: int) -> Response:
+        """Добавляет ETag и сохраняет ответ, если данные не менялись с version"""
+        response.headers['ETag'] = make_etag(response.body)
+        response.headers['Cache-Control'] = 'no-cache'
+        self._cache.set(target, response, version=version)
+        return response
+
+    def stats(self) -> dict:
+        return {'version': self.version, **self._cache.stats()}
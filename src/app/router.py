@@ -1,159 +1,217 @@
+import csv
+import io
 import json
 import logging
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 
+import metrics
 from controller import Controller
 from errors import APIError, InvalidPairError, RouteNotFoundError
+from routing import RouteTable
 
 logger = logging.getLogger(__name__)
 
 
+def _json_line(line: str):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        logger.error('Ошибка декодирования строки NDJSON')
+        return None
+
+
+def _invalid_pair() -> tuple:
+    raise InvalidPairError()
+
+
 class Router:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, controller: Controller = None):
         logger.info('Инициализация Router')
-        self.static_routes = {}
-        self.dynamic_routes = []
-        self._register_routes(db_path)
-
-    def _register_routes(self, db_path: str = None) -> None:
-        controller = Controller(db_path)
-
-        # Обработчики контроллера
-        get_currency = (controller.get_currency_by_code, ['code'])
-        add_currency = (controller.add_currency, ['code', 'name'])
-        get_exchange_rate = (controller.get_exchange_rate, ['from', 'to'])
-        add_exchange_rate = (controller.add_exchange_rate, ['from', 'to', 'rate'])
-        convert_currency = (controller.convert_currency, ['from', 'to', 'amount'])
-        get_exchange_rates = (controller.get_exchange_rates, [])
-        handle_html = (controller.handle_html_page, [])
-        return_icon = (controller.return_icon, [])
-        update_exchange_rate = (controller.update_exchange_rate, ['from', 'to', 'rate'])
-        delete_all_currencies = (controller.delete_all_currencies, [])
+        # Маршруты компилируются при регистрации (словарь + дерево сегментов)
+        self.routes = RouteTable()
+        # Маршруты, не обращающиеся к БД: асинхронный движок вызывает их без пула потоков
+        self.inline_routes = {('GET', '/'), ('GET', '/favicon.ico')}
+        # Контроллер может быть передан извне (общий на процесс, см. AppContext)
+        self.controller = controller or Controller(db_path)
+        self._register_routes(self.controller)
+
+    def _register_routes(self, controller: Controller) -> None:
+        add = self.add_route
 
         # Статические маршруты
-        self.static_routes[('GET', '/currencies')] = (controller.get_currencies, [])
-        self.static_routes[('GET', '/currency')] = get_currency
-        self.static_routes[('POST', '/currencies')] = add_currency
-        self.static_routes[('GET', '/exchangeRate')] = get_exchange_rate
-        self.static_routes[('POST', '/exchangeRates')] = add_exchange_rate
-        self.static_routes[('GET', '/exchangeRates')] = get_exchange_rates
-        self.static_routes[('GET', '/convert')] = convert_currency
-        self.static_routes[('GET', '/favicon.ico')] = return_icon
-        self.static_routes[('GET', '/')] = handle_html
-        self.static_routes[('PATCH', '/exchangeRate')] = update_exchange_rate
-        self.static_routes[('POST', '/currencies/delete_all')] = delete_all_currencies
-        # Динамические маршруты
-        self.dynamic_routes.append(('GET', '/currency/:code', get_currency))
-        self.dynamic_routes.append(('GET', '/exchangeRate/:pair', get_exchange_rate))
-        self.dynamic_routes.append(
-            ('PATCH', '/exchangeRate/:pair', update_exchange_rate)
+        add(
+            'GET',
+            '/currencies',
+            controller.get_currencies,
+            ['stream', 'accept', 'fields', 'after', 'limit'],
+        )
+        add('GET', '/currency', controller.get_currency_by_code, ['code'])
+        add('POST', '/currencies', controller.add_currency, ['code', 'name'])
+        add('GET', '/exchangeRate', controller.get_exchange_rate, ['from', 'to'])
+        add(
+            'POST',
+            '/exchangeRates',
+            controller.add_exchange_rate,
+            ['from', 'to', 'rate'],
+        )
+        add(
+            'GET',
+            '/exchangeRates',
+            controller.get_exchange_rates,
+            ['stream', 'accept', 'fields', 'base', 'target', 'after', 'limit'],
+        )
+        add(
+            'GET',
+            '/convert',
+            controller.convert_currency,
+            ['from', 'to', 'amount'],
+        )
+        add('POST', '/convert/batch', controller.convert_batch, ['items'])
+        add('GET', '/matrix', controller.get_rate_matrix, ['codes'])
+        add('GET', '/crossRates/check', controller.check_cross_rates)
+        add('GET', '/favicon.ico', controller.return_icon)
+        add('GET', '/', controller.handle_html_page)
+        add(
+            'PATCH',
+            '/exchangeRate',
+            controller.update_exchange_rate,
+            ['from', 'to', 'rate'],
+        )
+        add('POST', '/currencies/delete_all', controller.delete_all_currencies)
+        add(
+            'POST',
+            '/currencies/bulk',
+            controller.bulk_add_currencies,
+            ['items', 'upsert'],
+        )
+        add(
+            'POST',
+            '/exchangeRates/bulk',
+            controller.bulk_add_exchange_rates,
+            ['items', 'upsert'],
+        )
+        # Динамические маршруты; <pair:pair> разбирает USDJPY в from/to
+        add('GET', '/currency/:code', controller.get_currency_by_code, ['code'])
+        add(
+            'GET',
+            '/exchangeRate/<pair:pair>',
+            controller.get_exchange_rate,
+            ['from', 'to'],
         )
+        add(
+            'PATCH',
+            '/exchangeRate/<pair:pair>',
+            controller.update_exchange_rate,
+            ['from', 'to', 'rate'],
+        )
+        # :pair без конвертера: from/to здесь — границы периода из строки запроса
+        add(
+            'GET',
+            '/exchangeRate/:pair/history',
+            controller.get_exchange_rate_history,
+            ['pair', 'from', 'to', 'step', 'agg'],
+        )
+        # Сегмент, который <pair> не разобрал, доходит сюда: 400, а не 404
+        add('GET', '/exchangeRate/:pair', _invalid_pair)
+        add('PATCH', '/exchangeRate/:pair', _invalid_pair)
+
+    def add_route(
+        self, method: str, path: str, handler_controller: callable, args: list = None
+    ) -> None:
+        """Регистрирует маршрут; параметры пути — :name или <тип:name>"""
+        self.routes.add(method, path, handler_controller, args)
 
     def handle_request(self, handler: BaseHTTPRequestHandler) -> tuple:
-        logger.info(f'Обработка запроса: {handler.command} {handler.path}')
-        parsed_path = urlparse(handler.path)
+        content_length = int(handler.headers.get('Content-Length', 0))
+        body = handler.rfile.read(content_length) if content_length > 0 else b''
+        return self.dispatch(handler.command, handler.path, handler.headers, body)
+
+    def dispatch(self, method: str, target: str, headers, body: bytes) -> tuple:
+        """Разбирает запрос, не привязанный к конкретному HTTP-движку"""
+        logger.debug('Обработка запроса: %s %s', method, target)
+        parsed_path = urlparse(target)
         query_params = {k: v[0] for k, v in parse_qs(parsed_path.query).items()}
-        body = self._parse_body(handler)
+        content_type = headers.get('Content-Type', '').split(';')[0].strip()
+        body = self._parse_body(body, content_type)
         url = parsed_path.path
-        method = handler.command
         params = {
             **query_params,
             **body,
         }  # Объединяем параметры запроса и тела запроса в один словарь
+        # Формат ответа (потоковый NDJSON) обработчики получают как аргумент accept
+        params['accept'] = headers.get('Accept', '')
+        # Номер последнего полученного события при переподключении EventSource
+        params['last_event_id'] = headers.get('Last-Event-ID')
 
         return self._resolve(method, url, params)
 
+    def is_inline(self, method: str, target: str) -> bool:
+        method = 'GET' if method == 'HEAD' else method
+        return (method, urlparse(target).path) in self.inline_routes
+
     def _resolve(self, method: str, url: str, params: dict) -> tuple:
-        logger.debug(f'Маршрутизация запроса: {method} {url}')
-
-        # Проверка на статический маршрут
-        route = self.static_routes.get((method, url))
-        if route:
-            handler_controller, args = route
-            func_args = [params.get(arg) for arg in args]
-            return self._safe_call(handler_controller, func_args)
-
-        # Проверка на динамические маршруты
-        for m, route_pattern, route_info in self.dynamic_routes:
-            if m == method and self.match_dynamic_route(route_pattern, url, params):
-                handler_controller, args = route_info
-
-                # Разбор пары валют вида /exchangeRate/USDJPY → from=USD, to=JPY
-                if 'pair' in params and set(args) >= {'from', 'to'}:
-                    pair = params['pair']
-                    if isinstance(pair, str) and len(pair) == 6:
-                        params['from'] = pair[:3].upper()
-                        params['to'] = pair[3:].upper()
-                        logger.debug(
-                            f'Разобранная пара: from={params["from"]}, to={params["to"]}'
-                        )
-                    else:
-                        logger.warning(f"Некорректный формат pair: '{pair}'")
-                        raise InvalidPairError()
-                        return
-                func_args = [params.get(arg) for arg in args]
-                return self._safe_call(handler_controller, func_args)
-
-        logger.warning(f'Маршрут не найден: {method} {url}')
-        raise RouteNotFoundError()
+        logger.debug('Маршрутизация запроса: %s %s', method, url)
+        try:
+            route, path_params = self.routes.match(method, url)
+        except RouteNotFoundError:
+            logger.warning('Маршрут не найден: %s %s', method, url)
+            raise
+        metrics.current_route.set(route.pattern)
+        params.update(path_params)
+        func_args = [params.get(arg) for arg in route.args]
+        return self._safe_call(route.handler, func_args)
 
     def _safe_call(
         self, handler_controller: callable, func_args: list
     ) -> tuple:  # Возвращает результат обработчика и статус-код ответа
         try:
             logger.debug(
-                f'Вызов обработчика: {handler_controller.__name__} с аргументами: {func_args}'
+                'Вызов обработчика: %s с аргументами: %s',
+                handler_controller.__name__,
+                func_args,
             )
             response, code = (
                 handler_controller(*func_args) if func_args else handler_controller()
             )
             return response, code
         except APIError as e:
-            logger.error(f'API ошибка: {e.message}')
+            logger.error('API ошибка: %s', e.message)
             return e.to_dict(), e.status_code
         except Exception:
             logger.exception('Необработанная ошибка в контроллере')
             return {'error': 'Internal Server Error'}, 500
 
-    def match_dynamic_route(
-        self, route: str, url, query_params: dict
-    ) -> bool:  # Сопоставляет динамический маршрут с текущим URL
-        route_parts = route.strip('/').split('/')
-        url_parts = url.strip('/').split('/')
-
-        if len(route_parts) != len(url_parts):
-            return False
-
-        for route_part, url_part in zip(route_parts, url_parts, strict=True):
-            if route_part.startswith(':'):
-                query_params[route_part[1:]] = url_part
-            elif route_part != url_part:
-                return False
-
-        return True
-
     def _parse_body(
-        self, handler: BaseHTTPRequestHandler
+        self, body_bytes: bytes, content_type: str
     ) -> dict:  # Парсит тело запроса в зависимости от типа контента
-        logger.info('Парсинг тела запроса')
-        content_length = int(handler.headers.get('Content-Length', 0))
+        logger.debug('Парсинг тела запроса')
 
-        if content_length > 0:
-            body_bytes = handler.rfile.read(content_length)
+        if body_bytes:
             body = body_bytes.decode('utf-8')
-            content_type = handler.headers.get('Content-Type', '').split(';')[0].strip()
 
             if content_type == 'application/json':
                 try:
-                    return json.loads(body)
+                    data = json.loads(body)
                 except json.JSONDecodeError:
                     logger.error('Ошибка декодирования JSON')
                     return {}
+                # Массив в теле (пакетные запросы) передается обработчику как items
+                return {'items': data} if isinstance(data, list) else data
+            elif content_type == 'application/x-ndjson':
+                # Строки разбираются по одной: битая строка становится None
+                # и попадает в отчет обработчика, не ломая остальные
+                return {
+                    'items': [
+                        _json_line(line) for line in body.splitlines() if line.strip()
+                    ]
+                }
+            elif content_type == 'text/csv':
+                return {'items': list(csv.DictReader(io.StringIO(body)))}
             elif content_type == 'application/x-www-form-urlencoded':
                 return {k: v[0] for k, v in parse_qs(body).items()}
             else:
-                logger.warning(f'Неподдерживаемый Content-Type: {content_type}')
+                logger.warning('Неподдерживаемый Content-Type: %s', content_type)
                 return {}
 
         return {}
@@ -0,0 +1,135 @@
+import re
+from dataclasses import dataclass
+
+from errors import MethodNotAllowedError, RouteNotFoundError
+
+# Параметр пути: :name (строка) или <type:name> с конвертером
+PARAM_PATTERN = re.compile(r'^(?::(?P<name>\w+)|<(?:(?P<type>\w+):)?(?P<typed>\w+)>)$')
+
+
+class Converter:
+    """Разбирает сегмент пути в параметры; None — сегмент не подходит"""
+
+    def convert(self, name: str, value: str) -> dict | None:
+        return {name: value}
+
+
+class IntConverter(Converter):
+    def convert(self, name: str, value: str) -> dict | None:
+        return {name: int(value)} if value.isdigit() else None
+
+
+class CodeConverter(Converter):
+    """Трехбуквенный код валюты в верхнем регистре"""
+
+    def convert(self, name: str, value: str) -> dict | None:
+        return {name: value.upper()} if len(value) == 3 and value.isalpha() else None
+
+
+class PairConverter(Converter):
+    """Пара валют USDJPY → from=USD, to=JPY"""
+
+    def convert(self, name: str, value: str) -> dict | None:
+        if len(value) != 6 or not value.isalpha():
+            return None
+        return {name: value, 'from': value[:3].upper(), 'to': value[3:].upper()}
+
+
+CONVERTERS = {
+    'str': Converter(),
+    'int': IntConverter(),
+    'code': CodeConverter(),
+    'pair': PairConverter(),
+}
+
+
+@dataclass(frozen=True)
+class Route:
+    pattern: str
+    handler: callable
+    args: list
+
+
+class _Node:
+    __slots__ = ('children', 'params', 'routes')
+
+    def __init__(self):
+        self.children = {}  # Статический сегмент -> узел
+        self.params = []  # (имя, конвертер, узел) в порядке регистрации
+        self.routes = {}  # Метод -> Route
+
+
+def _segments(path: str) -> list[str]:
+    return path.strip('/').split('/')
+
+
+class RouteTable:
+    """Таблица маршрутов, скомпилированная при регистрации.
+
+    Статические пути ищутся в словаре, динамические — по дереву сегментов,
+    поэтому стоимость поиска зависит от глубины пути, а не от числа маршрутов.
+    Несовпадение метода дает 405 со списком допустимых методов.
+    """
+
+    def __init__(self):
+        self._static = {}  # Путь -> {метод: Route}
+        self._root = _Node()
+
+    def add(
+        self, method: str, pattern: str, handler: callable, args: list = None
+    ) -> None:
+        route = Route(pattern, handler, args or [])
+        if ':' not in pattern and '<' not in pattern:
+            self._static.setdefault(pattern, {})[method] = route
+            return
+        node = self._root
+        for segment in _segments(pattern):
+            match = PARAM_PATTERN.match(segment)
+            if match is None:
+                node = node.children.setdefault(segment, _Node())
+                continue
+            name = match['name'] or match['typed']
+            converter = CONVERTERS[match['type'] or 'str']
+            for param_name, param_converter, child in node.params:
+                if param_name == name and param_converter is converter:
+                    node = child
+                    break
+            else:
+                child = _Node()
+                node.params.append((name, converter, child))
+                node = child
+        node.routes[method] = route
+
+    def _matches(self, node: _Node, segments: list, index: int, params: dict):
+        """Узлы с маршрутами, совпадающие с путем: сначала статические сегменты"""
+        if index == len(segments):
+            if node.routes:
+                yield node, params
+            return
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            yield from self._matches(child, segments, index + 1, params)
+        for name, converter, child in node.params:
+            converted = converter.convert(name, segment)
+            if converted is not None:
+                yield from self._matches(
+                    child, segments, index + 1, {**params, **converted}
+                )
+
+    def match(self, method: str, path: str) -> tuple[Route, dict]:
+        allowed = set()
+        routes = self._static.get(path)
+        if routes is not None:
+            route = routes.get(method)
+            if route is not None:
+                return route, {}
+            allowed.update(routes)
+        for node, params in self._matches(self._root, _segments(path), 0, {}):
+            route = node.routes.get(method)
+            if route is not None:
+                return route, params
+            allowed.update(node.routes)
+        if allowed:
+            raise MethodNotAllowedError(allowed)
+        raise RouteNotFoundError()
@@ -0,0 +1,166 @@
+import json
+import math
+from json.encoder import encode_basestring
+
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+STREAM_CHUNK_ROWS = 1000
+
+# Режим сериализации задается один раз при старте (AppContext.startup)
+settings = {
+    'pretty': False,  # indent=4 для отладки; в продакшене компактный JSON
+    'stream_rows': 10000,  # С этого числа строк ответ отдается по частям
+}
+
+
+def configure(pretty: bool = None, stream_rows: int = None) -> None:
+    if pretty is not None:
+        settings['pretty'] = pretty
+    if stream_rows is not None:
+        settings['stream_rows'] = stream_rows
+
+
+def stream_format(accept: str = None, stream: str = None) -> str | None:
+    """Потоковый формат, запрошенный клиентом: ndjson, json или None"""
+    if accept and NDJSON_CONTENT_TYPE in accept:
+        return 'ndjson'
+    if stream and stream.lower() in ('1', 'true', 'yes'):
+        return 'json'
+    return None
+
+
+def dumps(data) -> bytes:
+    """JSON-тело ответа в текущем режиме сериализации"""
+    if settings['pretty']:
+        return json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _float(value: float) -> str:
+    return float.__repr__(value) if math.isfinite(value) else json.dumps(value)
+
+
+# Кодировщики скаляров из строк SQLite по типу значения (как json.dumps)
+SCALAR_ENCODERS = {
+    str: encode_basestring,
+    int: int.__repr__,
+    float: _float,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null',
+}
+
+
+def json_value(value) -> str:
+    """Скаляр в виде JSON с ensure_ascii=False"""
+    return SCALAR_ENCODERS[type(value)](value)
+
+
+def encode_rows(template: str, rows, separator: str = ',') -> str:
+    """Строки SELECT, подставленные в %-шаблон DTO, через separator"""
+    encoders = SCALAR_ENCODERS
+    return separator.join(
+        [template % tuple([encoders[type(v)](v) for v in row]) for row in rows]
+    )
+
+
+class JSONRows:
+    """Результат SELECT, который кодируется в JSON без промежуточных словарей.
+
+    Каждая строка подставляется в %-шаблон DTO (JSON_ROW) и сразу попадает
+    в буфер ответа. Для кода, которому нужны словари, объект ведет себя как
+    список: to_dict вызывается лениво при обращении к элементу.
+    """
+
+    def __init__(self, rows: list, template: str, to_dict):
+        self.rows = rows
+        self.template = template
+        self.to_dict = to_dict
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self):
+        return map(self.to_dict, self.rows)
+
+    def __getitem__(self, index):
+        return self.to_dict(self.rows[index])
+
+    def encode_rows(self, rows) -> str:
+        return encode_rows(self.template, rows)
+
+    def encode(self) -> bytes:
+        if settings['pretty']:
+            return dumps(list(self))
+        return ('[' + self.encode_rows(self.rows) + ']').encode('utf-8')
+
+    def iter_encode(self, chunk_rows: int = STREAM_CHUNK_ROWS):
+        """Тело ответа частями по chunk_rows строк"""
+        yield b'['
+        for start in range(0, len(self.rows), chunk_rows):
+            chunk = self.encode_rows(self.rows[start : start + chunk_rows])
+            yield (chunk if start == 0 else ',' + chunk).encode('utf-8')
+        yield b']'
+
+    def streamable(self) -> bool:
+        """Большие коллекции отдаются потоком (chunked), остальные целиком"""
+        return len(self.rows) >= settings['stream_rows'] and not settings['pretty']
+
+
+class Page:
+    """Страница коллекции при keyset-пагинации: строки и курсор следующей"""
+
+    def __init__(self, items: JSONRows, next_cursor: str | None):
+        self.items = items
+        self.next = next_cursor
+
+    def to_dict(self) -> dict:
+        return {'items': list(self.items), 'next': self.next}
+
+    def streamable(self) -> bool:
+        return False  # Размер страницы ограничен limit
+
+    def encode(self) -> bytes:
+        if settings['pretty']:
+            return dumps(self.to_dict())
+        return b'{"items":%b,"next":%b}' % (
+            self.items.encode(),
+            json_value(self.next).encode('utf-8'),
+        )
+
+
+class RowStream:
+    """Результат SELECT, который читается из курсора по мере отправки ответа.
+
+    batches — генератор пачек строк (BaseModel._stream с fetchmany), поэтому
+    память не зависит от размера таблицы. Формат ndjson — объект на строку,
+    json — массив, отправляемый частями (chunked).
+    """
+
+    def __init__(self, batches, template: str, fmt: str = 'json'):
+        self.batches = batches
+        self.template = template
+        self.format = fmt
+
+    @property
+    def content_type(self) -> str:
+        return NDJSON_CONTENT_TYPE if self.format == 'ndjson' else JSON_CONTENT_TYPE
+
+    def iter_encode(self):
+        ndjson = self.format == 'ndjson'
+        separator = '\n' if ndjson else ','
+        first = True
+        try:
+            if not ndjson:
+                yield b'['
+            for rows in self.batches:
+                chunk = encode_rows(self.template, rows, separator)
+                if ndjson:
+                    chunk += '\n'
+                elif not first:
+                    chunk = ',' + chunk
+                first = False
+                yield chunk.encode('utf-8')
+            if not ndjson:
+                yield b']'
+        finally:
+            self.batches.close()  # Подключение возвращается и при обрыве отправки
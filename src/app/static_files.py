@@ -0,0 +1,90 @@
+import gzip
+import logging
+import mimetypes
+import os
+import threading
+from email.utils import formatdate
+from pathlib import Path
+
+from response import Response, make_etag
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.ico': 'image/x-icon',
+}
+
+
+class StaticAsset:
+    """Файл, загруженный в память вместе со сжатым вариантом и валидаторами"""
+
+    def __init__(self, path: Path, max_age: int = 3600):
+        self.path = path
+        self.max_age = max_age
+        self.mtime = path.stat().st_mtime
+        self.body = path.read_bytes()
+        self.gzip_body = gzip.compress(self.body, compresslevel=9)
+        self.etag = make_etag(self.body)
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.content_type = CONTENT_TYPES.get(path.suffix) or (
+            mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        )
+
+    def to_response(self, status_code: int = 200) -> Response:
+        """Готовый ответ; render_response отдает его без повторного кодирования"""
+        return Response(
+            status_code,
+            self.body,
+            self.content_type,
+            headers={
+                'ETag': self.etag,
+                'Last-Modified': self.last_modified,
+                'Cache-Control': f'public, max-age={self.max_age}',
+            },
+            gzip_body=self.gzip_body,
+        )
+
+
+class StaticFiles:
+    """Статические файлы, прочитанные с диска один раз при старте.
+
+    В режиме reload (для разработки) перед выдачей проверяется mtime файла,
+    и измененный файл перечитывается.
+    """
+
+    def __init__(self, directory: Path, files, reload: bool = None):
+        self.directory = Path(directory)
+        if reload is None:
+            reload = os.getenv('STATIC_RELOAD', '0') == '1'
+        self.reload = reload
+        self.max_age = int(os.getenv('STATIC_MAX_AGE', 3600))
+        self._assets = {}
+        self._lock = threading.Lock()
+        for name in files:
+            path = self.directory / name
+            if path.exists():
+                self._assets[name] = StaticAsset(path, self.max_age)
+            else:
+                logger.warning('Статический файл не найден: %s', path)
+
+    def get(self, name: str) -> StaticAsset:
+        asset = self._assets.get(name)
+        if asset is None and not self.reload:
+            raise FileNotFoundError(f'{name} не найден')
+        if self.reload:
+            asset = self._reload(name, asset)
+        return asset
+
+    def _reload(self, name: str, asset: StaticAsset | None) -> StaticAsset:
+        path = self.directory / name
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            raise FileNotFoundError(f'{name} не найден') from None
+        if asset is not None and asset.mtime == mtime:
+            return asset
+        with self._lock:
+            logger.info('Перечитываем измененный файл %s', path)
+            asset = self._assets[name] = StaticAsset(path, self.max_age)
+        return asset
@@ -0,0 +1,106 @@
+import logging
+import os
+import sqlite3
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """Набор PRAGMA и параметров подключения SQLite под характер нагрузки.
+
+    None — значение по умолчанию SQLite (PRAGMA не выполняется).
+    """
+
+    name: str
+    journal_mode: str = None
+    synchronous: str = None
+    mmap_size: int = None  # Байт
+    cache_size: int = None  # Отрицательное — КиБ, положительное — страниц
+    temp_store: str = None
+    busy_timeout: int = 5000  # мс; как timeout=5.0 у sqlite3.connect
+    cached_statements: int = 128  # Кэш подготовленных запросов на подключение
+
+    def pragmas(self) -> list[tuple[str, object]]:
+        values = [
+            ('journal_mode', self.journal_mode),
+            ('synchronous', self.synchronous),
+            ('mmap_size', self.mmap_size),
+            ('cache_size', self.cache_size),
+            ('temp_store', self.temp_store),
+            ('busy_timeout', self.busy_timeout),
+        ]
+        return [(name, value) for name, value in values if value is not None]
+
+
+PROFILES = {
+    # Как было до профилей: журнал отката и настройки SQLite по умолчанию
+    'legacy': StorageProfile('legacy', cached_statements=128),
+    # Основной режим сервиса: читатели не ждут писателей (WAL), страницы
+    # читаются через mmap, крупный кэш страниц и подготовленных запросов
+    'read-heavy': StorageProfile(
+        'read-heavy',
+        journal_mode='WAL',
+        synchronous='NORMAL',
+        mmap_size=256 * 1024 * 1024,
+        cache_size=-64 * 1024,
+        temp_store='MEMORY',
+        cached_statements=256,
+    ),
+    # Частые пакетные записи (загрузка курсов, bulk): WAL без fsync на
+    # каждый коммит, временные данные в памяти
+    'write-heavy': StorageProfile(
+        'write-heavy',
+        journal_mode='WAL',
+        synchronous='NORMAL',
+        mmap_size=64 * 1024 * 1024,
+        cache_size=-32 * 1024,
+        temp_store='MEMORY',
+        busy_timeout=10000,
+        cached_statements=128,
+    ),
+    # Коммит переживает отключение питания: fsync журнала на каждую транзакцию
+    'durable': StorageProfile(
+        'durable',
+        journal_mode='WAL',
+        synchronous='FULL',
+        cache_size=-16 * 1024,
+        cached_statements=128,
+    ),
+}
+DEFAULT_PROFILE = 'read-heavy'
+
+
+def get_profile(name: str = None) -> StorageProfile:
+    """Профиль по имени; без имени — из DB_PROFILE"""
+    name = name or os.getenv('DB_PROFILE', DEFAULT_PROFILE)
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f'Неизвестный профиль хранилища {name!r}, доступны: {", ".join(PROFILES)}'
+        ) from None
+
+
+def connect(
+    db_path: str, profile: StorageProfile = None, check_same_thread: bool = True
+) -> sqlite3.Connection:
+    """Подключение к БД с настройками профиля"""
+    profile = profile or get_profile()
+    conn = sqlite3.connect(
+        db_path,
+        uri=True,
+        check_same_thread=check_same_thread,
+        cached_statements=profile.cached_statements,
+    )
+    apply_profile(conn, profile)
+    return conn
+
+
+def apply_profile(conn: sqlite3.Connection, profile: StorageProfile) -> None:
+    for name, value in profile.pragmas():
+        row = conn.execute(f'PRAGMA {name} = {value}').fetchone()
+        # journal_mode возвращает итоговый режим: у базы в памяти WAL недоступен
+        if name == 'journal_mode' and row and row[0].lower() != str(value).lower():
+            logger.debug('journal_mode=%s недоступен, используется %s', value, row[0])
@@ -0,0 +1,155 @@
+import gzip
+import json
+import sqlite3
+
+import pytest
+from app_context import AppContext
+
+
+@pytest.fixture()
+def context():
+    """Контекст приложения поверх ин-мемори базы"""
+    with AppContext('file:ctx_test?mode=memory&cache=shared') as ctx:
+        yield ctx
+
+
+def test_router_shares_controller(context):
+    """Router использует контроллер контекста, а не создает собственный"""
+    assert context.router.controller is context.controller
+
+
+def test_resolve_uses_shared_connection(context):
+    """Запросы через Router работают с одним и тем же подключением"""
+    body, code = context.router._resolve(
+        'POST', '/currencies', {'code': 'USD', 'name': 'US Dollar'}
+    )
+    assert code == 201
+    body, code = context.router._resolve('GET', '/currencies', {})
+    assert code == 200
+    assert [c['code'] for c in body] == ['USD']
+
+
+def test_shutdown_releases_resources():
+    """shutdown() закрывает контроллер и очищает ссылки"""
+    ctx = AppContext(':memory:')
+    ctx.startup()
+    connector = ctx.controller.connector
+    ctx.shutdown()
+    assert ctx.router is None
+    with pytest.raises(sqlite3.ProgrammingError):
+        connector.execute('SELECT 1')
+
+
+def test_batch_conversion_accepts_ndjson(context):
+    """POST /convert/batch принимает NDJSON-поток"""
+    router = context.router
+    for code in ('USD', 'EUR'):
+        router._resolve('POST', '/currencies', {'code': code, 'name': code})
+    router._resolve('POST', '/exchangeRates', {'from': 'USD', 'to': 'EUR', 'rate': 0.5})
+    body = (
+        b'{"from": "USD", "to": "EUR", "amount": 2}\n{"from": "EUR", "to": "USD", "amount": 1}\n'
+        b'{"from": "USD", "to"\n'
+    )
+    result, code = router.dispatch(
+        'POST', '/convert/batch', {'Content-Type': 'application/x-ndjson'}, body
+    )
+    assert code == 200
+    assert [r.get('convertedAmount') for r in result['results']] == [1.0, 2.0, None]
+    assert result['results'][2] == {'error': 'Row must be an object'}
+
+
+def test_collection_etag_and_not_modified(context):
+    """GET /currencies отдает ETag, повтор с If-None-Match — 304 до первой записи"""
+    first = context.handle('GET', '/currencies', {}, b'')
+    etag = first.headers['ETag']
+    assert first.status == 200
+
+    cached = context.handle('GET', '/currencies', {'If-None-Match': etag}, b'')
+    assert cached.status == 304
+    assert cached.body == b''
+    assert context.handle('HEAD', '/currencies', {}, b'') is first
+
+    context.handle(
+        'POST',
+        '/currencies',
+        {'Content-Type': 'application/json'},
+        b'{"code": "GBP", "name": "Pound"}',
+    )
+    changed = context.handle('GET', '/currencies', {'If-None-Match': etag}, b'')
+    assert changed.status == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_caches_see_writes_from_another_process(tmp_path):
+    """Второй контекст на том же файле — как другой рабочий процесс pre-fork"""
+    db_path = str(tmp_path / 'shared.db')
+    form = {'Content-Type': 'application/x-www-form-urlencoded'}
+    with (
+        AppContext(db_path, ingest=False) as reader,
+        AppContext(db_path, ingest=False) as writer,
+    ):
+
+        def codes() -> list[str]:
+            body = reader.handle('GET', '/currencies', {}, b'').body
+            return [currency['code'] for currency in json.loads(body)]
+
+        def rate() -> float:
+            return reader.router._resolve('GET', '/exchangeRate/USDEUR', {})[0]['rate']
+
+        for code in ('USD', 'EUR'):
+            writer.handle('POST', '/currencies', form, f'code={code}'.encode())
+        writer.handle('POST', '/exchangeRates', form, b'from=USD&to=EUR&rate=0.9')
+        assert codes() == ['USD', 'EUR']
+        assert rate() == 0.9
+        writer.handle('POST', '/currencies', form, b'code=JPY')
+        writer.handle('PATCH', '/exchangeRate/USDEUR', form, b'rate=0.95')
+        assert codes() == ['USD', 'EUR', 'JPY']
+        assert rate() == 0.95
+
+
+def test_large_json_negotiates_gzip(context):
+    """Большие JSON-ответы сжимаются только для клиентов с gzip"""
+    context.gzip_min_size = 1
+    form = {'Content-Type': 'application/x-www-form-urlencoded'}
+    for code in ('USD', 'EUR', 'GBP', 'JPY'):
+        context.handle('POST', '/currencies', form, f'code={code}&name={code}'.encode())
+    plain = context.handle('GET', '/currencies', {}, b'')
+    compressed = context.handle('GET', '/currencies', {'Accept-Encoding': 'gzip'}, b'')
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.body) == plain.body
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+
+
+def test_exchange_rates_ndjson_stream():
+    """Accept: application/x-ndjson — курсы потоком, подключение пула возвращается"""
+    with AppContext('file:stream_test?mode=memory&cache=shared', pool_size=1) as ctx:
+        for code in ('USD', 'EUR', 'GBP'):
+            ctx.handle(
+                'POST',
+                '/currencies',
+                {'Content-Type': 'application/x-www-form-urlencoded'},
+                f'code={code}'.encode(),
+            )
+        ctx.handle(
+            'POST',
+            '/exchangeRates/bulk',
+            {'Content-Type': 'text/csv'},
+            b'from,to,rate\nUSD,EUR,0.9\nUSD,GBP,0.8\n',
+        )
+        ndjson = {'Accept': 'application/x-ndjson'}
+        response = ctx.handle('GET', '/exchangeRates', ndjson, b'')
+        assert response.content_type == 'application/x-ndjson'
+        lines = b''.join(response.chunks).decode().splitlines()
+        assert [json.loads(line)['rate'] for line in lines] == [0.9, 0.8]
+        assert ctx.controller.pool.stats()['idle'] == 1
+
+        response = ctx.handle('GET', '/currencies?stream=1', {}, b'')
+        assert len(json.loads(b''.join(response.chunks))) == 3
+
+        # Оборванная отправка тоже возвращает подключение
+        response = ctx.handle('GET', '/currencies', ndjson, b'')
+        next(response.chunks)
+        assert ctx.controller.pool.stats()['idle'] == 0
+        response.chunks.close()
+        assert ctx.controller.pool.stats()['idle'] == 1
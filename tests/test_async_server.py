@@ -0,0 +1,118 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+import requests
+import serializer
+from app_context import AppContext
+from async_server import AsyncHTTPServer
+
+
+@pytest.fixture(scope='module')
+def base_url():
+    """Асинхронный сервер на свободном порту"""
+    context = AppContext('file:async_test?mode=memory&cache=shared', pool_size=2)
+    context.startup()
+    server = AsyncHTTPServer(context, 'localhost', 0, workers=2)
+    context.server = server
+    thread = threading.Thread(
+        target=lambda: asyncio.run(server.serve_forever()), daemon=True
+    )
+    thread.start()
+    assert server.wait_started(timeout=5)
+    yield f'http://localhost:{server.port}'
+    server.shutdown()
+    thread.join(timeout=5)
+    context.shutdown()
+
+
+def test_keep_alive_session(base_url):
+    """Несколько запросов по одному keep-alive соединению"""
+    with requests.Session() as session:
+        response = session.post(
+            f'{base_url}/currencies', json={'code': 'USD', 'name': 'US Dollar'}
+        )
+        assert response.status_code == 201
+        response = session.get(f'{base_url}/currency/USD')
+        assert response.status_code == 200
+        assert response.json()['code'] == 'USD'
+        assert response.headers['Connection'] == 'keep-alive'
+        stats = session.get(f'{base_url}/stats').json()
+        assert stats['server']['connections'] == 1
+
+
+def test_inline_route(base_url):
+    """Статические файлы отдаются без пула потоков"""
+    response = requests.get(f'{base_url}/favicon.ico')
+    assert response.status_code == 200
+    assert response.content
+
+
+def test_route_not_found(base_url):
+    response = requests.get(f'{base_url}/missing')
+    assert response.status_code == 404
+    assert response.json() == {'error': 'Route not found'}
+
+
+def test_pipelined_requests(base_url):
+    """Конвейерные запросы обрабатываются по порядку"""
+    host, port = base_url.removeprefix('http://').split(':')
+    request = f'GET /currencies HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode()
+    with socket.create_connection((host, int(port))) as sock:
+        sock.sendall(request * 2 + b'GET / HTTP/1.1\r\nConnection: close\r\n\r\n')
+        data = b''
+        while chunk := sock.recv(65536):
+            data += chunk
+    assert data.count(b'HTTP/1.1 200 OK') == 3
+
+
+def test_unsupported_method(base_url):
+    response = requests.delete(f'{base_url}/currencies')
+    assert response.status_code == 501
+
+
+def test_head_and_conditional_get(base_url):
+    """HEAD без тела, условный GET из кэша отвечает 304"""
+    response = requests.head(f'{base_url}/exchangeRates')
+    assert response.status_code == 200
+    assert response.content == b''
+    assert int(response.headers['Content-Length']) > 0
+    etag = response.headers['ETag']
+    response = requests.get(
+        f'{base_url}/exchangeRates', headers={'If-None-Match': etag}
+    )
+    assert response.status_code == 304
+
+
+def test_static_asset_validators_and_gzip(base_url):
+    """Статика из памяти: gzip-вариант, ETag и If-Modified-Since"""
+    response = requests.get(f'{base_url}/', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert 'max-age' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+    response = requests.get(
+        f'{base_url}/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}
+    )
+    assert response.status_code == 304
+    response = requests.get(
+        f'{base_url}/',
+        headers={
+            'Accept-Encoding': 'identity',
+            'If-Modified-Since': response.headers['Last-Modified'],
+        },
+    )
+    assert response.status_code == 304
+
+
+def test_streamed_collection(base_url, monkeypatch):
+    """Большая коллекция отдается с Transfer-Encoding: chunked"""
+    monkeypatch.setitem(serializer.settings, 'stream_rows', 1)
+    # Отдельный target, чтобы не попасть в кэш ответов
+    response = requests.get(f'{base_url}/currencies?stream-test')
+    assert response.headers['Transfer-Encoding'] == 'chunked'
+    assert 'Content-Length' not in response.headers
+    assert [c['code'] for c in response.json()] == ['USD']
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from app_context import AppContext
+
+
+@pytest.fixture()
+def router():
+    with AppContext('file:bulk_test?mode=memory&cache=shared') as ctx:
+        yield ctx.router
+
+
+def post(router, path, content_type, body):
+    return router.dispatch('POST', path, {'Content-Type': content_type}, body)
+
+
+def test_currencies_json_with_row_errors(router):
+    items = [
+        {'code': 'usd'},
+        {'code': 'EUR', 'name': 'Euro'},
+        {'code': 'XXQ'},
+        {},
+        'USD',
+    ]
+    report, code = post(
+        router, '/currencies/bulk', 'application/json', json.dumps(items).encode()
+    )
+    assert code == 200
+    assert report['received'] == 5
+    assert report['inserted'] == 2
+    assert [e['row'] for e in report['errors']] == [2, 3, 4]
+    body, _ = router._resolve('GET', '/currencies', {})
+    assert sorted(c['code'] for c in body) == ['EUR', 'USD']
+
+
+def test_currencies_csv_upsert(router):
+    post(router, '/currencies/bulk', 'text/csv', b'code,name\nUSD,Dollar\n')
+    report, _ = post(
+        router, '/currencies/bulk', 'text/csv', b'code,name\nUSD,US Dollar\n'
+    )
+    assert report['failed'] == 1
+    assert 'already exists' in report['errors'][0]['error']
+
+    report, _ = post(
+        router, '/currencies/bulk?upsert=1', 'text/csv', b'code,name\nUSD,US Dollar\n'
+    )
+    assert (report['inserted'], report['updated'], report['failed']) == (0, 1, 0)
+    body, _ = router._resolve('GET', '/currency', {'code': 'USD'})
+    assert body['name'] == 'US Dollar'
+
+
+def test_exchange_rates_ndjson(router):
+    post(router, '/currencies/bulk', 'text/csv', b'code\nUSD\nEUR\nGBP\n')
+    body = (
+        b'{"from": "USD", "to": "EUR", "rate": 0.9}\n'
+        b'not json\n'
+        b'{"from": "USD", "to": "JPY", "rate": 150}\n'
+        b'{"from": "USD", "to": "GBP", "rate": -1}\n'
+        b'{"from": "USD", "to": "EUR", "rate": 0.95}\n'
+        b'{"from": "EUR", "to": "GBP", "rate": "0.85"}\n'
+    )
+    report, code = post(router, '/exchangeRates/bulk', 'application/x-ndjson', body)
+    assert code == 200
+    assert report['inserted'] == 2
+    assert [e['row'] for e in report['errors']] == [1, 2, 3, 4]
+
+    # Кросс-курс через USD виден сразу после загрузки
+    result, _ = router._resolve(
+        'GET', '/convert', {'from': 'GBP', 'to': 'USD', 'amount': 1}
+    )
+    assert result['convertedAmount'] > 0
+
+
+def test_exchange_rates_upsert_updates_rate(router):
+    post(router, '/currencies/bulk', 'text/csv', b'code\nUSD\nEUR\n')
+    csv_body = b'from,to,rate\nUSD,EUR,0.9\n'
+    post(router, '/exchangeRates/bulk', 'text/csv', csv_body)
+    report, _ = post(
+        router,
+        '/exchangeRates/bulk?upsert=true',
+        'text/csv',
+        b'from,to,rate\nUSD,EUR,0.8\n',
+    )
+    assert report['updated'] == 1
+    body, _ = router._resolve('GET', '/exchangeRate', {'from': 'USD', 'to': 'EUR'})
+    assert body['rate'] == 0.8
+
+
+def test_non_array_body_rejected(router):
+    report, code = post(
+        router, '/currencies/bulk', 'application/json', b'{"code": "USD"}'
+    )
+    assert code == 400
@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+from cache import MISSING, LRUCache
+from db_initializer import init_db
+from events import EventBus
+from model import CurrencyModel, ExchangeRateModel
+
+
+def test_lru_eviction_and_counters():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'a' становится самой свежей записью
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 1, 1)
+
+
+def test_ttl_expiration(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    cache = LRUCache(maxsize=10, ttl=5)
+    cache.set('a', 1)
+    now[0] += 6
+    assert cache.get('a') is MISSING
+    assert cache.stats()['expirations'] == 1
+
+
+def test_stale_value_is_not_stored_after_invalidation():
+    cache = LRUCache()
+    version = cache.version
+    cache.invalidate('a')  # Запись в БД между чтением и сохранением в кэш
+    cache.set('a', 'stale', version=version)
+    assert cache.get('a') is MISSING
+
+
+@pytest.fixture()
+def models():
+    conn = sqlite3.connect(':memory:')
+    init_db(conn)
+    events = EventBus()
+    currencies = CurrencyModel(conn, events, cache=LRUCache())
+    rates = ExchangeRateModel(conn, events, cache=LRUCache())
+    yield currencies, rates
+    conn.close()
+
+
+def test_models_read_through_and_invalidate(models):
+    currencies, rates = models
+    currencies.add_currency('USD', 'Dollar', '$')
+    currencies.add_currency('EUR', 'Euro', '€')
+    rates.add_exchange_rate('USD', 'EUR', 0.9)
+
+    assert currencies.get_currency_by_code('USD') is currencies.get_currency_by_code(
+        'USD'
+    )
+    assert rates.get_exchange_rate('usd', 'eur')['rate'] == 0.9
+    assert rates.cache.stats()['misses'] == 1
+
+    rates.patch_exchange_rate('usd', 'eur', 0.95)
+    assert rates.get_exchange_rate('USD', 'EUR')['rate'] == 0.95
+
+    currencies.delete_all_currencies()
+    assert len(currencies.cache) == 0
+    assert len(rates.cache) == 0
@@ -0,0 +1,246 @@
+import sqlite3
+
+import pytest
+from db_initializer import init_db
+from errors import ExchangeRateNotFoundError, InvalidRateFormatError
+from events import EventBus
+from model import ConversionModel, CurrencyModel, ExchangeRateModel
+
+
+@pytest.fixture()
+def models():
+    """Модели с общей шиной событий поверх ин-мемори базы"""
+    conn = sqlite3.connect(':memory:')
+    init_db(conn)
+    events = EventBus()
+    currencies = CurrencyModel(conn, events)
+    rates = ExchangeRateModel(conn, events)
+    conversion = ConversionModel(conn, events)
+    for code in ('USD', 'EUR', 'GBP', 'INR', 'JPY'):
+        currencies.add_currency(code, code, '')
+    yield rates, conversion
+    conn.close()
+
+
+def test_direct_and_reverse(models):
+    rates, conversion = models
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    assert conversion.get_converted_currency('USD', 'EUR', 10)['method'] == 'direct'
+    result = conversion.get_converted_currency('EUR', 'USD', 10)
+    assert result['method'] == 'reverse'
+    assert result['convertedAmount'] == 20.0
+
+
+def test_prefers_usd_cross(models):
+    """При равной длине пути используется кросс-курс через USD"""
+    rates, conversion = models
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    rates.add_exchange_rate('USD', 'JPY', 100)
+    rates.add_exchange_rate('GBP', 'EUR', 2)
+    rates.add_exchange_rate('GBP', 'JPY', 300)
+    result = conversion.get_converted_currency('EUR', 'JPY', 1)
+    assert result['method'] == 'via_usd'
+    assert result['path'] == ['EUR', 'USD', 'JPY']
+    assert result['rate'] == 200.0
+
+
+def test_multi_hop_without_usd(models):
+    """EUR → GBP → INR, когда курсов к USD нет"""
+    rates, conversion = models
+    rates.add_exchange_rate('EUR', 'GBP', 0.8)
+    rates.add_exchange_rate('GBP', 'INR', 100)
+    result = conversion.get_converted_currency('EUR', 'INR', 10)
+    assert result['method'] == 'via_gbp'
+    assert result['path'] == ['EUR', 'GBP', 'INR']
+    assert result['convertedAmount'] == 800.0
+
+
+def test_patch_invalidates_dependent_paths(models):
+    rates, conversion = models
+    rates.add_exchange_rate('EUR', 'GBP', 0.8)
+    rates.add_exchange_rate('GBP', 'INR', 100)
+    rates.add_exchange_rate('USD', 'JPY', 150)
+    conversion.get_converted_currency('EUR', 'INR', 1)
+    conversion.get_converted_currency('USD', 'JPY', 1)
+    rates.patch_exchange_rate('GBP', 'INR', 110)
+    assert ('USD', 'JPY') in conversion.graph._paths  # Не зависит от GBP/INR
+    assert ('EUR', 'INR') not in conversion.graph._paths
+    assert (
+        conversion.get_converted_currency('EUR', 'INR', 10)['convertedAmount'] == 880.0
+    )
+
+
+@pytest.mark.parametrize('rate', ['abc', '0', '-1', 'nan', 'inf'])
+def test_invalid_patch_rate_is_rejected(models, rate):
+    """Нечисловой курс не доходит до БД и графа: иначе пересчет падает на полпути"""
+    rates, conversion = models
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    conversion.get_converted_currency('EUR', 'USD', 1)
+    with pytest.raises(InvalidRateFormatError):
+        rates.patch_exchange_rate('USD', 'EUR', rate)
+    assert rates.get_exchange_rate('USD', 'EUR')['rate'] == 0.5
+    assert conversion.get_converted_currency('EUR', 'USD', 1)['convertedAmount'] == 2.0
+
+
+def test_writes_from_another_process_reload_graph(tmp_path):
+    """Второй процесс на том же файле: его записи не приходят через EventBus"""
+    path = str(tmp_path / 'shared.db')
+    conns = [sqlite3.connect(path) for _ in range(2)]
+    init_db(conns[0])
+    writer = (CurrencyModel(conns[0]), ExchangeRateModel(conns[0]))
+    reader = ConversionModel(conns[1], materialized=True)
+    for code in ('USD', 'EUR', 'GBP'):
+        writer[0].add_currency(code, code, '')
+    writer[1].add_exchange_rate('USD', 'EUR', 0.9)
+    assert reader.get_converted_currency('USD', 'EUR', 1)['rate'] == 0.9
+
+    writer[1].patch_exchange_rate('USD', 'EUR', 0.5)
+    assert reader.get_converted_currency('USD', 'EUR', 1)['rate'] == 0.5
+    writer[1].add_exchange_rate('USD', 'GBP', 0.8)
+    assert reader.get_converted_currency('EUR', 'GBP', 10)['convertedAmount'] == 16.0
+    assert reader.get_rate_matrix(['USD', 'GBP'])['rates'][0][1] == 0.8
+    for conn in conns:
+        conn.close()
+
+
+def test_new_rate_shortens_cached_path(models):
+    rates, conversion = models
+    rates.add_exchange_rate('EUR', 'GBP', 0.8)
+    rates.add_exchange_rate('GBP', 'INR', 100)
+    with pytest.raises(ExchangeRateNotFoundError):
+        conversion.get_converted_currency('EUR', 'JPY', 1)
+    assert conversion.get_converted_currency('EUR', 'INR', 1)['method'] == 'via_gbp'
+    rates.add_exchange_rate('INR', 'JPY', 2)
+    rates.add_exchange_rate('EUR', 'INR', 90)
+    assert conversion.get_converted_currency('EUR', 'INR', 1)['method'] == 'direct'
+    assert conversion.get_converted_currency('EUR', 'JPY', 1)['path'] == [
+        'EUR',
+        'INR',
+        'JPY',
+    ]
+
+
+def test_unknown_codes_are_not_cached(models):
+    """Отрицательный ответ кэшируется только для вершин графа"""
+    rates, conversion = models
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    rates.add_exchange_rate('GBP', 'INR', 100)
+    for code in ('AAA', 'BBB', 'JPY'):
+        with pytest.raises(ExchangeRateNotFoundError):
+            conversion.get_converted_currency('USD', code, 1)
+    with pytest.raises(ExchangeRateNotFoundError):
+        conversion.get_converted_currency('USD', 'GBP', 1)
+    assert set(conversion.graph._paths) == {('USD', 'GBP')}  # Разные компоненты
+    rates.add_exchange_rate('EUR', 'GBP', 0.8)
+    assert conversion.get_converted_currency('USD', 'GBP', 1)['rate'] == 0.4
+
+
+def test_rate_matrix(models):
+    """Кросс-курсы всех пар и фильтр по списку кодов"""
+    rates, conversion = models
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    rates.add_exchange_rate('USD', 'JPY', 100)
+    matrix = conversion.get_rate_matrix(['EUR', 'JPY', 'GBP'])
+    assert matrix['codes'] == ['EUR', 'JPY', 'GBP']
+    assert matrix['rates'][0] == [1.0, 200.0, None]
+    assert matrix['rates'][1][0] == pytest.approx(0.005)
+
+
+def test_rate_matrix_follows_conversion_paths(models):
+    """Цикл с несогласованными курсами: ячейки совпадают с путями /convert"""
+    rates, conversion = models
+    # Цикл USD-EUR-GBP-JPY-INR-USD: от EUR до JPY короче через GBP, чем через USD
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    rates.add_exchange_rate('EUR', 'GBP', 0.8)
+    rates.add_exchange_rate('GBP', 'JPY', 190)
+    rates.add_exchange_rate('JPY', 'INR', 0.6)
+    rates.add_exchange_rate('INR', 'USD', 0.012)
+    conversion.get_rate_matrix()
+    rates.patch_exchange_rate('EUR', 'GBP', 0.9)
+    matrix = conversion.get_rate_matrix()
+    codes = matrix['codes']
+    for i, from_code in enumerate(codes):
+        for j, to_code in enumerate(codes):
+            if i != j:
+                conversion.get_converted_currency(from_code, to_code, 1)
+                path = conversion.graph.find(from_code, to_code)
+                assert matrix['rates'][i][j] == pytest.approx(path.rate)
+    assert conversion.get_converted_currency('EUR', 'JPY', 1)['path'] == [
+        'EUR',
+        'GBP',
+        'JPY',
+    ]
+    assert matrix['rates'][codes.index('EUR')][codes.index('JPY')] == pytest.approx(
+        171.0
+    )
+
+
+def test_rate_matrix_patch_rescales_affected_cells(models, monkeypatch):
+    """PATCH меняет только ячейки, чьи пути идут через пару, без перестроения"""
+    rates, conversion = models
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    rates.add_exchange_rate('EUR', 'GBP', 0.8)
+    rates.add_exchange_rate('GBP', 'JPY', 190)
+    rates.add_exchange_rate('JPY', 'INR', 0.6)
+    rates.add_exchange_rate('INR', 'USD', 0.012)
+    before = conversion.get_rate_matrix()
+    codes = before['codes']
+
+    def fail(*args):
+        raise AssertionError('матрица перестроена целиком')
+
+    monkeypatch.setattr(conversion.matrix, 'load', fail)
+    monkeypatch.setattr(conversion.matrix, '_rebuild', fail)
+    rates.add_exchange_rate('GBP', 'EUR', 1.2)  # Обратная пара у существующего ребра
+    rates.patch_exchange_rate('JPY', 'INR', 0.7)
+    after = conversion.get_rate_matrix()
+
+    for i, from_code in enumerate(codes):
+        for j, to_code in enumerate(codes):
+            if i == j:
+                continue
+            conversion.get_converted_currency(from_code, to_code, 1)
+            path = conversion.graph.find(from_code, to_code)
+            assert after['rates'][i][j] == pytest.approx(path.rate)
+            # Курс EUR → GBP остается прямым, GBP → EUR и оба шага JPY/INR меняются
+            hops = set(zip(path.codes, path.codes[1:], strict=False))
+            touched = hops & {('GBP', 'EUR'), ('JPY', 'INR'), ('INR', 'JPY')}
+            assert (after['rates'][i][j] != before['rates'][i][j]) == bool(touched)
+
+
+def test_convert_batch(models):
+    """Курс ищется один раз на пару, ошибки строк не прерывают пакет"""
+    rates, conversion = models
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    result = conversion.convert_batch(
+        [
+            {'from': 'usd', 'to': 'EUR', 'amount': 10},
+            {'from': 'EUR', 'to': 'USD', 'amount': '3'},
+            {'from': 'USD', 'to': 'EUR', 'amount': 7},
+            {'from': 'USD', 'to': 'INR', 'amount': 1},
+            {'from': 'USD', 'to': 'EUR', 'amount': 'abc'},
+            {'from': 'USD', 'amount': 1},
+            None,  # Нечитаемая строка NDJSON
+            ['USD', 'EUR', 1],
+            {'from': 'USD', 'to': 'EUR', 'amount': 'nan'},
+            {'from': 'USD', 'to': 'EUR', 'amount': float('inf')},
+        ]
+    )
+    assert result['count'] == 10
+    assert result['pairs'] == 3
+    assert result['failed'] == 7
+    assert [r.get('convertedAmount') for r in result['results'][:3]] == [5.0, 6.0, 3.5]
+    assert result['results'][1]['method'] == 'reverse'
+    assert 'not found' in result['results'][3]['error']
+    assert result['results'][4] == {'error': 'Invalid amount format'}
+    assert result['results'][5] == {'error': 'Missing required form field'}
+    assert (
+        result['results'][6]
+        == result['results'][7]
+        == {'error': 'Row must be an object'}
+    )
+    assert (
+        result['results'][8]
+        == result['results'][9]
+        == {'error': 'Invalid amount format'}
+    )
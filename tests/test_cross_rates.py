@@ -0,0 +1,138 @@
+import random
+import sqlite3
+
+import pytest
+from check_cross_rates import check, main
+from db_initializer import init_db
+from events import EventBus
+from model import ConversionModel, CurrencyModel, ExchangeRateModel
+from model.cross_rates import CrossRateTable
+from model.rate_graph import RateGraph
+
+CODES = ('USD', 'EUR', 'GBP', 'INR', 'JPY')
+
+
+@pytest.fixture()
+def models():
+    conn = sqlite3.connect(':memory:')
+    init_db(conn)
+    events = EventBus()
+    currencies = CurrencyModel(conn, events)
+    rates = ExchangeRateModel(conn, events)
+    conversion = ConversionModel(conn, events, materialized=True)
+    for code in CODES:
+        currencies.add_currency(code, code, '')
+    yield conn, rates, conversion
+    conn.close()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_incremental_matches_rebuild(seed):
+    """Случайные графы: таблица, собранная по одной записи, совпадает с полной"""
+    generator = random.Random(seed)
+    codes = [f'C{i:02d}' for i in range(12)]
+    currencies = [{'id': i, 'code': code} for i, code in enumerate(codes, 1)]
+    pairs = [(a, b) for a in codes for b in codes if a != b]
+    chosen = generator.sample(pairs, generator.randint(5, 30))
+    rates = [
+        (rate_id, a, b, round(generator.uniform(0.1, 10), 3))
+        for rate_id, (a, b) in enumerate(chosen, 1)
+    ]
+    assert check(currencies, rates)['consistent']
+
+    table = CrossRateTable()
+    table.load(currencies, rates)
+    by_code = {currency['code']: currency for currency in currencies}
+    for rate_id, a, b, _ in generator.sample(rates, len(rates) // 2):
+        table.set_rate(
+            rate_id, by_code[a], by_code[b], round(generator.uniform(0.1, 10), 3)
+        )
+    rebuilt = CrossRateTable()
+    rebuilt.load(
+        currencies, [(i, a, b, table._rates[(a, b)][1]) for i, a, b, _ in rates]
+    )
+    assert table._paths == rebuilt._paths
+
+    graph = RateGraph()  # Таблица отвечает так же, как ленивый граф
+    graph.load(currencies, [(i, a, b, table._rates[(a, b)][1]) for i, a, b, _ in rates])
+    for a, b in pairs:
+        assert table.find(a, b) == graph.find(a, b)
+
+
+def test_patch_refreshes_dependent_rows_only(models):
+    _, rates, conversion = models
+    rates.add_exchange_rate('EUR', 'GBP', 0.8)
+    rates.add_exchange_rate('GBP', 'INR', 100)
+    rates.add_exchange_rate('USD', 'JPY', 150)
+    assert (
+        conversion.get_converted_currency('EUR', 'INR', 10)['convertedAmount'] == 800.0
+    )
+    table = conversion.graph
+    assert len(table) == 8  # Все связные пары в обе стороны
+    unrelated = table.find('USD', 'JPY')
+    rates.patch_exchange_rate('GBP', 'INR', 110)
+    assert table.find('USD', 'JPY') is unrelated
+    assert table.find('EUR', 'INR').rate == pytest.approx(88.0)
+    assert (
+        conversion.get_converted_currency('EUR', 'INR', 10)['convertedAmount'] == 880.0
+    )
+
+
+def test_upsert_of_existing_pairs_keeps_table_loaded(models):
+    _, rates, conversion = models
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    rates.add_exchange_rate('USD', 'JPY', 100)
+    conversion.get_converted_currency('EUR', 'JPY', 1)
+    rates.upsert_exchange_rates([('USD', 'JPY', 120)])
+    assert conversion.graph.loaded
+    assert conversion.get_converted_currency('EUR', 'JPY', 1)['rate'] == 240.0
+    rates.upsert_exchange_rates([('USD', 'GBP', 0.8)])  # Новая пара: id неизвестен
+    assert not conversion.graph.loaded
+    assert conversion.get_converted_currency('GBP', 'EUR', 1)['method'] == 'via_usd'
+
+
+def test_check_detects_writes_past_the_models(models, tmp_path):
+    conn, rates, conversion = models
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    rates.add_exchange_rate('EUR', 'GBP', 0.8)
+    conversion.get_converted_currency('USD', 'GBP', 1)
+    assert conversion.check_cross_rates()['consistent']
+    with conn:  # Запись в обход моделей: события нет, таблица устарела
+        conn.execute('UPDATE exchange_rates SET rate = 0.6 WHERE id = 1')
+    report = conversion.check_cross_rates()
+    assert not report['consistent']
+    assert {row['pair'] for row in report['changed']} == {
+        'USDEUR',
+        'EURUSD',
+        'USDGBP',
+        'GBPUSD',
+    }
+
+    assert not report['externalWrites']
+
+    db_path = tmp_path / 'check.db'
+    with sqlite3.connect(db_path) as file_conn:
+        conn.backup(file_conn)
+    assert main(['--db', str(db_path)]) == 0
+
+
+def test_check_reports_writes_from_another_process(tmp_path):
+    db_path = tmp_path / 'shared.db'
+    conns = [sqlite3.connect(db_path) for _ in range(2)]
+    init_db(conns[0])
+    currencies, rates = CurrencyModel(conns[0]), ExchangeRateModel(conns[0])
+    for code in ('USD', 'EUR', 'GBP'):
+        currencies.add_currency(code, code, '')
+    rates.add_exchange_rate('USD', 'EUR', 0.5)
+    rates.add_exchange_rate('EUR', 'GBP', 0.8)
+    reader = ConversionModel(conns[1], materialized=True)
+    assert reader.check_cross_rates()['consistent']
+
+    rates.patch_exchange_rate('USD', 'EUR', 0.6)  # Событие до reader не доходит
+    report = reader.check_cross_rates()
+    assert report['externalWrites'] and not report['consistent']
+    assert 'USDGBP' in {row['pair'] for row in report['changed']}
+    assert reader.check_cross_rates()['consistent']  # Таблица перезагружена
+    assert reader.get_converted_currency('USD', 'GBP', 10)['convertedAmount'] == 4.8
+    for conn in conns:
+        conn.close()
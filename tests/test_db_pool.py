@@ -0,0 +1,103 @@
+import threading
+from functools import partial
+
+import pytest
+import requests
+from app_context import AppContext
+from app_server import PooledHTTPServer, RequestHandler
+from db_pool import ConnectionPool
+from errors import ServiceUnavailableError
+
+DB_PATH = 'file:pool_test?mode=memory&cache=shared'
+
+
+@pytest.fixture()
+def pool():
+    pool = ConnectionPool(DB_PATH, size=2, timeout=0.1)
+    yield pool
+    pool.close()
+
+
+def test_connection_is_bound_per_thread(pool):
+    """Разные потоки получают разные подключения, вложенный вызов — то же самое"""
+    seen = {}
+
+    def worker(name):
+        with pool.connection() as conn:
+            with pool.connection() as nested:
+                assert nested is conn
+            seen[name] = id(pool.current())
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(seen) == 2
+    assert pool.stats()['checkouts'] == 2
+    assert pool.stats()['in_use'] == 0
+
+
+def test_exhausted_pool_raises_503(pool):
+    """Пул без свободных подключений отвечает ServiceUnavailableError"""
+    first = pool.acquire()
+    second = pool.acquire()
+    with pytest.raises(ServiceUnavailableError):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+    pool.release(first)
+    pool.release(second)
+
+
+def test_memory_database_is_shared_by_pool_connections():
+    """:memory: — одна база на пул, а не своя у каждого подключения"""
+    pool = ConnectionPool(':memory:', size=2)
+    first = pool.acquire()
+    second = pool.acquire()
+    with first:
+        first.execute('CREATE TABLE t (x)')
+        first.execute('INSERT INTO t VALUES (1)')
+    assert second.execute('SELECT x FROM t').fetchall() == [(1,)]
+    pool.release(first)
+    pool.release(second)
+    pool.close()
+    assert (
+        ConnectionPool(':memory:', size=1)
+        .acquire()
+        .execute("SELECT name FROM sqlite_master WHERE name = 't'")
+        .fetchall()
+        == []
+    )
+
+
+def test_current_requires_binding(pool):
+    """Без pool.connection() подключение текущему потоку не выдается"""
+    with pytest.raises(RuntimeError):
+        pool.current()
+
+
+def test_threaded_server_serves_requests():
+    """Многопоточный сервер обрабатывает запросы и отдает статистику"""
+    context = AppContext(DB_PATH, pool_size=2)
+    context.startup()
+    server = PooledHTTPServer(
+        ('localhost', 0), partial(RequestHandler, context=context), workers=2
+    )
+    context.server = server
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://localhost:{server.server_address[1]}'
+    try:
+        response = requests.post(
+            f'{base_url}/currencies', json={'code': 'EUR', 'name': 'Euro'}
+        )
+        assert response.status_code == 201
+        response = requests.get(f'{base_url}/stats')
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats['pool']['size'] == 2
+        assert stats['server']['workers'] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+        context.shutdown()
@@ -0,0 +1,160 @@
+import sqlite3
+
+import pytest
+from db_initializer import init_db
+from errors import ExchangeRateNotFoundError, InvalidHistoryQueryError
+from events import EventBus
+from model import CurrencyModel, ExchangeRateModel, HistoryModel
+from model.history import parse_step, to_timestamp
+
+
+@pytest.fixture()
+def models():
+    conn = sqlite3.connect(':memory:')
+    init_db(conn)
+    events = EventBus()
+    currencies = CurrencyModel(conn, events)
+    for code in ('USD', 'EUR', 'GBP'):
+        currencies.add_currency(code, code, '')
+    yield (
+        conn,
+        ExchangeRateModel(conn, events),
+        HistoryModel(conn, events, retention_days=30),
+    )
+    conn.close()
+
+
+def seed(conn, points):
+    conn.executemany(
+        'INSERT INTO exchange_rate_history VALUES (?, ?, ?, ?)',
+        [('USD', 'EUR', ts, rate) for ts, rate in points],
+    )
+
+
+def test_writes_are_recorded_by_triggers(models):
+    conn, rates, history = models
+    rates.add_exchange_rate('USD', 'EUR', 0.9)
+    rates.patch_exchange_rate('USD', 'EUR', 0.95)
+    rates.patch_exchange_rate('USD', 'EUR', 0.95)  # Без изменения курса — без записи
+    rates.upsert_exchange_rates([('USD', 'EUR', 0.97), ('USD', 'GBP', 0.8)])
+    result = history.get_history('USD', 'EUR')
+    assert [p['rate'] for p in result['points']] == [0.9, 0.95, 0.97]
+    assert len(history.get_history('USD', 'GBP')['points']) == 1
+
+
+def test_downsampling(models):
+    conn, rates, history = models
+    base = 1_700_000_000.0
+    now = base + 3600
+    history.retention = None
+    seed(conn, [(base + 10, 1.0), (base + 20, 3.0), (base + 30, 2.0), (base + 70, 5.0)])
+    rates.add_exchange_rate('USD', 'EUR', 5.0)
+
+    last = history.get_history('USD', 'EUR', base, now, 60, 'last')['points']
+    assert [(p['rate'], p['count']) for p in last] == [(2.0, 3), (5.0, 1)]
+    mean = history.get_history('USD', 'EUR', base, now, 60, 'mean')['points']
+    assert mean[0]['rate'] == 2.0
+    ohlc = history.get_history('USD', 'EUR', base, now, 60, 'ohlc')['points'][0]
+    assert (ohlc['open'], ohlc['high'], ohlc['low'], ohlc['close']) == (
+        1.0,
+        3.0,
+        1.0,
+        2.0,
+    )
+    assert ohlc['timestamp'].startswith('2023-11-14T22:13:20')
+
+
+def test_non_numeric_rate_stays_out_of_history(models):
+    """Запись в обход проверки курса (другой клиент БД) не ломает агрегаты истории"""
+    conn, rates, history = models
+    rates.add_exchange_rate('USD', 'EUR', 0.9)
+    with conn:
+        conn.execute("UPDATE exchange_rates SET rate = 'abc' WHERE id = 1")
+        conn.execute('UPDATE exchange_rates SET rate = 1 WHERE id = 1')
+    assert [p['rate'] for p in history.get_history('USD', 'EUR')['points']] == [
+        0.9,
+        1.0,
+    ]
+    ohlc = history.get_history('USD', 'EUR', step=3600, agg='ohlc')['points']
+    assert (ohlc[0]['open'], ohlc[-1]['close']) == (0.9, 1.0)
+    assert conn.execute(
+        'SELECT DISTINCT typeof(rate) FROM exchange_rate_history'
+    ).fetchall() == [('real',)]
+
+
+def test_retention(models):
+    conn, rates, history = models
+    rates.add_exchange_rate('USD', 'EUR', 0.9)
+    seed(conn, [(1.0, 0.5)])
+    assert len(history.get_history('USD', 'EUR', start=0)['points']) == 1
+    assert history.prune() == 1
+    assert conn.execute('SELECT count(*) FROM exchange_rate_history').fetchone()[0] == 1
+
+
+def test_retention_is_applied_on_writes(models):
+    """Подрезка на записи курсов не чаще prune_interval, без планировщика"""
+    conn, rates, history = models
+    history.prune_interval = 60
+    seed(conn, [(1.0, 0.5)])
+    rates.add_exchange_rate('USD', 'EUR', 0.9)
+    count = 'SELECT count(*) FROM exchange_rate_history'
+    assert conn.execute(count).fetchone()[0] == 2
+    history._pruned_at -= 61
+    rates.patch_exchange_rate('USD', 'EUR', 0.95)
+    assert (
+        conn.execute(count).fetchone()[0] == 2
+    )  # Старая точка удалена, новая добавлена
+
+
+def test_errors(models):
+    conn, rates, history = models
+    with pytest.raises(ExchangeRateNotFoundError):
+        history.get_history('USD', 'GBP')
+    rates.add_exchange_rate('USD', 'EUR', 0.9)
+    with pytest.raises(InvalidHistoryQueryError):
+        history.get_history('USD', 'EUR', step=1)  # 30 дней по секунде
+    with pytest.raises(InvalidHistoryQueryError):
+        history.get_history('USD', 'EUR', agg='median')
+    with pytest.raises(InvalidHistoryQueryError):
+        parse_step('0m')
+    assert parse_step('15m') == 900
+    assert to_timestamp('1970-01-02') == 86400
+
+
+def test_history_route():
+    from app_context import AppContext
+
+    with AppContext(':memory:', ingest=False) as ctx:
+        router = ctx.router
+        for code in ('USD', 'EUR'):
+            router._resolve('POST', '/currencies', {'code': code, 'name': code})
+        router._resolve(
+            'POST', '/exchangeRates', {'from': 'USD', 'to': 'EUR', 'rate': 0.5}
+        )
+        body, code = router.dispatch(
+            'GET',
+            '/exchangeRate/usdeur/history?from=2000-01-01&step=1d&agg=ohlc',
+            {},
+            b'',
+        )
+        assert code == 200
+        assert (body['from'], body['to'], body['agg']) == ('USD', 'EUR', 'ohlc')
+        assert body['points'][0]['close'] == 0.5
+
+
+@pytest.mark.parametrize('query', ['to=inf', 'from=nan', 'to=1e12', 'from=-1e400'])
+def test_history_route_rejects_out_of_range_bounds(query):
+    """Границы, которые не переводятся в дату, — 400, а не ошибка при выводе точек"""
+    from app_context import AppContext
+
+    with AppContext(':memory:', ingest=False) as ctx:
+        router = ctx.router
+        for code in ('USD', 'EUR'):
+            router._resolve('POST', '/currencies', {'code': code, 'name': code})
+        router._resolve(
+            'POST', '/exchangeRates', {'from': 'USD', 'to': 'EUR', 'rate': 0.5}
+        )
+        body, code = router.dispatch(
+            'GET', f'/exchangeRate/usdeur/history?{query}', {}, b''
+        )
+        assert code == 400
@@ -0,0 +1,119 @@
+import sqlite3
+
+import pytest
+import requests
+from db_initializer import init_db
+from events import RATES_UPSERTED, EventBus
+from ingestion import RateIngestionScheduler
+from model import ConversionModel, CurrencyModel, ExchangeRateModel
+from providers import HTTPRateProvider, RateProvider, StubProvider
+
+DB_URI = 'file:ingestion_test?mode=memory&cache=shared'
+
+
+@pytest.fixture()
+def db():
+    """Общая ин-мемори база: планировщик открывает к ней свое подключение"""
+    conn = sqlite3.connect(DB_URI, uri=True)
+    init_db(conn)
+    events = EventBus()
+    currencies = CurrencyModel(conn, events)
+    for code in ('USD', 'EUR', 'JPY', 'GBP'):
+        currencies.add_currency(code, code, '')
+    yield conn, events
+    conn.close()
+
+
+def test_upsert_in_one_batch(db):
+    conn, events = db
+    rates = ExchangeRateModel(conn, events)
+    conversion = ConversionModel(conn, events)
+    received = []
+    events.subscribe(received.append)
+    rates.add_exchange_rate('USD', 'EUR', 0.9)
+    rates.add_exchange_rate('USD', 'GBP', 0.8)
+    assert conversion.get_converted_currency('EUR', 'USD', 1)['method'] == 'reverse'
+
+    result = rates.upsert_exchange_rates(
+        [
+            ('usd', 'EUR', 0.92),
+            ('USD', 'GBP', 0.8),
+            ('USD', 'JPY', 150),
+            ('USD', 'XXX', 1),
+        ]
+    )
+    assert result == {
+        'received': 4,
+        'inserted': 1,
+        'updated': 1,
+        'unchanged': 1,
+        'skipped': 1,
+    }
+    assert [e.kind for e in received].count(RATES_UPSERTED) == 1
+    assert rates.get_exchange_rate('USD', 'EUR')['rate'] == 0.92
+    # Граф перечитан из БД: видны и обновленный, и новый курс
+    assert conversion.get_converted_currency('EUR', 'JPY', 1)['method'] == 'via_usd'
+
+
+class FailingProvider(RateProvider):
+    name = 'failing'
+
+    def fetch(self):
+        raise requests.ConnectionError('нет сети')
+
+
+def test_scheduler_run_once(db):
+    conn, events = db
+    scheduler = RateIngestionScheduler(
+        StubProvider({'EUR': 0.9, 'JPY': 150, 'ZZZ': 1}), DB_URI, events
+    )
+    try:
+        result = scheduler.run_once()
+        assert result['inserted'] == 2 and result['skipped'] == 1
+        assert scheduler.run_once()['unchanged'] == 2
+        scheduler.provider = FailingProvider()
+        assert scheduler.run_once() is None
+        stats = scheduler.stats()
+        assert stats['runs'] == 3 and stats['failures'] == 1
+        assert 'нет сети' in stats['last_error']
+    finally:
+        scheduler.stop()
+
+
+def test_scheduler_thread_and_jitter(db):
+    conn, events = db
+    scheduler = RateIngestionScheduler(
+        StubProvider({'EUR': 0.5}), DB_URI, events, interval=10, jitter=0.1
+    )
+    assert all(9 <= scheduler.next_delay() <= 11 for _ in range(100))
+    subscribers = len(events._subscribers)
+    scheduler.start()
+    scheduler.stop()  # Первая загрузка выполняется сразу при старте
+    assert scheduler.runs == 1
+    assert len(events._subscribers) == subscribers  # Модели планировщика отписались
+    assert (
+        ExchangeRateModel(conn, events).get_exchange_rate('USD', 'EUR')['rate'] == 0.5
+    )
+
+
+class FakeResponse:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'base_code': 'USD', 'rates': {'USD': 1, 'EUR': 0.9, 'BAD': 'x'}}
+
+
+class FakeSession:
+    def get(self, url, params, timeout):
+        self.request = (url, params, timeout)
+        return FakeResponse()
+
+
+def test_http_provider_parses_payload():
+    session = FakeSession()
+    provider = HTTPRateProvider(
+        'http://rates.test/latest', symbols=['EUR'], session=session
+    )
+    assert provider.fetch() == [('USD', 'EUR', 0.9)]
+    assert session.request[1] == {'base': 'USD', 'symbols': 'EUR'}
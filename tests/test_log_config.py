@@ -0,0 +1,68 @@
+import json
+import logging
+
+import log_config
+import pytest
+from log_config import JsonFormatter, RequestSamplingFilter, setup_logging
+
+
+@pytest.fixture()
+def queue_logging(tmp_path, monkeypatch):
+    """Логирование через очередь в файл; корневой логгер восстанавливается"""
+    log_file = tmp_path / 'app.log'
+    monkeypatch.setenv('LOG_FILE', str(log_file))
+    monkeypatch.setenv('LOG_LEVELS', 'test.quiet=WARNING')
+    monkeypatch.setenv('LOG_SAMPLE_ROUTES', '/stats=0')
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    handler = setup_logging()
+    yield log_file
+    root.removeHandler(handler)
+    handler.close()
+    root.handlers[:], root.level = saved
+    logging.getLogger('test.quiet').setLevel(logging.NOTSET)
+    monkeypatch.setitem(log_config.sampling, 'routes', {})
+
+
+def test_json_lines_and_levels(queue_logging):
+    logging.getLogger('test.loud').info('Курс %s = %.2f', 'USD', 0.5)
+    logging.getLogger('test.quiet').info('не попадает в журнал')
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logging.getLogger('test.loud').exception('ошибка')
+    logging.getLogger().handlers[0].close()  # Дожидаемся записи очереди
+    lines = [json.loads(line) for line in queue_logging.read_text().splitlines()]
+    assert [line['msg'] for line in lines] == ['Курс USD = 0.50', 'ошибка']
+    assert lines[0]['logger'] == 'test.loud'
+    assert 'ValueError: boom' in lines[1]['exc']
+
+
+def test_request_sampling(queue_logging):
+    """Запрос вне выборки теряет INFO-записи, но не предупреждения"""
+    record = logging.LogRecord('x', logging.INFO, '', 0, 'msg', None, None)
+    warning = logging.LogRecord('x', logging.WARNING, '', 0, 'msg', None, None)
+    sampling_filter = RequestSamplingFilter()
+    token = log_config.sample_request('/stats')
+    try:
+        assert not sampling_filter.filter(record)
+        assert sampling_filter.filter(warning)
+    finally:
+        log_config.reset_sampling(token)
+    assert sampling_filter.filter(record)
+    assert json.loads(JsonFormatter().format(record))['level'] == 'INFO'
+
+
+def test_fork_hook_registered_once(queue_logging, monkeypatch):
+    hooks = []
+    monkeypatch.setattr(log_config, '_fork_hook_registered', False)
+    monkeypatch.setattr(
+        log_config.os, 'register_at_fork', lambda **hook: hooks.append(hook)
+    )
+    root = logging.getLogger()
+    for _ in range(3):
+        handler = setup_logging()
+        root.removeHandler(handler)
+        handler.close()
+    assert len(hooks) == 1
+    assert log_config._active_handler is handler
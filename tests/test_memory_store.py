@@ -0,0 +1,175 @@
+import json
+import sqlite3
+import time
+
+import pytest
+from db_initializer import init_db
+from errors import CurrencyAlreadyExistsError, ExchangeRateNotFoundError
+from events import EventBus
+from memory_store import LOG_FILE, MemoryStore
+from model import (
+    ConversionModel,
+    CurrencyModel,
+    ExchangeRateModel,
+    MemoryConversionModel,
+    MemoryCurrencyModel,
+    MemoryExchangeRateModel,
+    MemoryHistoryModel,
+)
+from response import render_response
+
+
+def seed(currencies, rates) -> None:
+    for code in ('USD', 'EUR', 'GBP', 'JPY'):
+        currencies.add_currency(code, code, '')
+    for target, rate in (('EUR', 0.9), ('GBP', 0.8), ('JPY', 150.0)):
+        rates.add_exchange_rate('USD', target, rate)
+    rates.patch_exchange_rate('USD', 'EUR', 0.95)
+    rates.upsert_exchange_rates([('EUR', 'GBP', 0.85), ('GBP', 'XXX', 1.0)])
+
+
+def memory_models(store: MemoryStore) -> tuple:
+    events = EventBus()
+    return (
+        MemoryCurrencyModel(store, events),
+        MemoryExchangeRateModel(store, events),
+        MemoryConversionModel(store, events),
+    )
+
+
+def body(data) -> object:
+    return json.loads(render_response(200, data).body)
+
+
+def test_same_responses_as_sqlite():
+    conn = sqlite3.connect(':memory:')
+    init_db(conn)
+    events = EventBus()
+    sql = (
+        CurrencyModel(conn, events),
+        ExchangeRateModel(conn, events),
+        ConversionModel(conn, events),
+    )
+    memory = memory_models(MemoryStore())
+    for currencies, rates, _ in (sql, memory):
+        seed(currencies, rates)
+
+    queries = [
+        lambda c, r: c.get_currencies(),
+        lambda c, r: c.get_currencies(fields='code', after=1, limit=2),
+        lambda c, r: r.get_exchange_rates(),
+        lambda c, r: r.get_exchange_rates(fields='pair,rate', base='usd'),
+        lambda c, r: r.get_exchange_rates(target='GBP', limit=1),
+        lambda c, r: r.get_exchange_rates(base='CHF'),
+        lambda c, r: r.get_exchange_rate('usd', 'eur'),
+    ]
+    for query in queries:
+        assert body(query(*memory[:2])) == body(query(*sql[:2]))
+    stream = b''.join(
+        memory[1].stream_exchange_rates('ndjson', 'id,base').iter_encode()
+    )
+    assert stream.decode().splitlines()[0] == '{"id":1,"base":"USD"}'
+    assert memory[2].get_converted_currency('EUR', 'JPY', 10) == sql[
+        2
+    ].get_converted_currency('EUR', 'JPY', 10)
+    conn.close()
+
+
+def test_errors_match_sqlite_models():
+    currencies, rates, _ = memory_models(MemoryStore())
+    seed(currencies, rates)
+    with pytest.raises(CurrencyAlreadyExistsError):
+        currencies.add_currency('usd', 'Dollar', '$')
+    with pytest.raises(ExchangeRateNotFoundError):
+        rates.get_exchange_rate('EUR', 'JPY')
+
+
+def test_recovery_replays_journal(tmp_path):
+    store = MemoryStore(str(tmp_path)).open()
+    currencies, rates, _ = memory_models(store)
+    seed(currencies, rates)
+    # Без close(): процесс упал, снимка нет — все восстанавливается из журнала
+    recovered = MemoryStore(str(tmp_path)).open()
+    assert recovered.currency_rows == store.currency_rows
+    assert recovered.rate_rows == store.rate_rows
+    assert recovered.history == store.history
+    currencies, _, _ = memory_models(recovered)
+    assert currencies.add_currency('CHF', 'Franc', '')['id'] == 5
+
+
+def test_torn_journal_tail_is_dropped(tmp_path):
+    store = MemoryStore(str(tmp_path)).open()
+    currencies, rates, _ = memory_models(store)
+    seed(currencies, rates)
+    journal = tmp_path / LOG_FILE
+    size = journal.stat().st_size
+    with open(journal, 'a') as file:
+        file.write('[99, [["currency", "CHF"')  # Запись оборвалась на середине
+    recovered = MemoryStore(str(tmp_path)).open()
+    assert recovered.currency('CHF') is None
+    assert len(recovered.rate_rows) == 4
+    assert journal.stat().st_size == size
+
+
+def test_snapshot_and_journal(tmp_path):
+    store = MemoryStore(str(tmp_path)).open()
+    currencies, rates, _ = memory_models(store)
+    seed(currencies, rates)
+    store.snapshot()
+    assert store.stats()['log_records'] == 0
+    rates.patch_exchange_rate('USD', 'JPY', 151.0)
+    currencies.delete_all_currencies()
+    currencies.add_currency('CHF', 'Franc', '')
+    store.close()
+
+    recovered = MemoryStore(str(tmp_path)).open()
+    assert recovered.currency_rows == [(1, 'CHF', 'Franc', '')]
+    assert recovered.rate_rows == [] and recovered.history == {}
+    assert recovered.stats()['log_records'] == 0  # close() записал снимок
+
+
+def test_invalid_transaction_is_not_journaled(tmp_path):
+    store = MemoryStore(str(tmp_path)).open()
+    currencies, rates, _ = memory_models(store)
+    seed(currencies, rates)
+    size = (tmp_path / LOG_FILE).stat().st_size
+    for operations in (
+        [('currency', 'CHF', 'Franc', ''), ('rate', 1, 99, 1.0, 0.0)],
+        [('rate', 1, 2, 'abc', 0.0)],
+        [('drop',)],
+    ):
+        with pytest.raises(ValueError):
+            store.commit(operations)
+    assert (tmp_path / LOG_FILE).stat().st_size == size
+    assert store.currency('CHF') is None
+    store.commit([('currency', 'CHF', 'Franc', ''), ('rate', 5, 1, 1.1, 0.0)])
+    recovered = MemoryStore(str(tmp_path)).open()
+    assert recovered.rate('CHF', 'USD')[3] == 1.1
+
+
+def test_snapshot_timer_without_writes(tmp_path):
+    """Снимок пишет фоновый поток: запись после интервала для этого не нужна"""
+    store = MemoryStore(str(tmp_path), snapshot_interval=0.05).open()
+    currencies, _, _ = memory_models(store)
+    currencies.add_currency('USD', 'Dollar', '$')
+    assert store.stats()['log_records'] == 1
+    for _ in range(100):
+        if store.stats()['log_records'] == 0:
+            break
+        time.sleep(0.01)
+    assert store.stats()['log_records'] == 0
+    assert store.stats()['last_snapshot'] is not None
+    store.close()
+    assert not store._snapshots.is_alive()
+
+
+def test_history_in_memory():
+    store = MemoryStore()
+    currencies, rates, _ = memory_models(store)
+    seed(currencies, rates)
+    history = MemoryHistoryModel(store, retention_days=0)
+    points = history.get_history('USD', 'EUR')['points']
+    assert [point['rate'] for point in points] == [0.9, 0.95]
+    assert history.get_history('EUR', 'GBP')['points'][0]['rate'] == 0.85
+    with pytest.raises(ExchangeRateNotFoundError):
+        history.get_history('EUR', 'USD')
@@ -0,0 +1,42 @@
+import metrics
+import pytest
+from app_context import AppContext
+from metrics import MetricsRecorder
+
+
+@pytest.fixture()
+def context():
+    with AppContext('file:metrics_test?mode=memory&cache=shared') as ctx:
+        ctx.metrics = MetricsRecorder()
+        yield ctx
+
+
+def test_requests_by_route_and_status(context):
+    """Динамические маршруты учитываются по шаблону, а не по URL"""
+    context.handle('GET', '/currency/USD', {}, b'')
+    context.handle('GET', '/currency/EUR', {}, b'')
+    context.handle('GET', '/missing', {}, b'')
+    response = context.handle('GET', '/metrics', {}, b'')
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.body.decode()
+    assert (
+        'http_requests_total{method="GET",route="/currency/:code",status="404"} 2'
+        in text
+    )
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1' in text
+    assert 'http_requests_in_flight 1' in text  # Сам запрос /metrics
+    assert (
+        'http_request_duration_seconds_bucket{method="GET",route="/currency/:code",'
+        'le="+Inf"} 2' in text
+    )
+    assert 'http_response_size_bytes_count{method="GET",route="/missing"}' not in text
+
+
+def test_sqlite_query_time(context):
+    before = metrics.recorder._merged()[4].get(('select', 'execute'), [0])[-1]
+    context.handle('GET', '/currencies', {}, b'')
+    after = metrics.recorder._merged()[4][('select', 'execute')][-1]
+    assert after > before
+    assert 'sqlite_query_duration_seconds_count{statement="select",phase="fetch"}' in (
+        metrics.recorder.render()
+    )
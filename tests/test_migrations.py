@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+from db_initializer import init_db
+from migrations import latest_version, migrate, schema_version
+from model import ConversionModel, ExchangeRateModel
+from model.exchange_rates import SELECT_EXCHANGE_RATES
+
+
+@pytest.fixture()
+def legacy_db(tmp_path):
+    """База в схеме до миграций: курсы ссылаются на валюты по коду"""
+    conn = sqlite3.connect(tmp_path / 'legacy.db')
+    conn.executescript("""
+        CREATE TABLE currencies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            sign TEXT
+        );
+        CREATE TABLE exchange_rates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_currency TEXT NOT NULL,
+            to_currency TEXT NOT NULL,
+            rate REAL NOT NULL,
+            UNIQUE(from_currency, to_currency)
+        );
+        INSERT INTO currencies (code, name, sign) VALUES
+            ('USD', 'Dollar', '$'), ('EUR', 'Euro', '€'), ('GBP', 'Pound', '£');
+        INSERT INTO exchange_rates (id, from_currency, to_currency, rate) VALUES
+            (5, 'USD', 'EUR', 0.9), (7, 'GBP', 'USD', 1.25), (8, 'USD', 'XXX', 1.0);
+    """)
+    yield conn
+    conn.close()
+
+
+def test_legacy_database_is_migrated(legacy_db):
+    assert schema_version(legacy_db) == 0
+    assert init_db(legacy_db) == latest_version() == 2
+
+    rows = legacy_db.execute(
+        'SELECT id, base_currency_id, target_currency_id, rate FROM exchange_rates'
+    ).fetchall()
+    assert rows == [
+        (5, 1, 2, 0.9),
+        (7, 3, 1, 1.25),
+    ]  # Пара с неизвестной валютой отброшена
+
+    rates = ExchangeRateModel(legacy_db)
+    assert rates.get_exchange_rate('USD', 'EUR')['id'] == 5
+    added = rates.add_exchange_rate('EUR', 'GBP', 0.85)
+    assert added['id'] == 9  # AUTOINCREMENT продолжает нумерацию старой таблицы
+    history = legacy_db.execute(
+        "SELECT count(*) FROM exchange_rate_history WHERE from_currency = 'EUR'"
+    ).fetchone()[0]
+    assert history == 1
+    assert (
+        ConversionModel(legacy_db).get_converted_currency('EUR', 'USD', 9)[
+            'convertedAmount'
+        ]
+        == 10.0
+    )
+
+
+def test_migrate_is_idempotent(legacy_db):
+    migrate(legacy_db)
+    assert migrate(legacy_db) == 2
+    legacy_db.execute('PRAGMA user_version = 99')
+    with pytest.raises(RuntimeError):
+        migrate(legacy_db)
+
+
+def test_listing_uses_integer_keys():
+    conn = sqlite3.connect(':memory:')
+    init_db(conn)
+    plan = ' '.join(
+        row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + SELECT_EXCHANGE_RATES)
+    )
+    assert 'INTEGER PRIMARY KEY' in plan
+    for column, index in (
+        ('base_currency_id', 'idx_exchange_rates_pair_rate'),
+        ('target_currency_id', 'idx_exchange_rates_target_rate'),
+    ):
+        filter_plan = ' '.join(
+            row[-1]
+            for row in conn.execute(
+                f'EXPLAIN QUERY PLAN SELECT id, rate FROM exchange_rates WHERE {column} = 1'
+            )
+        )
+        assert f'COVERING INDEX {index}' in filter_plan
+    conn.close()
@@ -0,0 +1,78 @@
+import json
+import sqlite3
+
+import pytest
+from db_initializer import init_db
+from errors import InvalidQueryError
+from events import EventBus
+from model import CurrencyModel, ExchangeRateModel
+from response import render_response
+
+
+@pytest.fixture()
+def models():
+    conn = sqlite3.connect(':memory:')
+    init_db(conn)
+    events = EventBus()
+    currencies = CurrencyModel(conn, events)
+    rates = ExchangeRateModel(conn, events)
+    for code in ('USD', 'EUR', 'GBP', 'JPY'):
+        currencies.add_currency(code, code, '')
+    for target, rate in (('EUR', 0.9), ('GBP', 0.8), ('JPY', 150.0)):
+        rates.add_exchange_rate('USD', target, rate)
+    rates.add_exchange_rate('EUR', 'GBP', 0.85)
+    yield currencies, rates
+    conn.close()
+
+
+def body(data) -> object:
+    return json.loads(render_response(200, data).body)
+
+
+def test_keyset_pages(models):
+    currencies, _ = models
+    first = body(currencies.get_currencies(limit=3))
+    assert [c['code'] for c in first['items']] == ['USD', 'EUR', 'GBP']
+    second = body(currencies.get_currencies(after=int(first['next']), limit=3))
+    assert [c['code'] for c in second['items']] == ['JPY']
+    assert second['next'] is None
+
+
+def test_projection_and_filter(models):
+    _, rates = models
+    result = body(rates.get_exchange_rates(fields='pair,rate', base='usd'))
+    assert result == [
+        {'pair': 'USDEUR', 'rate': 0.9},
+        {'pair': 'USDGBP', 'rate': 0.8},
+        {'pair': 'USDJPY', 'rate': 150.0},
+    ]
+    page = rates.get_exchange_rates(fields='base,target', target='GBP', limit=1)
+    assert list(page.items) == [{'base': 'USD', 'target': 'GBP'}]
+    assert body(page)['next'] == '2'
+
+
+def test_default_shape_unchanged(models):
+    _, rates = models
+    full = body(rates.get_exchange_rates())
+    paged = body(rates.get_exchange_rates(limit=10))['items']
+    assert full == paged
+    assert full[0]['baseCurrency']['code'] == 'USD'
+
+
+def test_invalid_parameters(models):
+    currencies, _ = models
+    with pytest.raises(InvalidQueryError):
+        currencies.get_currencies(fields='code,secret')
+
+
+def test_query_parameters_through_router():
+    from app_context import AppContext
+
+    with AppContext(':memory:', ingest=False) as ctx:
+        router = ctx.router
+        for code in ('USD', 'EUR'):
+            router._resolve('POST', '/currencies', {'code': code, 'name': code})
+        response = ctx.handle('GET', '/currencies?limit=1&fields=code', {}, b'')
+        assert json.loads(response.body) == {'items': [{'code': 'USD'}], 'next': '1'}
+        response = ctx.handle('GET', '/currencies?limit=0', {}, b'')
+        assert response.status == 400
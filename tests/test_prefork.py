@@ -0,0 +1,75 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+APP_DIR = os.path.join(os.path.dirname(__file__), '..', 'src', 'app')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_pids(url: str, count: int, exclude=(), timeout: float = 10.0) -> set:
+    """Опрашивает /stats, пока не увидит count разных рабочих процессов"""
+    pids = set()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            pid = requests.get(url, timeout=1).json()['pid']
+            if pid not in exclude:
+                pids.add(pid)
+        except requests.RequestException:
+            time.sleep(0.1)
+        if len(pids) >= count:
+            return pids
+    raise RuntimeError(f'Получены ответы только от процессов {pids}')
+
+
+@pytest.fixture()
+def master(tmp_path):
+    """Мастер pre-fork с двумя рабочими процессами в отдельном процессе"""
+    port = free_port()
+    env = {
+        **os.environ,
+        'PYTHONPATH': APP_DIR,
+        'PORT': str(port),
+        'HOST': 'localhost',
+        'SERVER_PROCESSES': '2',
+        'DB_PATH': str(tmp_path / 'prefork.db'),
+    }
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'from app_server import start_server; start_server()'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    yield process, f'http://localhost:{port}/stats'
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def test_workers_share_port_and_restart(master):
+    """Оба процесса принимают соединения, убитый процесс перезапускается"""
+    process, url = master
+    pids = wait_for_pids(url, 2)
+    killed = pids.pop()
+    os.kill(killed, signal.SIGKILL)
+    restarted = wait_for_pids(url, 1, exclude=pids | {killed})
+    assert killed not in restarted
+
+
+def test_graceful_shutdown(master):
+    """SIGTERM мастеру останавливает все рабочие процессы"""
+    process, url = master
+    wait_for_pids(url, 1)
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=15) == 0
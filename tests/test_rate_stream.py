@@ -0,0 +1,179 @@
+import asyncio
+import json
+import threading
+
+import pytest
+import requests
+from app_context import AppContext
+from async_server import AsyncHTTPServer
+from errors import ServiceUnavailableError
+from events import CLEARED, RATE_UPDATED, RATES_UPSERTED, DataEvent, EventBus
+from rate_stream import RateStreamHub
+
+FORM = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def parse(chunk: bytes) -> list[dict]:
+    """Кадры SSE из части тела: [{'id', 'event', 'data'}]"""
+    frames = []
+    for block in chunk.decode().split('\n\n'):
+        fields = dict(
+            line.split(': ', 1) for line in block.splitlines() if ': ' in line
+        )
+        if 'event' in fields:
+            frames.append({**fields, 'data': json.loads(fields['data'])})
+    return frames
+
+
+def update(events: EventBus, pair: str, rate: float) -> None:
+    events.publish(DataEvent(RATE_UPDATED, pair[:3], pair[3:], rate))
+
+
+def test_updates_are_coalesced_per_pair():
+    events = EventBus()
+    hub = RateStreamHub(events)
+    stream = hub.open(
+        {('USD', 'EUR'), ('USD', 'JPY')}, None, lambda: [('USD', 'EUR', 0.9)]
+    )
+    chunks = iter(stream)
+    snapshot = parse(next(chunks))
+    assert [frame['data']['rate'] for frame in snapshot] == [0.9]
+
+    update(events, 'USDEUR', 0.91)
+    update(events, 'USDJPY', 150.0)
+    update(events, 'USDGBP', 0.8)  # Пара не запрошена
+    changes = [{'from': 'USD', 'to': 'EUR', 'rate': 0.93}]
+    events.publish(DataEvent(RATES_UPSERTED, payload={'changes': changes}))
+    frames = parse(next(chunks))
+    assert [(f['data']['pair'], f['data']['rate']) for f in frames] == [
+        ('USDJPY', 150.0),
+        ('USDEUR', 0.93),
+    ]
+    assert frames[-1]['id'] == f'{hub.epoch}-4'
+    chunks.close()
+    assert hub.stats()['subscribers'] == 0
+
+
+def test_resume_from_last_event_id():
+    events = EventBus()
+    hub = RateStreamHub(events, replay=3)
+    update(events, 'USDEUR', 0.9)
+    update(events, 'USDJPY', 150.0)
+    update(events, 'USDEUR', 0.92)
+
+    stream = hub.open(None, f'{hub.epoch}-1', lambda: pytest.fail('снимок не нужен'))
+    chunks = iter(stream)
+    assert parse(next(chunks)) == []  # Только retry
+    frames = parse(next(chunks))
+    assert [(f['data']['pair'], f['data']['rate']) for f in frames] == [
+        ('USDJPY', 150.0),
+        ('USDEUR', 0.92),
+    ]
+    chunks.close()
+
+    update(events, 'USDGBP', 0.8)  # Номер 1 вытеснен из журнала
+    events.publish(DataEvent(CLEARED))
+    for last_event_id in (f'{hub.epoch}-1', 'other-3'):
+        frames = parse(
+            next(iter(hub.open(None, last_event_id, lambda: [('EUR', 'GBP', 0.85)])))
+        )
+        assert [f['event'] for f in frames] == ['reset', 'rate']
+        assert 'id' not in frames[0] and frames[1]['id'] == f'{hub.epoch}-5'
+    stream = hub.open(None, f'{hub.epoch}-3', list)
+    chunks = iter(stream)
+    next(chunks)
+    assert [f['event'] for f in parse(next(chunks))] == [
+        'reset'
+    ]  # Сброс вытеснил курсы
+
+
+def test_slow_subscriber_is_dropped_and_limits():
+    events = EventBus()
+    hub = RateStreamHub(events, max_subscribers=2, max_pending=1)
+    stream = hub.open(None, None, list)
+    chunks = iter(stream)
+    next(chunks)
+    hub.open(None, None, list)
+    with pytest.raises(ServiceUnavailableError):
+        hub.open(None, None, list)
+    update(events, 'USDEUR', 0.9)
+    update(events, 'USDEUR', 0.91)  # Склеивается, очередь не растет
+    update(events, 'USDJPY', 150.0)
+    assert list(chunks) == []  # Переполнение: поток завершается
+    assert hub.stats()['overflows'] == 1
+
+
+def test_stream_through_app_context():
+    with AppContext('file:sse_test?mode=memory&cache=shared', ingest=False) as ctx:
+        ctx.streams.heartbeat = 0.05
+        for code in ('USD', 'EUR', 'JPY'):
+            ctx.handle('POST', '/currencies', FORM, f'code={code}'.encode())
+        ctx.handle('POST', '/exchangeRates', FORM, b'from=USD&to=EUR&rate=0.9')
+        ctx.handle('POST', '/exchangeRates', FORM, b'from=USD&to=JPY&rate=150')
+
+        response = ctx.handle('GET', '/stream/exchangeRates?pairs=usdeur', {}, b'')
+        assert response.content_type.startswith('text/event-stream')
+        assert (
+            ctx.handle('GET', '/stream/exchangeRates?pairs=USD', {}, b'').status == 400
+        )
+        chunks = iter(response.chunks)
+        snapshot = parse(next(chunks))
+        assert [frame['data'] for frame in snapshot] == [
+            {'pair': 'USDEUR', 'base': 'USD', 'target': 'EUR', 'rate': 0.9}
+        ]
+        assert next(chunks) == b': ping\n\n'
+        ctx.handle('PATCH', '/exchangeRate/USDEUR', FORM, b'rate=0.95')
+        assert parse(next(chunks))[0]['data']['rate'] == 0.95
+        chunks.close()
+
+        headers = {'Last-Event-ID': snapshot[-1]['id']}
+        chunks = iter(ctx.handle('GET', '/stream/exchangeRates', headers, b'').chunks)
+        next(chunks)
+        assert [f['data']['rate'] for f in parse(next(chunks))] == [0.95]
+        assert ctx.handle('GET', '/stats', {}, b'').status == 200
+        ctx.close_streams()
+        assert list(chunks) == []
+
+
+def test_async_server_streams_without_worker_threads():
+    context = AppContext(
+        'file:sse_async?mode=memory&cache=shared', pool_size=1, ingest=False
+    )
+    context.startup()
+    server = AsyncHTTPServer(context, 'localhost', 0, workers=1)
+    thread = threading.Thread(
+        target=lambda: asyncio.run(server.serve_forever()), daemon=True
+    )
+    thread.start()
+    assert server.wait_started(timeout=5)
+    base_url = f'http://localhost:{server.port}'
+    try:
+        for code in ('USD', 'EUR'):
+            requests.post(f'{base_url}/currencies', data={'code': code})
+        requests.post(
+            f'{base_url}/exchangeRates', data={'from': 'USD', 'to': 'EUR', 'rate': 0.9}
+        )
+        streams = [
+            requests.get(f'{base_url}/stream/exchangeRates', stream=True, timeout=5)
+            for _ in range(3)
+        ]
+        lines = [stream.iter_lines() for stream in streams]
+        for stream_lines in lines:
+            assert [next(stream_lines) for _ in range(6)][4] == (
+                b'data: {"pair":"USDEUR","base":"USD","target":"EUR","rate":0.9}'
+            )
+        # Единственный поток пула свободен: подписчики ждут в цикле событий
+        response = requests.patch(
+            f'{base_url}/exchangeRate/USDEUR', data={'rate': 0.97}
+        )
+        assert response.status_code == 200
+        for stream_lines in lines:
+            frame = [next(stream_lines) for _ in range(3)]
+            assert frame[1] == b'event: rate'
+            assert json.loads(frame[2].removeprefix(b'data: '))['rate'] == 0.97
+        assert context.streams.stats()['subscribers'] == 3
+    finally:
+        server.shutdown()
+        thread.join(timeout=5)
+        context.shutdown()
+    assert not thread.is_alive()
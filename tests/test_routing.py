@@ -0,0 +1,75 @@
+import pytest
+from app_context import AppContext
+from errors import MethodNotAllowedError, RouteNotFoundError
+from routing import RouteTable
+
+
+def handler():
+    return None, 200
+
+
+@pytest.fixture()
+def table():
+    table = RouteTable()
+    table.add('GET', '/currencies', handler)
+    table.add('POST', '/currencies', handler)
+    table.add('GET', '/currency/:code', handler, ['code'])
+    table.add('GET', '/currency/special', handler)
+    table.add('GET', '/exchangeRate/<pair:pair>', handler, ['from', 'to'])
+    table.add('PATCH', '/exchangeRate/<pair:pair>', handler, ['from', 'to', 'rate'])
+    table.add('GET', '/items/<int:id>', handler, ['id'])
+    return table
+
+
+def test_static_and_dynamic(table):
+    route, params = table.match('GET', '/currencies')
+    assert route.pattern == '/currencies' and params == {}
+    route, params = table.match('GET', '/currency/usd')
+    assert route.pattern == '/currency/:code' and params == {'code': 'usd'}
+    # Статический сегмент важнее параметра
+    assert table.match('GET', '/currency/special')[0].pattern == '/currency/special'
+
+
+def test_typed_converters(table):
+    route, params = table.match('PATCH', '/exchangeRate/usdjpy')
+    assert params == {'pair': 'usdjpy', 'from': 'USD', 'to': 'JPY'}
+    assert table.match('GET', '/items/42')[1] == {'id': 42}
+    with pytest.raises(RouteNotFoundError):
+        table.match('GET', '/items/abc')
+    with pytest.raises(RouteNotFoundError):
+        table.match('GET', '/exchangeRate/USDJP')
+
+
+def test_rejected_segment_falls_back_to_sibling(table):
+    """Конвертер вернул None — поиск продолжается по соседнему параметру"""
+    table.add('GET', '/exchangeRate/:pair/history', handler, ['pair'])
+    route, params = table.match('GET', '/exchangeRate/XYZ/history')
+    assert route.pattern == '/exchangeRate/:pair/history' and params == {'pair': 'XYZ'}
+    assert table.match('GET', '/exchangeRate/usdjpy/history')[1] == {'pair': 'usdjpy'}
+
+
+def test_method_not_allowed(table):
+    with pytest.raises(MethodNotAllowedError) as error:
+        table.match('DELETE', '/currencies')
+    assert error.value.headers['Allow'] == 'GET, HEAD, OPTIONS, POST'
+    with pytest.raises(MethodNotAllowedError):
+        table.match('POST', '/exchangeRate/USDJPY')
+
+
+def test_405_response_has_allow_header():
+    with AppContext('file:routing_test?mode=memory&cache=shared') as context:
+        response = context.handle('PATCH', '/currencies', {}, b'')
+    assert response.status == 405
+    assert response.headers['Allow'] == 'GET, HEAD, OPTIONS, POST'
+
+
+def test_invalid_pair_is_bad_request():
+    with AppContext('file:routing_pair_test?mode=memory&cache=shared') as context:
+        for method, target in (
+            ('GET', '/exchangeRate/USDJP'),
+            ('PATCH', '/exchangeRate/USD-JP'),
+            ('GET', '/exchangeRate/XYZ/history'),
+        ):
+            response = context.handle(method, target, {}, b'')
+            assert response.status == 400, target
+            assert b'pair' in response.body.lower()
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+import serializer
+from dto import CurrencyExchangeDTO
+from response import render_response
+from serializer import JSONRows
+
+ROWS = [
+    (1, 1, 'USD', 'US Dollar', '$', 2, 'EUR', 'Euro', '€', 0.92),
+    (2, 3, 'RUB', 'Российский "рубль"', None, 1, 'USD', 'US Dollar', '$', 0.0105),
+]
+
+
+@pytest.fixture()
+def rows():
+    return JSONRows(ROWS, CurrencyExchangeDTO.JSON_ROW, CurrencyExchangeDTO.row_to_dict)
+
+
+def test_encode_matches_json_dumps(rows):
+    """Быстрый путь дает тот же JSON, что и словари DTO"""
+    assert json.loads(rows.encode()) == list(rows)
+    assert rows.encode() == serializer.dumps(list(rows))
+    assert rows[1]['baseCurrency']['name'] == 'Российский "рубль"'
+
+
+def test_large_collection_is_streamed(rows, monkeypatch):
+    monkeypatch.setitem(serializer.settings, 'stream_rows', 2)
+    response = render_response(200, rows)
+    assert response.body == b''
+    assert b''.join(rows.iter_encode(chunk_rows=1)) == rows.encode()
+    assert json.loads(b''.join(response.chunks)) == list(rows)
+
+
+def test_pretty_mode(rows, monkeypatch):
+    monkeypatch.setitem(serializer.settings, 'pretty', True)
+    assert render_response(200, {'a': 1}).body == b'{\n    "a": 1\n}'
+    assert (
+        rows.encode() == json.dumps(list(rows), indent=4, ensure_ascii=False).encode()
+    )
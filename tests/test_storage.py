@@ -0,0 +1,40 @@
+import pytest
+from db_pool import ConnectionPool
+from storage import PROFILES, connect, get_profile
+
+
+def pragma(conn, name):
+    return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+def test_profile_pragmas_applied(tmp_path):
+    conn = connect(str(tmp_path / 'profile.db'), PROFILES['durable'])
+    try:
+        assert pragma(conn, 'journal_mode') == 'wal'
+        assert pragma(conn, 'synchronous') == 2  # FULL
+        assert pragma(conn, 'cache_size') == -16 * 1024
+    finally:
+        conn.close()
+
+
+def test_legacy_keeps_sqlite_defaults(tmp_path):
+    conn = connect(str(tmp_path / 'legacy.db'), PROFILES['legacy'])
+    try:
+        assert pragma(conn, 'journal_mode') == 'delete'
+    finally:
+        conn.close()
+
+
+def test_profile_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_PROFILE', 'write-heavy')
+    assert get_profile().name == 'write-heavy'
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), size=1)
+    try:
+        with pool.connection() as conn:
+            assert pragma(conn, 'temp_store') == 2  # MEMORY
+        assert pool.stats()['profile'] == 'write-heavy'
+    finally:
+        pool.close()
+    monkeypatch.setenv('DB_PROFILE', 'fast')
+    with pytest.raises(ValueError):
+        get_profile()